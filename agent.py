@@ -1,21 +1,37 @@
+import contextlib
+import hashlib
 import json
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 import os
+import threading
+import time
 import pandas as pd
+from aggregates import AggregateStore, GroupedStats
+from llm_client import LLMUnavailable, ResilientCaller, build_http_clients, token_usage_callback
+from llm_limiter import LLMQueueFull
+from metrics import tracer
+from prompt_context import ContextRenderer, ContextSelector, estimate_tokens
 
-
-with open("config.json") as f:
-    config = json.load(f)
+# Built by FinBot._compile on first use, so langchain and the Groq client stay off the import path
+LAZY_ATTRIBUTES = {"llm", "http_client", "http_async_client", "prompt", "chain",
+                   "plan_prompt", "plan_chain", "result_prompt", "result_chain",
+                   "conversation_prompt", "conversation_chain"}
 
 
 class FinBot:
     """Finance Assistant Bot with personality and domain expertise"""
     
-    def __init__(self, api_key=None, config_path="config.json"):
-        """Initialize FinBot with Groq API"""
-        if api_key:
+    def __init__(self, api_key=None, config_path="config.json", llm=None, context_token_budget=None,
+                 caller: ResilientCaller = None, base_url=None, max_connections=20):
+        """Initialize FinBot with Groq API, or with a prebuilt chat model such as FakeChatModel.
+
+        When `context_token_budget` is set, breakdowns larger than the budget are replaced
+        by a question-aware selection that fits it. Upstream calls go through `caller`
+        (deadline, retries, circuit breaker) over one pooled HTTP client; `base_url` points
+        the Groq client elsewhere, e.g. at the fake server in `python -m fake_llm`.
+        """
+        if llm is not None:
+            self.api_key = api_key
+        elif api_key:
             self.api_key = api_key
         else:
             try:
@@ -25,15 +41,20 @@ class FinBot:
             except FileNotFoundError:
                 raise FileNotFoundError(f"Config file '{config_path}' not found.")
             
-        if not self.api_key:
+        if llm is None and not self.api_key:
             raise ValueError("Groq API key not found. Please set it in config.json or pass manually.")
     
         
-        self.llm = ChatGroq(
-            temperature=0.3,
-            model_name="llama-3.1-8b-instant",
-            groq_api_key=self.api_key
-        )
+        self.caller = caller or ResilientCaller()
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self._compile_lock = threading.Lock()
+        if llm is None:
+            self.model_name, self.temperature = "llama-3.1-8b-instant", 0.3
+        else:
+            self.llm = llm
+            self.model_name = getattr(llm, "model_name", type(llm).__name__)
+            self.temperature = getattr(llm, "temperature", "")
         
         self.system_prompt = """You are FinBot, a friendly finance and sales analysis assistant.
                     Your domain: Finance & Sales Data Analysis
@@ -59,93 +80,288 @@ class FinBot:
 
                     Provide a concise, insightful, and data-backed explanation."""
 
+        # Ad-hoc analytical questions: the LLM writes a query plan, then phrases the computed result
+        self.plan_prompt_template = """You translate questions about a sales table into a JSON query plan.
 
-    
+                    {schema}
+
+                    Reply with only a JSON object with the plan fields above, or {{"plan": null}}
+                    if the question cannot be answered by filtering, grouping and aggregating the table.
+
+                    Question: {question}"""
+
+        self.result_prompt_template = """You are FinBot, a friendly finance and sales analysis assistant.
+                    Your style: Concise, professional, data-driven. Format currency in Indian Rupees (₹).
+
+                    The user asked: {question}
+
+                    This was computed exactly from the sales data ({plan}):
+                    {result}
+
+                    Answer the question in under 60 words using only these numbers."""
+
+        # Session turns: everything in this system message depends only on the dataset, so it is
+        # byte-identical across turns and upstream prompt caching can reuse it. The history and
+        # the question follow it as separate messages.
+        self.conversation_prompt_template = """You are FinBot, a friendly finance and sales analysis assistant.
+                    Your domain: Finance & Sales Data Analysis
+                    Your style: Concise, professional, data-driven.
+
+                    Guidelines:
+                    1. Always format currency in Indian Rupees (₹)
+                    2. Provide clear numeric answers with context
+                    3. Keep responses under 100 words unless analysis requires more
+                    4. If asked about non-finance topics, politely redirect: "I specialize in finance and sales analysis. How can I help with your sales data?"
+                    5. Be friendly but professional.
+                    6. This is a conversation: read follow-ups such as "what about the South?" in light of the earlier turns.
 
-    def prepare_detailed_data(self, sales_df: pd.DataFrame) -> str:
+                    You have access to the following financial dataset summary and detailed breakdown:
+
+                    === SUMMARY ===
+                    {data_summary}
+
+                    === DETAILED BREAKDOWN ===
+                    {detailed_data}"""
+
+        self.renderer = ContextRenderer()
+        self.selector = ContextSelector(context_token_budget) if context_token_budget else None
+
+    def __getattr__(self, name):
+        if name not in LAZY_ATTRIBUTES:
+            raise AttributeError(name)
+        self._compile()
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def _compile(self) -> None:
+        """Build the chat model and prompt chains on the first LLM-bound call"""
+        from langchain_core.output_parsers import StrOutputParser
+        from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+        with self._compile_lock:
+            if "chain" in self.__dict__:
+                return
+            if "llm" not in self.__dict__:
+                from langchain_groq import ChatGroq
+
+                # One connection pool for every request; retries are handled by self.caller
+                self.http_client, self.http_async_client = build_http_clients(self.max_connections, timeout=self.caller.deadline)
+                self.llm = ChatGroq(
+                    temperature=self.temperature,
+                    model_name=self.model_name,
+                    groq_api_key=self.api_key,
+                    groq_api_base=self.base_url,
+                    http_client=self.http_client,
+                    http_async_client=self.http_async_client,
+                    request_timeout=self.caller.deadline,
+                    max_retries=0
+                )
+
+            # Compiled once; only the data blocks and question vary per request
+            callbacks = [token_usage_callback()]
+            self.prompt = ChatPromptTemplate.from_template(self.system_prompt)
+            self.plan_prompt = ChatPromptTemplate.from_template(self.plan_prompt_template)
+            self.plan_chain = (self.plan_prompt | self.llm | StrOutputParser()).with_config(callbacks=callbacks)
+            self.result_prompt = ChatPromptTemplate.from_template(self.result_prompt_template)
+            self.result_chain = (self.result_prompt | self.llm | StrOutputParser()).with_config(callbacks=callbacks)
+            self.conversation_prompt = ChatPromptTemplate.from_messages([
+                ("system", self.conversation_prompt_template),
+                MessagesPlaceholder("history"),
+                ("human", "{context}{question}")
+            ])
+            self.conversation_chain = (self.conversation_prompt | self.llm | StrOutputParser()).with_config(callbacks=callbacks)
+            self.chain = (self.prompt | self.llm | StrOutputParser()).with_config(callbacks=callbacks)
+
+    def config_fingerprint(self) -> str:
+        """Hash of the prompt and model settings that shape an answer"""
+        settings = "|".join([
+            self.system_prompt,
+            self.result_prompt_template,
+            str(self.model_name),
+            str(self.temperature)
+        ])
+        return hashlib.sha256(settings.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def is_error_response(response: str) -> bool:
+        """True for the apology text returned when the LLM call failed"""
+        return response.startswith("I encountered an error")
+
+    @tracer.traced("prepare_detailed_data")
+    def prepare_detailed_data(self, sales_df: pd.DataFrame, aggregates: AggregateStore = None) -> str:
         """Prepare detailed data breakdown for LLM"""
-        
-        # Product-wise analysis
-        product_stats = sales_df.groupby('product').agg({
-            'revenue': ['sum', 'mean', 'count'],
-            'quantity': 'sum'
-        }).round(2)
-        
-        product_breakdown = "PRODUCT ANALYSIS:\n"
-        for product in product_stats.index:
-            total_rev = product_stats.loc[product, ('revenue', 'sum')]
-            avg_rev = product_stats.loc[product, ('revenue', 'mean')]
-            count = product_stats.loc[product, ('revenue', 'count')]
-            total_qty = product_stats.loc[product, ('quantity', 'sum')]
-            
-            product_breakdown += f"- {product}: {int(count)} sales, Total Revenue ₹{total_rev:,.0f}, Avg Revenue/Sale ₹{avg_rev:,.2f}, Total Quantity {int(total_qty)}\n"
-        
-        # Region-wise analysis
-        region_stats = sales_df.groupby('region').agg({
-            'revenue': ['sum', 'mean', 'count'],
-            'quantity': 'sum'
-        }).round(2)
-        
-        region_breakdown = "\nREGION ANALYSIS:\n"
-        for region in region_stats.index:
-            total_rev = region_stats.loc[region, ('revenue', 'sum')]
-            avg_rev = region_stats.loc[region, ('revenue', 'mean')]
-            count = region_stats.loc[region, ('revenue', 'count')]
-            
-            region_breakdown += f"- {region}: {int(count)} sales, Total Revenue ₹{total_rev:,.0f}, Avg Revenue/Sale ₹{avg_rev:,.2f}\n"
-        
-        # Top performers
-        top_product = product_stats[('revenue', 'sum')].idxmax()
-        top_product_revenue = product_stats.loc[top_product, ('revenue', 'sum')]
-        
-        top_region = region_stats[('revenue', 'sum')].idxmax()
-        top_region_revenue = region_stats.loc[top_region, ('revenue', 'sum')]
-        
-        top_performers = f"\nTOP PERFORMERS:\n- Best Product: {top_product} (₹{top_product_revenue:,.0f})\n- Best Region: {top_region} (₹{top_region_revenue:,.0f})\n"
-        
-        return product_breakdown + region_breakdown + top_performers
-
-    def get_response(self, question: str, data_summary: dict, sales_df: pd.DataFrame = None) -> str:
-        """Generate response based on user question and data"""
-
-        # Prepare detailed data breakdown
-        detailed_data = ""
-        if sales_df is not None:
-            detailed_data = self.prepare_detailed_data(sales_df)
-
-        # Include region sales explicitly
-        sales_by_region_text = "\n".join(
-            [f"- {region}: ₹{revenue:,}" for region, revenue in data_summary['sales_by_region'].items()]
-        )
-
-        # Format summary
-        summary_text = f"""
-            Total Revenue: ₹{data_summary['total_revenue']:,}
-            Total Sales: {data_summary['total_sales']}
-            Average Revenue per Sale: ₹{data_summary['average_revenue']:,.2f}
-            Top Product: {data_summary['top_product']} (₹{data_summary['top_product_revenue']:,})
-            Sales by Region:
-            {sales_by_region_text}
+        if aggregates is None:
+            aggregates = AggregateStore.from_frame(sales_df)
+        return aggregates.detailed_breakdown()
+
+    def _prepare_inputs(self, question: str, data_summary: dict, sales_df: pd.DataFrame = None,
+                        aggregates: AggregateStore = None) -> dict:
+        """Build the prompt variables shared by the sync and async response paths"""
+        return self._prepare_batch_inputs([question], data_summary, sales_df, aggregates)[0]
+
+    def _prepare_batch_inputs(self, questions: list, data_summary: dict, sales_df: pd.DataFrame = None,
+                              aggregates: AggregateStore = None) -> list:
+        """Prompt variables for several questions, rendering the shared summary and breakdown once"""
+        with tracer.stage("prepare_detailed_data"):
+            detailed_data, breakdown_tokens = self.renderer.breakdown(sales_df, aggregates)
+            summary = self.renderer.summary(data_summary)
+            selective = self.selector is not None and breakdown_tokens > self.selector.token_budget
+            if selective and aggregates is None:
+                aggregates = AggregateStore.from_frame(sales_df)
+
+            return [
+                {
+                    "detailed_data": self.selector.select(question, aggregates) if selective else detailed_data,
+                    "data_summary": summary,
+                    "question": question
+                }
+                for question in questions
+            ]
+
+    def get_response(self, question: str, data_summary: dict, sales_df: pd.DataFrame = None,
+                     aggregates: AggregateStore = None) -> str:
+        """Generate response based on user question and data.
+
+        Raises LLMUnavailable when retries are exhausted or the circuit breaker is open.
         """
+        inputs = self._prepare_inputs(question, data_summary, sales_df, aggregates)
+
+        try:
+            with tracer.stage("get_response"):
+                response = self.caller.call(lambda: self.chain.invoke(inputs))
+            return response
+        except LLMUnavailable:
+            raise
+        except Exception as e:
+            return f"I encountered an error: {str(e)}. Please try again."
 
-        prompt = ChatPromptTemplate.from_template(self.system_prompt)
-        chain = prompt | self.llm | StrOutputParser()
+    async def aget_response(self, question: str, data_summary: dict, sales_df: pd.DataFrame = None,
+                            aggregates: AggregateStore = None) -> str:
+        """Async variant of get_response that awaits the chain without blocking a worker thread"""
+        inputs = self._prepare_inputs(question, data_summary, sales_df, aggregates)
 
         try:
-            response = chain.invoke({
-                "detailed_data": detailed_data,
-                "data_summary": summary_text,
-                "question": question
-            })
+            with tracer.stage("get_response"):
+                response = await self.caller.acall(lambda: self.chain.ainvoke(inputs))
             return response
+        except LLMUnavailable:
+            raise
+        except Exception as e:
+            return f"I encountered an error: {str(e)}. Please try again."
+
+
+    def session_inputs(self, question: str, history: list, data_summary: dict, sales_df: pd.DataFrame = None,
+                       aggregates: AggregateStore = None) -> dict:
+        """Prompt variables for a turn of a session, given its history as (role, text) messages.
+
+        The system message only depends on the dataset version. When the breakdown is over the
+        token budget it carries the question-independent selection, and the lines for products
+        and regions the question names go in the final message with the question instead.
+        """
+        with tracer.stage("prepare_detailed_data"):
+            detailed_data, breakdown_tokens = self.renderer.breakdown(sales_df, aggregates)
+            summary = self.renderer.summary(data_summary)
+            context = ""
+            if self.selector is not None and breakdown_tokens > self.selector.token_budget:
+                if aggregates is None:
+                    aggregates = AggregateStore.from_frame(sales_df)
+                detailed_data = self.selector.overview(aggregates)
+                mentioned = self.selector.mentioned(question, aggregates)
+                if mentioned:
+                    context = f"Data on what this message mentions:\n{mentioned}\n\n"
+        return {"data_summary": summary, "detailed_data": detailed_data, "history": history,
+                "context": context, "question": question}
+
+    def session_prompt_tokens(self, inputs: dict) -> int:
+        """Estimated prompt tokens of a session turn, as sent to the LLM"""
+        return sum(estimate_tokens(str(message.content)) for message in self.conversation_prompt.format_messages(**inputs))
+
+    async def aget_session_response(self, inputs: dict) -> str:
+        """Answer a session turn from `session_inputs`.
+
+        Raises LLMUnavailable when retries are exhausted or the circuit breaker is open.
+        """
+        try:
+            with tracer.stage("get_response"):
+                return await self.caller.acall(lambda: self.conversation_chain.ainvoke(inputs))
+        except LLMUnavailable:
+            raise
         except Exception as e:
             return f"I encountered an error: {str(e)}. Please try again."
 
+    async def astream_session_response(self, inputs: dict):
+        """Streaming variant of aget_session_response; errors are raised, never yielded as answer text"""
+        with tracer.stage("get_response"):
+            async for chunk in self.caller.astream(lambda: self.conversation_chain.astream(inputs)):
+                yield chunk
+
+    async def aplan_query(self, question: str, schema: str) -> str:
+        """Ask the LLM for a JSON query plan (validated by the caller, never executed as code)"""
+        with tracer.stage("plan_query"):
+            return await self.caller.acall(lambda: self.plan_chain.ainvoke({"schema": schema, "question": question}))
+
+    async def aphrase_result(self, question: str, plan: str, result: str) -> str:
+        """Phrase an exactly computed query result; the prompt carries the result, not the dataset.
+
+        Raises LLMUnavailable when retries are exhausted or the circuit breaker is open.
+        """
+        inputs = {"question": question, "plan": plan, "result": result}
+        with tracer.stage("get_response"):
+            return await self.caller.acall(lambda: self.result_chain.ainvoke(inputs))
+
+    async def abatch_responses(self, questions: list, data_summary: dict, sales_df: pd.DataFrame = None,
+                               aggregates: AggregateStore = None, max_concurrency: int = 8, slot=None) -> list:
+        """Answer several questions concurrently from one context build.
+
+        Returns (answer, elapsed_ms) per question, in order. Each question gets its own
+        retries and deadline; the answer is an LLMUnavailable instance if they ran out.
+        `slot` (e.g. LLMLimiter.slot) is held around each upstream call, so the fan-out counts
+        against a shared limit; the answer is an LLMQueueFull instance if its queue was full.
+        """
+        async def answer_one(inputs: dict) -> tuple:
+            start = time.perf_counter()
+            try:
+                async with slot() if slot is not None else contextlib.nullcontext():
+                    answer = await self.caller.acall(lambda: self.chain.ainvoke(inputs))
+            except (LLMUnavailable, LLMQueueFull) as e:
+                answer = e
+            except Exception as e:
+                answer = f"I encountered an error: {str(e)}. Please try again."
+            return answer, (time.perf_counter() - start) * 1000
+
+        from langchain_core.runnables import RunnableLambda
+
+        inputs = self._prepare_batch_inputs(questions, data_summary, sales_df, aggregates)
+        with tracer.stage("get_response"):
+            return await RunnableLambda(answer_one).abatch(inputs, config={"max_concurrency": max_concurrency})
+
+    async def astream_response(self, question: str, data_summary: dict, sales_df: pd.DataFrame = None,
+                               aggregates: AggregateStore = None):
+        """Yield the answer in chunks as the model generates them.
+
+        Failures before the first chunk are retried; LLMUnavailable is raised if they persist.
+        Any other error is raised to the caller rather than streamed as part of the answer.
+        """
+        inputs = self._prepare_inputs(question, data_summary, sales_df, aggregates)
+
+        with tracer.stage("get_response"):
+            async for chunk in self.caller.astream(lambda: self.chain.astream(inputs)):
+                yield chunk
 
-    def get_predefined_response(self, query_type: str, data_summary: dict, sales_df: pd.DataFrame = None) -> str:
-        """Handle common predefined queries with calculated responses"""
+    @staticmethod
+    def get_predefined_response(query_type: str, data_summary: dict, sales_df: pd.DataFrame = None,
+                                grouped: GroupedStats = None, aggregates: AggregateStore = None) -> str:
+        """Handle common predefined queries with calculated responses.
+
+        Detailed answers read precomputed per-group stats; pass `grouped` to reuse them
+        across calls, otherwise they are computed from `sales_df`, or read from `aggregates`
+        when only those are given. With `aggregates`, the median comes from its quantile
+        sketch instead of the rows; with neither a sketch nor rows it is left out.
+        """
         
-        if sales_df is None:
+        if sales_df is None and grouped is None and aggregates is None:
             # Fallback to basic responses
             responses = {
                 "total_revenue": f"The total revenue across all sales is ₹{data_summary['total_revenue']:,}.",
@@ -158,13 +374,25 @@ class FinBot:
                 "total_sales": f"We have recorded {data_summary['total_sales']} total sales transactions."
             }
             return responses.get(query_type, None)
+
+        if grouped is None and sales_df is not None:
+            grouped = GroupedStats(sales_df)
+
+        def group_stats(*by) -> pd.DataFrame:
+            """Revenue `sum` and sales `count` per group, from the rows' stats or the aggregates"""
+            if grouped is not None:
+                return grouped.frame(*by)
+            table = {("product",): aggregates.by_product, ("region",): aggregates.by_region}.get(by, aggregates.cube)
+            stats = table.rename(columns={'revenue_sum': 'sum', 'sales_count': 'count'})[['sum', 'count']]
+            whole = (stats['sum'] % 1 == 0).all()
+            return stats.astype({'sum': 'int64' if whole else 'float64', 'count': 'int64'})
         
         # Enhanced responses with detailed calculations
         if query_type == "total_revenue":
             return f"Our total revenue across all {data_summary['total_sales']} sales is ₹{data_summary['total_revenue']:,}. This includes sales from all products and regions."
         
         elif query_type == "top_product":
-            product_revenue = sales_df.groupby('product')['revenue'].sum().sort_values(ascending=False)
+            product_revenue = group_stats('product')['sum'].sort_values(ascending=False)
             top = product_revenue.index[0]
             top_rev = product_revenue.iloc[0]
             second = product_revenue.index[1] if len(product_revenue) > 1 else None
@@ -177,21 +405,32 @@ class FinBot:
         
         elif query_type == "average_revenue":
             avg = data_summary['average_revenue']
-            median = sales_df['revenue'].median()
+            sketches = aggregates.sketches if aggregates is not None else None
+            if sketches is not None:
+                median = sketches.quantile(0.5)
+            elif grouped is not None:
+                median = grouped.median
+            else:
+                return f"The average revenue per sale is ₹{avg:,.2f}."
             return f"The average revenue per sale is ₹{avg:,.2f}, with a median of ₹{median:,.2f}. This means half of our sales are above ₹{median:,.2f}."
         
-        elif query_type == "sales_by_region":
-            region_revenue = sales_df.groupby('region')['revenue'].sum().sort_values(ascending=False)
-            response = "**Sales by Region:**\n\n"
-            for region, revenue in region_revenue.items():
-                count = len(sales_df[sales_df['region'] == region])
-                avg = revenue / count
-                response += f"• **{region}**: ₹{revenue:,} ({count} sales, avg ₹{avg:,.2f}/sale)\n"
+        elif query_type in ("sales_by_region", "sales_by_product", "sales_by_product_region"):
+            dimensions = {
+                "sales_by_region": (("region",), "Region"),
+                "sales_by_product": (("product",), "Product"),
+                "sales_by_product_region": (("product", "region"), "Product and Region"),
+            }
+            by, title = dimensions[query_type]
+            stats = group_stats(*by).sort_values('sum', ascending=False)
+            response = f"**Sales by {title}:**\n\n"
+            for key, revenue, count in zip(stats.index, stats['sum'], stats['count']):
+                label = " / ".join(key) if isinstance(key, tuple) else key
+                response += f"• **{label}**: ₹{revenue:,} ({count} sales, avg ₹{revenue / count:,.2f}/sale)\n"
             return response
         
         elif query_type == "total_sales":
-            products = sales_df['product'].nunique()
-            regions = sales_df['region'].nunique()
+            products = len(group_stats('product'))
+            regions = len(group_stats('region'))
             return f"We have recorded **{data_summary['total_sales']} total sales** transactions across {products} different products and {regions} regions."
         
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,433 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from sketches import RevenueSketches
+
+
+# Columns held for every aggregate key
+AGG_COLUMNS = ['revenue_sum', 'sales_count', 'revenue_sumsq', 'quantity_sum']
+
+
+def _aggregate_rows(df: pd.DataFrame, by_day: bool = False) -> pd.DataFrame:
+    """Collapse raw sales rows into the product x region cube (optionally x day) in one vectorized pass"""
+    revenue = df['revenue'].to_numpy(dtype='float64')
+    columns = {}
+    if by_day:
+        columns['day'] = df['date'].to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype('datetime64[ns]')
+    columns.update({
+        'product': df['product'].to_numpy() if df['product'].dtype == object else df['product'].array,
+        'region': df['region'].to_numpy() if df['region'].dtype == object else df['region'].array,
+        'revenue_sum': revenue,
+        'sales_count': 1,
+        'revenue_sumsq': revenue * revenue,
+        'quantity_sum': df['quantity'].to_numpy(dtype='int64'),
+    })
+    keys = ['day', 'product', 'region'] if by_day else ['product', 'region']
+    # sort=False keeps keys in order of first appearance, matching df['product'].unique();
+    # categorical keys are grouped on their codes and only the small result is cast to str
+    cube = pd.DataFrame(columns).groupby(keys, sort=False, observed=True)[AGG_COLUMNS].sum()
+    cube.index = pd.MultiIndex.from_arrays(
+        [cube.index.get_level_values(key) if key == 'day' else cube.index.get_level_values(key).astype(str)
+         for key in keys],
+        names=keys
+    )
+    return cube
+
+
+def merge_cubes(cube: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    """Add `delta` into `cube`; existing keys keep their position, unseen keys are appended at the end.
+
+    Only the rows `delta` touches are written, into copies of the columns (`cube` may be shared
+    with older snapshots). The cube's index, and the lookup table pandas keeps on it, is reused
+    as is unless `delta` brings new keys.
+    """
+    positions = cube.index.get_indexer(delta.index)
+    found = positions >= 0
+    index = cube.index if found.all() else cube.index.append(delta.index[~found])
+    columns = {}
+    for column in AGG_COLUMNS:
+        added = delta[column].to_numpy()
+        values = cube[column].to_numpy().astype(np.result_type(cube[column].dtype, added.dtype))
+        values[positions[found]] += added[found]
+        columns[column] = np.concatenate([values, added[~found]]) if not found.all() else values
+    return pd.DataFrame(columns, index=index)
+
+
+def _empty_cube(keys: list) -> pd.DataFrame:
+    index = pd.MultiIndex.from_arrays([[] for _ in keys], names=keys)
+    return pd.DataFrame(columns=AGG_COLUMNS, index=index, dtype='float64')
+
+
+def cube_arrays(cube: pd.DataFrame, prefix: str) -> dict:
+    """Flat numpy arrays for one cube (index levels and columns), for `np.savez` without pickle"""
+    arrays = {f"{prefix}.levels": np.array(cube.index.names, dtype=str)}
+    for name in cube.index.names:
+        level = cube.index.get_level_values(name)
+        arrays[f"{prefix}.index.{name}"] = (level.to_numpy(dtype='datetime64[ns]') if name in ('day', 'period')
+                                            else level.to_numpy().astype(str))
+    for column in AGG_COLUMNS:
+        arrays[f"{prefix}.{column}"] = cube[column].to_numpy()
+    return arrays
+
+
+def cube_from_arrays(arrays: dict, prefix: str) -> pd.DataFrame:
+    names = [str(name) for name in arrays[f"{prefix}.levels"]]
+    index = pd.MultiIndex.from_arrays([arrays[f"{prefix}.index.{name}"] for name in names], names=names)
+    return pd.DataFrame({column: arrays[f"{prefix}.{column}"] for column in AGG_COLUMNS}, index=index)
+
+
+# Time grains kept as pre-aggregated cubes; quarters are derived from months at query time
+GRAINS = ['day', 'week', 'month', 'quarter']
+
+
+def period_start(days: pd.DatetimeIndex, grain: str) -> pd.DatetimeIndex:
+    """Map days to the first day of their week (Monday), month or quarter"""
+    if grain == 'day':
+        return days
+    if grain == 'week':
+        return days - pd.to_timedelta(days.dayofweek, unit='D')
+    if grain == 'month':
+        return days.to_period('M').to_timestamp()
+    if grain == 'quarter':
+        return days.to_period('Q').to_timestamp()
+    raise ValueError(f"Unknown grain '{grain}'. Use one of: {', '.join(GRAINS)}")
+
+
+def period_label(start: pd.Timestamp, grain: str) -> str:
+    if grain == 'day':
+        return start.strftime('%Y-%m-%d')
+    if grain == 'week':
+        return f"week of {start.strftime('%Y-%m-%d')}"
+    if grain == 'month':
+        return start.strftime('%b %Y')
+    return f"{start.year} Q{start.quarter}"
+
+
+class RollupStore:
+    """Pre-aggregated day, week and month x product x region cubes for trend questions"""
+
+    def __init__(self, daily: pd.DataFrame = None):
+        self.cubes = {'day': daily if daily is not None else _empty_cube(['day', 'product', 'region'])}
+        self.cubes['week'] = self._roll(self.cubes['day'], 'week')
+        self.cubes['month'] = self._roll(self.cubes['day'], 'month')
+
+    @staticmethod
+    def _roll(daily: pd.DataFrame, grain: str) -> pd.DataFrame:
+        periods = period_start(pd.DatetimeIndex(daily.index.get_level_values('day')), grain)
+        keys = [periods, daily.index.get_level_values('product'), daily.index.get_level_values('region')]
+        rolled = daily.groupby(keys, sort=False).sum()
+        rolled.index.names = ['period', 'product', 'region']
+        return rolled
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "RollupStore":
+        return cls(_aggregate_rows(df, by_day=True))
+
+    def copy(self) -> "RollupStore":
+        """Independent store for copy-on-write updates; cubes are replaced, never mutated, on update"""
+        store = RollupStore.__new__(RollupStore)
+        store.cubes = dict(self.cubes)
+        return store
+
+    def update_daily(self, delta: pd.DataFrame) -> None:
+        """Fold a day x product x region delta into every grain"""
+        self.cubes['day'] = merge_cubes(self.cubes['day'], delta)
+        for grain in ('week', 'month'):
+            self.cubes[grain] = merge_cubes(self.cubes[grain], self._roll(delta, grain))
+
+    def series(self, grain: str = 'month', product: str = None, region: str = None) -> pd.DataFrame:
+        """Aggregates per period, optionally for one product and/or region, oldest first"""
+        cube = self.cubes['month' if grain == 'quarter' else grain]
+        if product is not None:
+            cube = cube.xs(product, level='product', drop_level=False) if product in cube.index.get_level_values('product') else cube.iloc[0:0]
+        if region is not None:
+            cube = cube.xs(region, level='region', drop_level=False) if region in cube.index.get_level_values('region') else cube.iloc[0:0]
+        level = 'period' if grain != 'day' else 'day'
+        periods = pd.DatetimeIndex(cube.index.get_level_values(level))
+        if grain == 'quarter':
+            periods = period_start(periods, 'quarter')
+        return cube.groupby(periods).sum().sort_index()
+
+    def period_over_period(self, grain: str = 'month', product: str = None, region: str = None,
+                           periods_back: int = 0) -> dict:
+        """Compare one period with the period before it.
+
+        periods_back=0 is the latest period in the data ("this month"), 1 the one before ("last month").
+        Returns None when there is not enough history.
+        """
+        series = self.series(grain, product, region)
+        if len(series) == 0:
+            return None
+        # Reindex onto a continuous calendar so empty periods count as zero
+        step = {'day': 'D', 'week': 'W-MON', 'month': 'MS', 'quarter': 'QS'}[grain]
+        calendar = pd.date_range(series.index.min(), self.latest_period(grain), freq=step)
+        series = series.reindex(calendar, fill_value=0)
+        position = len(series) - 1 - periods_back
+        if position < 0:
+            return None
+        current = series.iloc[position]
+        previous = series.iloc[position - 1] if position > 0 else None
+        result = {
+            'grain': grain,
+            'period': period_label(series.index[position], grain),
+            'revenue': float(current['revenue_sum']),
+            'sales': int(current['sales_count']),
+            'previous_period': None,
+            'previous_revenue': None,
+            'change_pct': None
+        }
+        if previous is not None:
+            result['previous_period'] = period_label(series.index[position - 1], grain)
+            result['previous_revenue'] = float(previous['revenue_sum'])
+            if previous['revenue_sum']:
+                result['change_pct'] = round(float(current['revenue_sum'] / previous['revenue_sum'] - 1) * 100, 1)
+        return result
+
+    def latest_period(self, grain: str) -> pd.Timestamp:
+        days = self.cubes['day'].index.get_level_values('day')
+        return period_start(pd.DatetimeIndex([days.max()]), grain)[0]
+
+    @property
+    def empty(self) -> bool:
+        return len(self.cubes['day']) == 0
+
+
+class AggregateStore:
+    """Running sum, count, sum of squares and quantity by product, region and product x region.
+
+    When rows carry a `date`, day/week/month rollups are maintained alongside in `rollups`.
+    Revenue quantile sketches (overall, per product, per region) are kept in `sketches`.
+    """
+
+    def __init__(self, cube: pd.DataFrame = None, rollups: RollupStore = None, sketches: RevenueSketches = None):
+        self.cube = cube if cube is not None else _empty_cube(['product', 'region'])
+        self.rollups = rollups
+        self.sketches = sketches
+        self.version = 0
+        self._refresh()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "AggregateStore":
+        """Build the store from a full sales DataFrame in a single grouping pass"""
+        sketches = RevenueSketches.from_frame(df)
+        if 'date' not in df.columns:
+            return cls(_aggregate_rows(df), sketches=sketches)
+        daily = _aggregate_rows(df, by_day=True)
+        cube = daily.groupby(level=['product', 'region'], sort=False).sum()
+        return cls(cube, RollupStore(daily), sketches)
+
+    def to_arrays(self) -> dict:
+        """The whole store as flat numpy arrays (no object arrays), e.g. for a spill or shared file"""
+        arrays = {"version": np.array(self.version), **cube_arrays(self.cube, "cube")}
+        if self.rollups is not None:
+            for grain, cube in self.rollups.cubes.items():
+                arrays.update(cube_arrays(cube, f"rollups.{grain}"))
+        if self.sketches is not None:
+            arrays.update(self.sketches.to_arrays("sketches"))
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> "AggregateStore":
+        rollups = None
+        if "rollups.day.levels" in arrays:
+            rollups = RollupStore.__new__(RollupStore)
+            rollups.cubes = {grain: cube_from_arrays(arrays, f"rollups.{grain}") for grain in ('day', 'week', 'month')}
+        sketches = RevenueSketches.from_arrays(arrays, "sketches") if "sketches.relative_accuracy" in arrays else None
+        store = cls(cube_from_arrays(arrays, "cube"), rollups, sketches)
+        store.version = int(arrays["version"])
+        return store
+
+    def copy(self) -> "AggregateStore":
+        """Independent store for copy-on-write updates; the cube is replaced, never mutated, on update"""
+        store = AggregateStore(self.cube, self.rollups.copy() if self.rollups is not None else None,
+                               self.sketches.copy() if self.sketches is not None else None)
+        store.version = self.version
+        return store
+
+    def update(self, new_rows: pd.DataFrame) -> None:
+        """Fold newly appended rows into the store without rescanning existing data"""
+        if new_rows is None or len(new_rows) == 0:
+            return
+        if self.rollups is not None and 'date' in new_rows.columns:
+            daily = _aggregate_rows(new_rows, by_day=True)
+            self.rollups.update_daily(daily)
+            delta = daily.groupby(level=['product', 'region'], sort=False).sum()
+        else:
+            delta = _aggregate_rows(new_rows)
+        if self.sketches is not None:
+            self.sketches.update(new_rows)
+        self.cube = merge_cubes(self.cube, delta)
+        self.by_product = merge_cubes(self.by_product, delta.groupby(level='product', sort=False).sum())
+        self.by_region = merge_cubes(self.by_region, delta.groupby(level='region', sort=False).sum())
+        self.version += 1
+
+    def _refresh(self):
+        """Derive the product and region level aggregates from the cube"""
+        self.by_product = self.cube.groupby(level='product', sort=False).sum()
+        self.by_region = self.cube.groupby(level='region', sort=False).sum()
+
+    @property
+    def memory_bytes(self) -> int:
+        """Heap estimate from the frames' deep memory usage and the sketch arrays, without serializing"""
+        frames = [self.cube, self.by_product, self.by_region]
+        if self.rollups is not None:
+            frames += list(self.rollups.cubes.values())
+        size = sum(int(frame.memory_usage(deep=True, index=True).sum()) for frame in frames)
+        if self.sketches is not None:
+            size += sum(table.memory_bytes for table in self.sketches.tables.values())
+        return size
+
+    def fingerprint(self) -> str:
+        """Content hash of the aggregates, taken when data is loaded; appends use `extend_fingerprint`.
+
+        Covers the product x region cube, the day cube (so moved dates count) and the revenue
+        sketches (so quantiles count), each in key order so equal data hashes equally across reloads.
+        """
+        digest = hashlib.sha256()
+        cubes = [self.cube] + ([self.rollups.cubes['day']] if self.rollups is not None else [])
+        for cube in cubes:
+            digest.update(pd.util.hash_pandas_object(cube.sort_index(), index=True).to_numpy().tobytes())
+        if self.sketches is not None:
+            for dimension, table in self.sketches.tables.items():
+                labels = sorted(table.labels)
+                rows = [table.labels[label] for label in labels]
+                digest.update(f"{dimension}|{'|'.join(labels)}".encode("utf-8"))
+                digest.update(table.offsets[rows].tobytes())
+                digest.update(table.zeros[rows].tobytes())
+                for row in rows:
+                    digest.update(table.buckets[row].tobytes())
+        return digest.hexdigest()[:16]
+
+    @staticmethod
+    def extend_fingerprint(fingerprint: str, new_rows: pd.DataFrame) -> str:
+        """Fingerprint after appending `new_rows` to data with `fingerprint`, hashing only the batch"""
+        digest = hashlib.sha256(f"{fingerprint}|{'|'.join(map(str, new_rows.columns))}".encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(new_rows, index=False).to_numpy().tobytes())
+        return digest.hexdigest()[:16]
+
+    # Derived statistics
+
+    @property
+    def total_sales(self) -> int:
+        return int(self.by_product['sales_count'].sum())
+
+    @property
+    def total_revenue(self) -> float:
+        return float(self.by_product['revenue_sum'].sum())
+
+    @staticmethod
+    def stats(table: pd.DataFrame) -> pd.DataFrame:
+        """Add mean and variance columns to a product or region table"""
+        out = table.copy()
+        out['revenue_mean'] = out['revenue_sum'] / out['sales_count']
+        out['revenue_var'] = (out['revenue_sumsq'] / out['sales_count'] - out['revenue_mean'] ** 2).clip(lower=0)
+        return out
+
+    def summary(self) -> dict:
+        """Summary statistics in the shape returned by sales_data.get_data_summary"""
+        product_revenue = self.by_product['revenue_sum'].sort_index()
+        region_revenue = self.by_region['revenue_sum'].sort_index()
+        total_sales = self.total_sales
+        total_revenue = self.total_revenue
+        return {
+            'total_revenue': total_revenue,
+            'total_sales': total_sales,
+            'average_revenue': total_revenue / total_sales,
+            'top_product': str(product_revenue.idxmax()),
+            'top_product_revenue': float(product_revenue.max()),
+            'sales_by_region': {str(k): float(v) for k, v in region_revenue.items()},
+            'products': [str(p) for p in self.by_product.index],
+            'regions': [str(r) for r in self.by_region.index],
+            **({'revenue_percentiles': self.revenue_percentiles()} if self.sketches is not None and total_sales else {}),
+            **({'trend': self.trend_summary()} if self.rollups is not None and not self.rollups.empty else {})
+        }
+
+    def revenue_percentiles(self, product: str = None, region: str = None) -> dict:
+        """Median, p90 and p99 revenue per sale from the quantile sketches"""
+        values = self.sketches.quantiles([0.5, 0.9, 0.99], product, region)
+        return dict(zip(['p50', 'p90', 'p99'], values)) if values is not None else None
+
+    def trend_summary(self) -> dict:
+        """Date range and latest month/quarter compared with the period before, from the rollups"""
+        days = self.rollups.cubes['day'].index.get_level_values('day')
+        return {
+            'start': days.min().strftime('%Y-%m-%d'),
+            'end': days.max().strftime('%Y-%m-%d'),
+            'month': self.rollups.period_over_period('month'),
+            'quarter': self.rollups.period_over_period('quarter')
+        }
+
+    def trend_breakdown(self, months: int = 12) -> str:
+        """Monthly revenue and per-region quarter-over-quarter change for the LLM prompt"""
+        if self.rollups is None or self.rollups.empty:
+            return ""
+        monthly = self.rollups.series('month').tail(months)
+        text = "\nMONTHLY TREND:\n"
+        for start, row in zip(monthly.index, monthly.itertuples(index=False)):
+            text += f"- {period_label(start, 'month')}: {int(row.sales_count)} sales, Revenue ₹{row.revenue_sum:,.0f}\n"
+
+        text += "\nREGION TREND (latest quarter vs previous):\n"
+        for region in self.by_region.sort_index().index:
+            change = self.rollups.period_over_period('quarter', region=region)
+            if change is None:
+                continue
+            text += f"- {region}: {change['period']} ₹{change['revenue']:,.0f}"
+            if change['previous_period'] is not None:
+                text += f" vs {change['previous_period']} ₹{change['previous_revenue']:,.0f}"
+                if change['change_pct'] is not None:
+                    text += f" ({change['change_pct']:+.1f}%)"
+            text += "\n"
+        return text
+
+    def detailed_breakdown(self) -> str:
+        """Product, region and top performer breakdown text for the LLM prompt"""
+        product_stats = self.stats(self.by_product).sort_index().round(2)
+        region_stats = self.stats(self.by_region).sort_index().round(2)
+
+        product_breakdown = "PRODUCT ANALYSIS:\n"
+        for product, row in zip(product_stats.index, product_stats.itertuples(index=False)):
+            product_breakdown += f"- {product}: {int(row.sales_count)} sales, Total Revenue ₹{row.revenue_sum:,.0f}, Avg Revenue/Sale ₹{row.revenue_mean:,.2f}, Total Quantity {int(row.quantity_sum)}\n"
+
+        region_breakdown = "\nREGION ANALYSIS:\n"
+        for region, row in zip(region_stats.index, region_stats.itertuples(index=False)):
+            region_breakdown += f"- {region}: {int(row.sales_count)} sales, Total Revenue ₹{row.revenue_sum:,.0f}, Avg Revenue/Sale ₹{row.revenue_mean:,.2f}\n"
+
+        # Top performers
+        top_product = product_stats['revenue_sum'].idxmax()
+        top_region = region_stats['revenue_sum'].idxmax()
+        top_performers = (
+            f"\nTOP PERFORMERS:\n"
+            f"- Best Product: {top_product} (₹{product_stats.loc[top_product, 'revenue_sum']:,.0f})\n"
+            f"- Best Region: {top_region} (₹{region_stats.loc[top_region, 'revenue_sum']:,.0f})\n"
+        )
+
+        return product_breakdown + region_breakdown + top_performers + self.trend_breakdown()
+
+
+class GroupedStats:
+    """Revenue sum, count, mean and median per group, one groupby().agg() per dimension.
+
+    Frames are computed on first use and reused for the lifetime of the dataset version.
+    Medians are not mergeable, so unlike AggregateStore this is built from the raw rows.
+    """
+
+    def __init__(self, sales_df: pd.DataFrame):
+        self.sales_df = sales_df
+        self._frames = {}
+        self._median = None
+
+    def frame(self, *by: str) -> pd.DataFrame:
+        """Stats grouped by one or more of 'product', 'region', sorted by key"""
+        by = by or ('product',)
+        if by not in self._frames:
+            grouped = self.sales_df.groupby(list(by), observed=True)['revenue']
+            self._frames[by] = grouped.agg(['sum', 'count', 'mean', 'median'])
+        return self._frames[by]
+
+    @property
+    def median(self) -> float:
+        if self._median is None:
+            self._median = self.sales_df['revenue'].median()
+        return self._median
@@ -0,0 +1,181 @@
+"""
+Deterministic answer cache keyed on question, dataset fingerprint and prompt/model config
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip(" ?!.")
+
+
+def make_key(question: str, dataset_fingerprint: str, config_fingerprint: str) -> str:
+    raw = f"{dataset_fingerprint}|{config_fingerprint}|{normalize_question(question)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryBackend:
+    """In-process LRU dict with TTL expiry"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            answer, latency_ms, dataset, created = entry
+            if self.ttl_seconds is not None and time.time() - created > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return answer, latency_ms
+
+    def set(self, key: str, answer: str, latency_ms: float, dataset: str) -> None:
+        with self._lock:
+            self._entries[key] = (answer, latency_ms, dataset, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def purge_except(self, dataset: str) -> None:
+        """Drop entries computed against any other dataset"""
+        with self._lock:
+            for key in [k for k, v in self._entries.items() if v[2] != dataset]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """On-disk LRU/TTL cache that survives restarts"""
+
+    def __init__(self, path: str = "answer_cache.db", max_entries: int = 1024,
+                 ttl_seconds: Optional[float] = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, answer TEXT, latency_ms REAL, dataset TEXT, "
+            "created REAL, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_lru ON answers(last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[tuple]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, latency_ms, created FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            answer, latency_ms, created = row
+            if self.ttl_seconds is not None and now - created > self.ttl_seconds:
+                self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE answers SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return answer, latency_ms
+
+    def set(self, key: str, answer: str, latency_ms: float, dataset: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?)",
+                (key, answer, latency_ms, dataset, now, now)
+            )
+            self._conn.execute(
+                "DELETE FROM answers WHERE key IN ("
+                "SELECT key FROM answers ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def purge_except(self, dataset: str) -> None:
+        """Drop entries computed against any other dataset"""
+        with self._lock:
+            self._conn.execute("DELETE FROM answers WHERE dataset != ?", (dataset,))
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+
+class AnswerCache:
+    """Answer cache that invalidates itself whenever the dataset fingerprint changes"""
+
+    def __init__(self, backend=None, config_fingerprint: str = ""):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.config_fingerprint = config_fingerprint
+        self.dataset_fingerprint = ""
+        self.hits = 0
+        self.misses = 0
+        self.saved_latency_ms = 0.0
+
+    def set_dataset(self, fingerprint: str) -> None:
+        """Point the cache at a new dataset version, discarding answers for older ones"""
+        if fingerprint != self.dataset_fingerprint:
+            self.dataset_fingerprint = fingerprint
+            self.backend.purge_except(fingerprint)
+
+    def get(self, question: str, dataset: str = None) -> Optional[str]:
+        """Cached answer for `question` against `dataset` (default: the current dataset)"""
+        dataset = dataset or self.dataset_fingerprint
+        entry = self.backend.get(make_key(question, dataset, self.config_fingerprint))
+        if entry is None:
+            self.misses += 1
+            return None
+        answer, latency_ms = entry
+        self.hits += 1
+        self.saved_latency_ms += latency_ms
+        return answer
+
+    def set(self, question: str, answer: str, latency_ms: float, dataset: str = None) -> None:
+        """Store an answer computed against `dataset`; answers for superseded datasets are dropped"""
+        dataset = dataset or self.dataset_fingerprint
+        if dataset != self.dataset_fingerprint:
+            return
+        self.backend.set(make_key(question, dataset, self.config_fingerprint), answer, latency_ms, dataset)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_latency_ms": round(self.saved_latency_ms, 2),
+            "dataset_fingerprint": self.dataset_fingerprint
+        }
+
+
+def build_answer_cache(config: dict, config_fingerprint: str = "") -> Optional[AnswerCache]:
+    """Create the answer cache described by config.json, or None when it is disabled"""
+    backend_name = config.get("answer_cache_backend", "memory")
+    max_entries = config.get("answer_cache_max_entries", 1024)
+    ttl_seconds = config.get("answer_cache_ttl_seconds", 3600)
+    if backend_name == "none":
+        return None
+    if backend_name == "sqlite":
+        backend = SQLiteBackend(config.get("answer_cache_path", "answer_cache.db"), max_entries, ttl_seconds)
+    else:
+        backend = MemoryBackend(max_entries, ttl_seconds)
+    return AnswerCache(backend, config_fingerprint)
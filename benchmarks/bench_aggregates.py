@@ -0,0 +1,89 @@
+"""
+Benchmark: AggregateStore vs the original groupby-based summary and breakdown
+
+Usage:
+    python -m benchmarks.bench_aggregates [rows ...]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from aggregates import AggregateStore
+
+PRODUCTS = ['Laptop', 'Mouse', 'Keyboard', 'Monitor', 'Headphones', 'USB Cable']
+REGIONS = ['North', 'South', 'East', 'West']
+
+
+def make_sales(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Random sales rows with the same schema as get_sales_data"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'sale_id': np.arange(1, rows + 1),
+        'product': rng.choice(PRODUCTS, rows),
+        'region': rng.choice(REGIONS, rows),
+        'revenue': rng.integers(200, 50000, rows),
+        'quantity': rng.integers(1, 6, rows),
+    })
+
+
+def legacy_summary(df):
+    """Original sales_data.get_data_summary"""
+    return {
+        'total_revenue': float(df['revenue'].sum()),
+        'total_sales': int(len(df)),
+        'average_revenue': float(df['revenue'].mean()),
+        'top_product': str(df.groupby('product')['revenue'].sum().idxmax()),
+        'top_product_revenue': float(df.groupby('product')['revenue'].sum().max()),
+        'sales_by_region': {str(k): float(v) for k, v in df.groupby('region')['revenue'].sum().to_dict().items()},
+        'products': df['product'].astype(str).unique().tolist(),
+        'regions': df['region'].astype(str).unique().tolist()
+    }
+
+
+def legacy_breakdown(df):
+    """Original FinBot.prepare_detailed_data"""
+    product_stats = df.groupby('product').agg({'revenue': ['sum', 'mean', 'count'], 'quantity': 'sum'}).round(2)
+    text = "PRODUCT ANALYSIS:\n"
+    for product in product_stats.index:
+        text += (f"- {product}: {int(product_stats.loc[product, ('revenue', 'count')])} sales, "
+                 f"Total Revenue ₹{product_stats.loc[product, ('revenue', 'sum')]:,.0f}\n")
+    region_stats = df.groupby('region').agg({'revenue': ['sum', 'mean', 'count'], 'quantity': 'sum'}).round(2)
+    text += "\nREGION ANALYSIS:\n"
+    for region in region_stats.index:
+        text += (f"- {region}: {int(region_stats.loc[region, ('revenue', 'count')])} sales, "
+                 f"Total Revenue ₹{region_stats.loc[region, ('revenue', 'sum')]:,.0f}\n")
+    return text
+
+
+def timed(fn, *args, repeat=3):
+    """Best-of-N wall time in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run(rows: int):
+    df = make_sales(rows)
+    batch = make_sales(max(rows // 1000, 1), seed=1)
+    store = AggregateStore.from_frame(df)
+
+    legacy = timed(legacy_summary, df) + timed(legacy_breakdown, df)
+    build = timed(AggregateStore.from_frame, df)
+    serve = timed(store.summary) + timed(store.detailed_breakdown)
+    append_rescan = timed(lambda: legacy_summary(pd.concat([df, batch], ignore_index=True)))
+    append_incremental = timed(store.update, batch, repeat=1)
+
+    print(f"{rows:>12,} rows | legacy recompute {legacy:10.1f} ms | store build {build:10.1f} ms | "
+          f"store serve {serve:7.2f} ms | append rescan {append_rescan:10.1f} ms | "
+          f"append incremental {append_incremental:7.2f} ms")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 1_000_000, 10_000_000]
+    for size in sizes:
+        run(size)
@@ -0,0 +1,84 @@
+"""
+Benchmark: one POST /ask/batch vs N sequential POST /ask calls against a fake LLM
+
+Half of the questions are answered by computed handlers, the rest need the LLM. Runs the
+FastAPI app in-process with the answer cache disabled.
+
+Usage:
+    python -m benchmarks.bench_batch --latency 0.2 --questions 10 50 100
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+COMPUTED = ["What is the total revenue?", "Show me sales by region", "How is our North region performing?",
+            "What is the average revenue per sale?", "Top 3 products"]
+
+
+def make_questions(count: int) -> list:
+    questions = []
+    for i in range(count):
+        if i % 2:
+            questions.append(COMPUTED[i // 2 % len(COMPUTED)])
+        else:
+            questions.append(f"What should we focus on next quarter, option {i}?")
+    return questions
+
+
+async def sequential(client, questions):
+    for question in questions:
+        response = await client.post("/ask", json={"question": question})
+        response.raise_for_status()
+
+
+async def batched(client, questions, max_concurrency):
+    response = await client.post("/ask/batch", json={"questions": questions, "max_concurrency": max_concurrency})
+    response.raise_for_status()
+    return response.json()
+
+
+async def run(args):
+    import main
+    from agent import FinBot
+    from fake_llm import FakeChatModel
+    from llm_limiter import LLMLimiter
+
+    main.startup()  # ASGITransport does not run the lifespan hook
+    main.finbot = FinBot(llm=FakeChatModel(latency=args.latency))
+    main.llm_limiter = LLMLimiter(args.max_concurrency, 64)
+    main.answer_cache = None
+    main.semantic_cache = None
+    main.config["max_batch_questions"] = max(args.questions)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://finbot", timeout=600) as client:
+        for count in args.questions:
+            questions = make_questions(count)
+
+            start = time.perf_counter()
+            await sequential(client, questions)
+            sequential_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            body = await batched(client, questions, args.max_concurrency)
+            batch_s = time.perf_counter() - start
+            statuses = {r["status"] for r in body["results"]}
+
+            print(f"{count:>4} questions ({body['llm_calls']} LLM) | sequential {sequential_s:7.2f} s "
+                  f"{count / sequential_s:7.1f} q/s | batch {batch_s:6.2f} s {count / batch_s:7.1f} q/s | "
+                  f"{sequential_s / batch_s:5.1f}x | status {sorted(statuses)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake LLM latency in seconds")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
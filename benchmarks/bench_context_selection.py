@@ -0,0 +1,64 @@
+"""
+Benchmark: prompt size and build time of the full breakdown vs the token-budgeted selection
+
+Usage:
+    python -m benchmarks.bench_context_selection [--budget 2000] [--products 10 100 1000 10000 100000]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from aggregates import AggregateStore
+from prompt_context import ContextSelector, estimate_tokens
+
+
+def make_catalog(products: int, regions: int, rows: int, seed: int = 0) -> pd.DataFrame:
+    """Sales rows over a synthetic catalog with skewed product popularity"""
+    rng = np.random.default_rng(seed)
+    names = np.array([f"SKU-{i:06d}" for i in range(products)])
+    weights = 1 / np.arange(1, products + 1)
+    return pd.DataFrame({
+        'sale_id': np.arange(1, rows + 1),
+        'product': names[rng.choice(products, rows, p=weights / weights.sum())],
+        'region': np.array([f"Region {i}" for i in range(regions)])[rng.integers(0, regions, rows)],
+        'revenue': rng.integers(200, 50000, rows),
+        'quantity': rng.integers(1, 6, rows),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget", type=int, default=2000)
+    parser.add_argument("--products", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--regions", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'products':>9} | {'full tokens':>11} | {'full build ms':>13} | "
+          f"{'selected tokens':>15} | {'select ms':>9} | {'sent tokens':>11}")
+    for products in args.products:
+        regions = min(args.regions, max(4, products // 2))
+        df = make_catalog(products, regions, rows=max(products * 5, 1000))
+        store = AggregateStore.from_frame(df)
+        selector = ContextSelector(args.budget)
+        question = "How is SKU-000003 doing in Region 1 compared with the top products?"
+
+        start = time.perf_counter()
+        full = store.detailed_breakdown()
+        full_ms = (time.perf_counter() - start) * 1000
+
+        selector.select(question, store)  # warm the entity index, built once per dataset version
+        start = time.perf_counter()
+        selected = selector.select(question, store)
+        select_ms = (time.perf_counter() - start) * 1000
+
+        # FinBot only switches to the selection once the full breakdown exceeds the budget
+        full_tokens = estimate_tokens(full)
+        sent = full_tokens if full_tokens <= args.budget else estimate_tokens(selected)
+        print(f"{products:>9,} | {full_tokens:>11,} | {full_ms:>13.1f} | "
+              f"{estimate_tokens(selected):>15,} | {select_ms:>9.1f} | {sent:>11,}")
+
+
+if __name__ == "__main__":
+    main()
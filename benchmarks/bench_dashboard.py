@@ -0,0 +1,103 @@
+"""
+Benchmark: dashboard data loading, pre-aggregated endpoints vs downloading the full table
+
+One dashboard render is timed end to end in-process (ASGI transport, no network): the HTTP
+requests the Streamlit frontend makes plus building its DataFrames and Plotly figures.
+
+- aggregated: /ready, /summary, /charts/revenue by product and region, /charts/revenue-histogram
+  and the first page of /sales-data, as frontend.py does now
+- full table: /summary and all of /sales-data, then the groupbys and the row-level histogram the
+  frontend used to compute on every rerun (skipped above --full-max-rows)
+
+"cold" is the first render after a new dataset version, "warm" the median of later renders
+(the frontend's own TTL caches would skip even those requests).
+
+Usage:
+    python -m benchmarks.bench_dashboard [--rows 20 100000 1000000 10000000] [--full-max-rows 1000000]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+import pandas as pd
+import plotly.express as px
+
+from benchmarks.bench_aggregates import make_sales
+from benchmarks.bench_ingest import FrameSource
+from data_store import DataStore
+
+
+async def aggregated_render(client) -> int:
+    received = 0
+
+    async def get(path, **params):
+        nonlocal received
+        response = await client.get(path, params=params)
+        response.raise_for_status()
+        received += len(response.content)
+        return response.json()
+
+    await get("/ready")
+    await get("/summary")
+    products = pd.DataFrame((await get("/charts/revenue", by="product", limit=20))["series"])
+    regions = pd.DataFrame((await get("/charts/revenue", by="region", limit=20))["series"])
+    histogram = pd.DataFrame((await get("/charts/revenue-histogram", bins=10))["bins"])
+    page = pd.DataFrame((await get("/sales-data", limit=100))["data"])
+    px.bar(products, x="label", y="revenue")
+    px.pie(regions, values="revenue", names="label")
+    px.bar(histogram.assign(revenue=(histogram["start"] + histogram["end"]) / 2), x="revenue", y="count")
+    assert len(page) > 0
+    return received
+
+
+async def full_table_render(client) -> int:
+    summary = await client.get("/summary")
+    response = await client.get("/sales-data")
+    df = pd.DataFrame(response.json()["data"])
+    px.bar(df.groupby("product")["revenue"].sum().reset_index(), x="product", y="revenue")
+    px.pie(df.groupby("region")["revenue"].sum().reset_index(), values="revenue", names="region")
+    px.histogram(df, x="revenue", nbins=10)
+    return len(summary.content) + len(response.content)
+
+
+async def time_renders(app, render, repeat: int) -> tuple:
+    """(cold ms, warm median ms, bytes per render)"""
+    transport = httpx.ASGITransport(app=app)
+    timings = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://finbot", timeout=600) as client:
+        for _ in range(repeat + 1):
+            start = time.perf_counter()
+            received = await render(client)
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings[0], statistics.median(timings[1:]), received
+
+
+def main():
+    import main as server
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[20, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--full-max-rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    server.startup()  # ASGITransport does not run the lifespan hook
+    print(f"{'rows':>10} | {'aggregated cold ms':>18} | {'warm ms':>7} | {'KiB':>6} | "
+          f"{'full table cold ms':>18} | {'warm ms':>8} | {'KiB':>9}")
+    for rows in args.rows:
+        server.data_store = DataStore(FrameSource(make_sales(rows)))
+        cold, warm, received = asyncio.run(time_renders(server.app, aggregated_render, args.repeat))
+        line = f"{rows:>10,} | {cold:18.1f} | {warm:7.1f} | {received / 1024:6.1f} | "
+        if rows <= args.full_max_rows:
+            server.data_store = DataStore(FrameSource(make_sales(rows)))
+            cold, warm, received = asyncio.run(time_renders(server.app, full_table_render, min(args.repeat, 2)))
+            line += f"{cold:18.1f} | {warm:8.1f} | {received / 1024:9,.0f}"
+        else:
+            line += f"{'skipped':>18} | {'':>8} | {'':>9}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
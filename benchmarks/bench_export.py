@@ -0,0 +1,77 @@
+"""
+Benchmark: /sales-data export formats at 1M rows
+
+Each format runs in a fresh process so peak RSS is attributable to that format alone.
+"legacy" is the original to_dict(orient="records") JSON response.
+
+Usage:
+    python -m benchmarks.bench_export [rows]
+"""
+import gzip
+import json
+import multiprocessing
+import resource
+import sys
+import time
+import zlib
+
+FORMATS = ["legacy", "json", "ndjson", "csv", "arrow", "parquet"]
+
+
+def _reset_peak_rss():
+    """Reset VmHWM so the next reading covers only the encode step (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _rss_mb(field: str) -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(fmt: str, rows: int, results):
+    from benchmarks.bench_aggregates import make_sales
+    from export import export_stream
+
+    df = make_sales(rows)
+    baseline_rss = _rss_mb("VmRSS")
+    _reset_peak_rss()
+    start = time.perf_counter()
+    raw_bytes = 0
+    gz = 0
+    if fmt == "legacy":
+        body = json.dumps({"data": df.to_dict(orient="records")}).encode("utf-8")
+        raw_bytes = len(body)
+        elapsed = time.perf_counter() - start
+        gz = len(gzip.compress(body, compresslevel=6))
+    else:
+        # gzip framing, as applied by GZipMiddleware to each streamed chunk
+        encoder = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in export_stream(df, fmt, {}, None):
+            raw_bytes += len(chunk)
+            gz += len(encoder.compress(chunk))
+        gz += len(encoder.flush())
+        elapsed = time.perf_counter() - start
+    results.put((fmt, raw_bytes, gz, elapsed, _rss_mb("VmHWM") - baseline_rss))
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    queue = multiprocessing.Queue()
+    print(f"{rows:,} rows")
+    print(f"{'format':>8} | {'bytes':>12} | {'gzip bytes':>12} | {'encode s':>8} | {'extra RSS MB':>12}")
+    for fmt in FORMATS:
+        process = multiprocessing.Process(target=measure, args=(fmt, rows, queue))
+        process.start()
+        name, raw, gz, elapsed, rss = queue.get()
+        process.join()
+        print(f"{name:>8} | {raw:>12,} | {gz:>12,} | {elapsed:>8.2f} | {rss:>12.1f}")
@@ -0,0 +1,81 @@
+"""
+Benchmark: append ingest throughput while concurrent readers query the current snapshot
+
+Readers answer from the snapshot's aggregates and summary, so they never wait on the
+row concatenation that the first raw-row reader of each version pays.
+
+Usage:
+    python -m benchmarks.bench_ingest [--rows 1000000] [--batch 10000] [--readers 4] [--seconds 10]
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.bench_aggregates import make_sales
+from data_store import DataStore
+from query_router import router
+from sales_data import SalesDataSource
+
+
+class FrameSource(SalesDataSource):
+    name = "benchmark"
+
+    def __init__(self, df):
+        super().__init__()
+        self.df = df
+
+    def _read(self):
+        return self.df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    store = DataStore(FrameSource(make_sales(args.rows)))
+    batches = [make_sales(args.batch, seed=i).drop(columns='sale_id') for i in range(8)]
+    stop = threading.Event()
+    read_latencies = []
+    ingested = 0
+
+    def reader():
+        while not stop.is_set():
+            start = time.perf_counter()
+            snapshot = store.snapshot
+            router.answer("How is our North region performing?", snapshot.context)
+            snapshot.data_summary['total_revenue']
+            read_latencies.append((time.perf_counter() - start) * 1000)
+
+    def writer():
+        nonlocal ingested
+        index = 0
+        while not stop.is_set():
+            store.append(batches[index % len(batches)])
+            ingested += args.batch
+            index += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)] + [threading.Thread(target=writer)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    read_latencies.sort()
+    p50 = read_latencies[len(read_latencies) // 2]
+    p99 = read_latencies[int(len(read_latencies) * 0.99)]
+    print(f"base rows {args.rows:,}, batch {args.batch:,}, {args.readers} readers, {elapsed:.1f}s")
+    print(f"ingest: {ingested / elapsed:,.0f} rows/s ({store.snapshot.version - 1} versions published)")
+    print(f"reads:  {len(read_latencies) / elapsed:,.0f} reads/s, p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+    print(f"final rows: {store.snapshot.aggregates.total_sales:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark: predefined responses from precomputed grouped stats vs the original per-call scans
+
+Each handler is timed three ways: the original implementation, a cold call that builds the
+grouped stats it needs, and a warm call that reuses them as a DataSnapshot does.
+
+Usage:
+    python -m benchmarks.bench_predefined [rows ...] [--groups n ...]
+        (default 1k, 100k, 1M, 10M rows x 10, 100, 1k, 10k groups; needs roughly 1 GB of RAM)
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from agent import FinBot
+from aggregates import GroupedStats
+from sales_data import get_data_summary
+
+QUERY_TYPES = ["total_revenue", "top_product", "average_revenue", "sales_by_region", "total_sales"]
+
+# Skip the original sales_by_region above this many row scans; it is O(rows x regions)
+LEGACY_SCAN_LIMIT = 2_000_000_000
+
+
+def make_grouped_sales(rows: int, groups: int, seed: int = 0) -> pd.DataFrame:
+    """Random sales with `groups` products and `groups` regions, categorical like the data sources load them"""
+    rng = np.random.default_rng(seed)
+    names = [f"G{i:05d}" for i in range(groups)]
+    return pd.DataFrame({
+        'sale_id': np.arange(1, rows + 1, dtype='int64'),
+        'product': pd.Categorical.from_codes(rng.integers(0, groups, rows), names),
+        'region': pd.Categorical.from_codes(rng.integers(0, groups, rows), names),
+        'revenue': rng.integers(200, 50000, rows, dtype='int32'),
+        'quantity': rng.integers(1, 6, rows, dtype='int8'),
+    })
+
+
+def legacy_response(query_type, data_summary, sales_df):
+    """Original FinBot.get_predefined_response detailed branches"""
+    if query_type == "total_revenue":
+        return f"Our total revenue across all {data_summary['total_sales']} sales is ₹{data_summary['total_revenue']:,}."
+    elif query_type == "top_product":
+        product_revenue = sales_df.groupby('product', observed=True)['revenue'].sum().sort_values(ascending=False)
+        return f"{product_revenue.index[0]} {product_revenue.iloc[0]:,.0f} {product_revenue.index[1]} {product_revenue.iloc[1]:,.0f}"
+    elif query_type == "average_revenue":
+        return f"{data_summary['average_revenue']:,.2f} {sales_df['revenue'].median():,.2f}"
+    elif query_type == "sales_by_region":
+        region_revenue = sales_df.groupby('region', observed=True)['revenue'].sum().sort_values(ascending=False)
+        response = ""
+        for region, revenue in region_revenue.items():
+            count = len(sales_df[sales_df['region'] == region])
+            response += f"• **{region}**: ₹{revenue:,} ({count} sales, avg ₹{revenue / count:,.2f}/sale)\n"
+        return response
+    elif query_type == "total_sales":
+        return f"{sales_df['product'].nunique()} {sales_df['region'].nunique()}"
+
+
+def timed_ms(fn, *args, repeat=3, **kwargs):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def cold_response(query_type, data_summary, sales_df):
+    return FinBot.get_predefined_response(query_type, data_summary, sales_df)
+
+
+def parse_args(argv):
+    sizes, groups, target = [], [], None
+    for arg in argv:
+        if arg == "--groups":
+            target = groups
+        else:
+            (sizes if target is None else target).append(int(arg))
+    return sizes or [1_000, 100_000, 1_000_000, 10_000_000], groups or [10, 100, 1_000, 10_000]
+
+
+if __name__ == "__main__":
+    sizes, group_counts = parse_args(sys.argv[1:])
+    print(f"{'rows':>12} {'groups':>7} {'handler':<16} {'original ms':>12} {'cold ms':>10} {'warm ms':>10}")
+    for rows in sizes:
+        for groups in group_counts:
+            if groups > rows:
+                continue
+            df = make_grouped_sales(rows, groups)
+            summary = get_data_summary(df)
+            grouped = GroupedStats(df)
+            for query_type in QUERY_TYPES:
+                repeat = 1 if rows >= 1_000_000 else 3
+                if query_type == "sales_by_region" and rows * groups > LEGACY_SCAN_LIMIT:
+                    legacy = "skipped"
+                else:
+                    legacy = f"{timed_ms(legacy_response, query_type, summary, df, repeat=repeat):.2f}"
+                cold = timed_ms(cold_response, query_type, summary, df, repeat=repeat)
+                warm = timed_ms(FinBot.get_predefined_response, query_type, summary, grouped=grouped)
+                print(f"{rows:>12,} {groups:>7,} {query_type:<16} {legacy:>12} {cold:>10.2f} {warm:>10.2f}")
@@ -0,0 +1,63 @@
+"""
+Benchmark: per-request prompt preparation overhead, excluding the LLM call
+
+"before" rebuilds the template and chain and re-renders the data blocks on every request,
+as FinBot.get_response originally did. "after" uses the precompiled chain and ContextRenderer.
+
+Usage:
+    python -m benchmarks.bench_prompt_overhead [rows] [iterations]
+"""
+import sys
+import time
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from agent import FinBot
+from aggregates import AggregateStore
+from benchmarks.bench_aggregates import make_sales
+from fake_llm import FakeChatModel
+from prompt_context import format_summary
+from sales_data import get_data_summary
+
+
+def before(finbot, question, data_summary, sales_df):
+    inputs = {
+        "detailed_data": finbot.prepare_detailed_data(sales_df),
+        "data_summary": format_summary(data_summary),
+        "question": question
+    }
+    prompt = ChatPromptTemplate.from_template(finbot.system_prompt)
+    chain = prompt | finbot.llm | StrOutputParser()
+    return chain, prompt.format_messages(**inputs)
+
+
+def after(finbot, question, data_summary, aggregates):
+    inputs = finbot._prepare_inputs(question, data_summary, aggregates=aggregates)
+    return finbot.chain, finbot.prompt.format_messages(**inputs)
+
+
+def per_call_us(fn, iterations, *args):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(*args)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    sales_df = make_sales(rows)
+    aggregates = AggregateStore.from_frame(sales_df)
+    data_summary = get_data_summary(sales_df, aggregates)
+    finbot = FinBot(llm=FakeChatModel())
+    question = "Summarize key takeaways from current sales data."
+
+    assert before(finbot, question, data_summary, sales_df)[1] == after(finbot, question, data_summary, aggregates)[1]
+
+    old = per_call_us(before, iterations, finbot, question, data_summary, sales_df)
+    new = per_call_us(after, iterations, finbot, question, data_summary, aggregates)
+    print(f"{rows:,} rows, {iterations} requests")
+    print(f"before: {old:10.1f} us/request")
+    print(f"after:  {new:10.1f} us/request  ({old / new:.0f}x less overhead)")
@@ -0,0 +1,108 @@
+"""
+Benchmark: analytical questions answered from executed query plans vs the full-context LLM prompt
+
+For each question: rule planning time (cold and from the plan cache), plan execution time on
+sales_df (cold and from the result cache), and prompt tokens sent to the LLM when it only
+phrases the computed result, against the full-context prompt (complete breakdown, and the
+token-budgeted selection the server uses by default).
+
+Usage:
+    python -m benchmarks.bench_query_plan [--rows 100000 1000000] [--products 1000] [--regions 50]
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+from agent import FinBot
+from aggregates import AggregateStore
+from benchmarks.bench_context_selection import make_catalog
+from data_store import DataSnapshot
+from fake_llm import FakeChatModel
+from prompt_context import estimate_tokens
+from query_plan import QueryEngine, execute_plan, format_result
+from sales_data import optimize_dtypes
+
+QUESTIONS = [
+    "What is the average SKU-000003 revenue in Region 1?",
+    "How many sales of SKU-000010 over 20k?",
+    "Top 5 products by units sold in Region 7",
+    "Which region has the lowest total revenue?",
+    "Median revenue by region for SKU-000001",
+    "Total revenue in March 2025",
+]
+
+
+def make_sales(rows: int, products: int, regions: int) -> pd.DataFrame:
+    df = make_catalog(products, regions, rows)
+    rng = np.random.default_rng(1)
+    df['date'] = pd.Timestamp("2024-07-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D")
+    return optimize_dtypes(df)
+
+
+def best_ms(fn, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def prompt_tokens(prompt, inputs: dict) -> int:
+    return sum(estimate_tokens(message.content) for message in prompt.format_messages(**inputs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--regions", type=int, default=50)
+    parser.add_argument("--budget", type=int, default=2000)
+    args = parser.parse_args()
+
+    full_bot = FinBot(llm=FakeChatModel())
+    budget_bot = FinBot(llm=FakeChatModel(), context_token_budget=args.budget)
+
+    for rows in args.rows:
+        df = make_sales(rows, args.products, args.regions)
+        aggregates = AggregateStore.from_frame(df)
+        snapshot = DataSnapshot([df], aggregates, version=1, next_sale_id=rows + 1)
+        engine = QueryEngine()
+
+        # Sanity check against plain pandas
+        plan = engine.plan(QUESTIONS[0], snapshot)
+        expected = df[(df['product'] == 'SKU-000003') & (df['region'] == 'Region 1')]['revenue'].mean()
+        assert abs(execute_plan(plan, df)['value'].iloc[0] - expected) < 1e-6
+
+        print(f"\n{rows:,} rows, {args.products:,} products, {args.regions} regions")
+        print(f"{'question':<52} | {'plan ms':>7} | {'cached':>6} | {'exec ms':>7} | {'cached':>6} | "
+              f"{'full ctx ms':>11} | {'tokens full/budget/plan':>23}")
+        reductions = []
+        for question in QUESTIONS:
+            engine.plans = type(engine.plans)(engine.plans.max_entries)
+            start = time.perf_counter()
+            plan = engine.plan(question, snapshot)
+            plan_ms = (time.perf_counter() - start) * 1000
+            plan_cached_ms = best_ms(lambda: engine.plan(question, snapshot))
+            exec_ms = best_ms(lambda: execute_plan(plan, df))
+            engine.execute(plan, snapshot)
+            exec_cached_ms = best_ms(lambda: engine.execute(plan, snapshot))
+            result = format_result(plan, engine.execute(plan, snapshot))
+
+            full_bot.renderer = type(full_bot.renderer)()
+            context_ms = best_ms(lambda: budget_bot._prepare_inputs(question, snapshot.data_summary, aggregates=aggregates), 3)
+            full_tokens = prompt_tokens(full_bot.prompt, full_bot._prepare_inputs(question, snapshot.data_summary, aggregates=aggregates))
+            budget_tokens = prompt_tokens(budget_bot.prompt, budget_bot._prepare_inputs(question, snapshot.data_summary, aggregates=aggregates))
+            plan_tokens = prompt_tokens(full_bot.result_prompt, {"question": question, "plan": plan.describe(), "result": result})
+            reductions.append(1 - plan_tokens / budget_tokens)
+
+            print(f"{question[:52]:<52} | {plan_ms:7.3f} | {plan_cached_ms:6.3f} | {exec_ms:7.2f} | "
+                  f"{exec_cached_ms:6.3f} | {context_ms:11.2f} | {full_tokens:>9,}/{budget_tokens:>5,}/{plan_tokens:>5,}")
+        print(f"prompt tokens vs the budgeted full context: {statistics.mean(reductions):.0%} fewer on average")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark: server-side sessions, prompt size and prefix stability per turn, store cost and memory
+
+Prompt tokens per turn over a long conversation, for session prompts (compacted history) vs
+resending the full history verbatim, with the history tokens and memory of the session. The
+stable prefix is the part of the prompt shared by every turn; upstream prompt caching can only
+reuse that part. It is measured for session prompts and for the stateless /ask prompt, whose
+breakdown is selected per question.
+
+Then the store on its own: time to record a turn and to fetch a session, in memory and with
+SQLite, and memory for many sessions with the LRU bound.
+
+Usage:
+    python -m benchmarks.bench_sessions [--rows 100000] [--products 1000] [--turns 50] [--sessions 10000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from agent import FinBot
+from aggregates import AggregateStore
+from fake_llm import FakeChatModel
+from prompt_context import estimate_tokens
+from sales_data import get_data_summary
+from sessions import SessionDatabase, SessionStore
+from synthetic_data import generate_sales
+
+QUESTIONS = ["What should we focus on next quarter?", "How is SKU-000103 doing?", "And in the South?",
+             "Why is that?", "Compare it with SKU-000927", "Which region should we grow?",
+             "What are the risks there?", "Summarize what we discussed"]
+
+
+def make_answer(turn: int) -> str:
+    """A typical ~90-word answer"""
+    return (f"Turn {turn}: revenue for this segment grew steadily, led by strong unit sales in the North. "
+            + " ".join(f"Point {i}: average order value held near ₹{2000 + 37 * turn + i:,} with stable margins."
+                       for i in range(6)))
+
+
+def common_prefix(texts: list) -> int:
+    return len(os.path.commonprefix(texts))
+
+
+def prompt_sizes(args):
+    df = generate_sales(args.rows, products=args.products)
+    aggregates = AggregateStore.from_frame(df)
+    summary = get_data_summary(df, aggregates)
+    finbot = FinBot(llm=FakeChatModel(), context_token_budget=args.budget)
+    store = SessionStore()
+    session = store.create()
+
+    print(f"{args.rows:,} rows, {args.products:,} products, context budget {args.budget} tokens | "
+          f"session limits: {store.recent_turns} recent turns, {store.max_history_tokens} history tokens")
+    print(f"{'turn':>4} | {'session prompt':>14} | {'full history':>12} | {'history':>7} | {'session bytes':>13}")
+    verbatim = 0
+    session_prefixes, stateless_prompts = [], []
+    for turn in range(1, args.turns + 1):
+        question = QUESTIONS[(turn - 1) % len(QUESTIONS)]
+        inputs = finbot.session_inputs(question, session.history(), summary, aggregates=aggregates)
+        messages = finbot.conversation_prompt.format_messages(**inputs)
+        session_prefixes.append(messages[0].content)
+        tokens = finbot.session_prompt_tokens(inputs)
+        prefix_tokens = estimate_tokens(messages[0].content) + estimate_tokens(inputs["context"] + question)
+        stateless_prompts.append(finbot.prompt.format_messages(**finbot._prepare_inputs(question, summary, aggregates=aggregates))[0].content)
+
+        answer = make_answer(turn)
+        store.record(session, question, answer, tokens)
+        if turn in (1, 2, 5, 10, 20, 50, 100) or turn == args.turns:
+            print(f"{turn:>4} | {tokens:>14,} | {prefix_tokens + verbatim:>12,} | {session.history_tokens:>7,} | "
+                  f"{session.memory_bytes:>13,}")
+        verbatim += estimate_tokens(question) + estimate_tokens(answer)
+
+    identical = len(set(session_prefixes)) == 1
+    print(f"\nstable prefix across {args.turns} turns: session prompt {common_prefix(session_prefixes):,} of "
+          f"{len(session_prefixes[0]):,} system chars ({'byte-identical' if identical else 'changes'}); "
+          f"stateless prompt {common_prefix(stateless_prompts):,} of ~{len(stateless_prompts[0]):,} chars")
+
+
+def best_us(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def store_costs(args):
+    print(f"\n{'store':<8} | {'create us':>9} | {'record us':>9} | {'get us':>6} | {'sessions':>8} | "
+          f"{'memory MiB':>10} | {'bytes/session':>13}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, database in (("memory", None), ("sqlite", SessionDatabase(os.path.join(directory, "sessions.db")))):
+            store = SessionStore(max_sessions=args.sessions, database=database)
+            count = args.sessions if database is None else min(args.sessions, 2000)
+            sessions = []
+            create_us = best_us(lambda i: sessions.append(store.create()), count)
+            record_us = best_us(lambda i: store.record(sessions[i % count], QUESTIONS[i % len(QUESTIONS)],
+                                                        make_answer(i)), count * 3)
+            get_us = best_us(lambda i: store.get(sessions[i % count].id), count)
+            stats = store.stats()
+            print(f"{name:<8} | {create_us:9.1f} | {record_us:9.1f} | {get_us:6.1f} | {stats['sessions']:>8,} | "
+                  f"{stats['memory_bytes'] / 2**20:10.2f} | {stats['memory_bytes'] / stats['sessions']:13,.0f}")
+
+    # The LRU keeps memory bounded however many sessions are started
+    store = SessionStore(max_sessions=args.sessions // 10)
+    for i in range(args.sessions):
+        session = store.create()
+        for turn in range(3):
+            store.record(session, QUESTIONS[turn], make_answer(turn))
+    stats = store.stats()
+    print(f"LRU of {store.max_sessions:,}: {args.sessions:,} sessions started, {stats['sessions']:,} held, "
+          f"{stats['evicted']:,} evicted, {stats['memory_bytes'] / 2**20:.2f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--budget", type=int, default=2000, help="Context token budget, as in config.json")
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--sessions", type=int, default=10_000)
+    args = parser.parse_args()
+
+    prompt_sizes(args)
+    store_costs(args)
+
+
+if __name__ == "__main__":
+    main()
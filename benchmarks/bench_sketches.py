@@ -0,0 +1,107 @@
+"""
+Benchmark: revenue quantile sketches vs exact pandas quantiles
+
+Accuracy vs memory: for each relative accuracy setting, the largest relative error over the
+quantiles below (overall and for every product) and the memory of all sketches, on uniform
+revenue (the benchmark schema) and on heavy-tailed log-normal revenue.
+
+Latency: median, p90 and p99 from the sketches vs Series.quantile on the full column, overall
+and per product (groupby().quantile()), plus the cost to build the sketches, fold an append batch
+into them and merge two halves.
+
+Usage:
+    python -m benchmarks.bench_sketches [--rows 10000000] [--accuracies 0.05 0.02 0.01 0.005 0.001]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.bench_aggregates import make_sales
+from sales_data import optimize_dtypes
+from sketches import RevenueSketches
+
+QUANTILES = [0.001, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999]
+
+
+def best_ms(fn, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def max_relative_error(sketches, df, exact_overall, exact_by_product) -> float:
+    errors = []
+    approx = np.array(sketches.quantiles(QUANTILES))
+    errors.append(np.max(np.abs(approx - exact_overall) / exact_overall))
+    for product, exact in exact_by_product.items():
+        approx = np.array(sketches.quantiles(QUANTILES, product=product))
+        errors.append(np.max(np.abs(approx - exact) / exact))
+    return max(errors)
+
+
+def exact_quantiles(df) -> tuple:
+    # "lower" picks an observed value, which is what a rank-based sketch estimates
+    overall = df['revenue'].quantile(QUANTILES, interpolation='lower').to_numpy()
+    by_product = {
+        str(product): group.quantile(QUANTILES, interpolation='lower').to_numpy()
+        for product, group in df.groupby('product', observed=True)['revenue']
+    }
+    return overall, by_product
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--accuracies", type=float, nargs="+", default=[0.05, 0.02, 0.01, 0.005, 0.001])
+    parser.add_argument("--batch", type=int, default=10_000)
+    args = parser.parse_args()
+
+    uniform = optimize_dtypes(make_sales(args.rows))
+    lognormal = uniform.copy()
+    lognormal['revenue'] = np.round(np.random.default_rng(1).lognormal(8, 1.5, args.rows), 2)
+
+    print(f"{args.rows:,} rows; max relative error over quantiles {QUANTILES[0]}-{QUANTILES[-1]}, overall and per product")
+    print(f"{'accuracy':>8} | {'uniform err':>11} | {'log-normal err':>14} | {'memory KiB':>10}")
+    exact = {name: exact_quantiles(df) for name, df in (("uniform", uniform), ("lognormal", lognormal))}
+    for accuracy in args.accuracies:
+        uniform_sketches = RevenueSketches.from_frame(uniform, accuracy)
+        lognormal_sketches = RevenueSketches.from_frame(lognormal, accuracy)
+        uniform_error = max_relative_error(uniform_sketches, uniform, *exact["uniform"])
+        lognormal_error = max_relative_error(lognormal_sketches, lognormal, *exact["lognormal"])
+        memory = max(uniform_sketches.stats()["memory_kb"], lognormal_sketches.stats()["memory_kb"])
+        print(f"{accuracy:8.3f} | {uniform_error:11.3%} | {lognormal_error:14.3%} | {memory:10,.1f}")
+
+    df = uniform
+    start = time.perf_counter()
+    sketches = RevenueSketches.from_frame(df)
+    build_ms = (time.perf_counter() - start) * 1000
+    batch = optimize_dtypes(make_sales(args.batch, seed=2))
+    update_ms = best_ms(lambda: sketches.copy().update(batch))
+    half = len(df) // 2
+    first, second = RevenueSketches.from_frame(df.iloc[:half]), RevenueSketches.from_frame(df.iloc[half:])
+    merge_ms = best_ms(lambda: first.merge(second))
+
+    print(f"\nLatency at {args.rows:,} rows (median, p90, p99)")
+    print(f"{'query':<28} | {'exact pandas ms':>15} | {'sketch ms':>9}")
+    rows = [
+        ("overall", lambda: df['revenue'].quantile([0.5, 0.9, 0.99]),
+         lambda: sketches.quantiles([0.5, 0.9, 0.99])),
+        ("one product (Laptop)", lambda: df.loc[df['product'] == 'Laptop', 'revenue'].quantile([0.5, 0.9, 0.99]),
+         lambda: sketches.quantiles([0.5, 0.9, 0.99], product='Laptop')),
+        ("every product", lambda: df.groupby('product', observed=True)['revenue'].quantile([0.5, 0.9, 0.99]),
+         lambda: [sketches.quantiles([0.5, 0.9, 0.99], product=p) for p in sketches.tables['product'].labels]),
+        ("10-bin histogram", lambda: np.histogram(df['revenue'].to_numpy(), bins=10),
+         lambda: sketches.histogram(10)),
+    ]
+    for name, exact_fn, sketch_fn in rows:
+        print(f"{name:<28} | {best_ms(exact_fn, 3):15.2f} | {best_ms(sketch_fn, 50):9.3f}")
+    print(f"\nbuild from {args.rows:,} rows {build_ms:,.0f} ms | fold a {args.batch:,}-row append "
+          f"{update_ms:.2f} ms | merge two halves {merge_ms:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark: server startup, import time and time-to-ready
+
+Import time: `python -X importtime -c "import main"`, with the modules main imports directly
+ranked by cumulative time, and a check that no langchain/Groq module is imported.
+
+Time-to-ready: `python main.py` is started from a temporary directory (its own config.json,
+a generated Parquet dataset, a dummy LLM key) and / (liveness) and /ready (readiness: dataset
+loaded and aggregated) are polled until each answers 200.
+
+Usage:
+    python -m benchmarks.bench_startup [--rows 100000 1000000] [--runs 3] [--top 10]
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_aggregates import make_sales
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LLM_MODULES = ("langchain", "langchain_core", "langchain_groq", "groq")
+
+
+def import_profile() -> tuple:
+    """(total seconds, [(module, seconds)] imported directly by main, LLM modules imported)"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    total, direct, llm = 0.0, [], set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        seconds = int(cumulative) / 1e6
+        module = name.strip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if module == "main":
+            total = seconds
+        elif depth == 1:
+            direct.append((module, seconds))
+        if module.split(".")[0] in LLM_MODULES:
+            llm.add(module.split(".")[0])
+    return total, sorted(direct, key=lambda item: -item[1]), sorted(llm)
+
+
+def time_to_ready(workdir: str, port: int, timeout: float = 300) -> tuple:
+    """Seconds from process start until / and /ready first answer 200"""
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py")], cwd=workdir,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    live = ready = None
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+            while ready is None and time.perf_counter() - start < timeout:
+                try:
+                    if live is None and client.get("/").status_code == 200:
+                        live = time.perf_counter() - start
+                    if live is not None and client.get("/ready").status_code == 200:
+                        ready = time.perf_counter() - start
+                except httpx.HTTPError:
+                    pass
+                time.sleep(0.01)
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    if ready is None:
+        raise TimeoutError("server did not become ready")
+    return live, ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    profiles = [import_profile() for _ in range(args.runs)]
+    total = statistics.median(profile[0] for profile in profiles)
+    print(f"import main: {total * 1000:,.0f} ms (median of {args.runs}); "
+          f"LLM modules imported: {', '.join(profiles[0][2]) or 'none'}")
+    for module, seconds in profiles[0][1][:args.top]:
+        print(f"  {module:<28} {seconds * 1000:8,.1f} ms")
+
+    workdir = tempfile.mkdtemp(prefix="finbot-startup-")
+    try:
+        print(f"\n{'rows':>10} | {'live s':>7} | {'ready s':>7}")
+        for rows in args.rows:
+            data_path = os.path.join(workdir, "sales.parquet")
+            make_sales(rows).to_parquet(data_path, index=False)
+            config = {
+                "groq_api_key": "unused",
+                "port": args.port,
+                "data_source": {"type": "parquet", "path": data_path},
+                "semantic_cache_enabled": False,
+                "tracing_enabled": False
+            }
+            with open(os.path.join(workdir, "config.json"), "w") as f:
+                json.dump(config, f)
+            timings = [time_to_ready(workdir, args.port) for _ in range(args.runs)]
+            live = statistics.median(timing[0] for timing in timings)
+            ready = statistics.median(timing[1] for timing in timings)
+            print(f"{rows:>10,} | {live:7.2f} | {ready:7.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
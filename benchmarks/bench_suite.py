@@ -0,0 +1,265 @@
+"""
+End-to-end benchmark suite: every main endpoint on a synthetic dataset, with a fake LLM
+
+Generates a seeded dataset (synthetic_data.py), loads it into the app in-process (ASGI
+transport, no network) with the answer caches disabled unless --cache, then drives each
+scenario with --concurrency clients for --requests requests or --seconds, whichever comes
+first. Per scenario it reports throughput, p50/p95/p99 latency, errors and peak RSS (VmHWM,
+reset before each scenario on Linux), plus the time to generate, load and aggregate the data.
+
+Results are saved as JSON. --compare checks them against a saved baseline and exits 1 if any
+throughput, latency, memory or component time regressed by more than --threshold.
+
+Usage:
+    python -m benchmarks.bench_suite [--rows 1000000] [--concurrency 8] [--output results.json]
+    python -m benchmarks.bench_suite --compare benchmarks/results/baseline.json
+    python -m benchmarks.bench_suite --compare baseline.json current.json   # compare saved runs only
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.bench_export import _reset_peak_rss, _rss_mb
+from benchmarks.load_test import percentile
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+COMPUTED = ["What is the total revenue?", "Show me sales by region", "How is our North region performing?",
+            "What is the median revenue?", "Top 3 products"]
+QUERY_PLAN = ["Top 5 products by units sold in North", "Which region has the lowest total revenue?",
+              "How many sales of Laptop over 50k?", "Average revenue by region for Monitor"]
+
+
+def scenarios(quick_requests: int, export_requests: int) -> list:
+    """(name, method, path, request builder, request count); builders get the request index"""
+    return [
+        ("health", "GET", "/", lambda i: {}, quick_requests),
+        ("ready", "GET", "/ready", lambda i: {}, quick_requests),
+        ("summary", "GET", "/summary", lambda i: {}, quick_requests),
+        ("sales_page", "GET", "/sales-data", lambda i: {"params": {"limit": 100}}, quick_requests),
+        ("chart_revenue", "GET", "/charts/revenue", lambda i: {"params": {"by": "product", "limit": 20}}, quick_requests),
+        ("chart_histogram", "GET", "/charts/revenue-histogram", lambda i: {"params": {"bins": 10}}, quick_requests),
+        ("percentiles", "GET", "/charts/revenue-percentiles", lambda i: {}, quick_requests),
+        ("quick_query", "POST", "/quick-query", lambda i: {"json": {"query_type": "total_revenue"}}, quick_requests),
+        ("ask_computed", "POST", "/ask", lambda i: {"json": {"question": COMPUTED[i % len(COMPUTED)]}}, quick_requests),
+        ("ask_query_plan", "POST", "/ask", lambda i: {"json": {"question": QUERY_PLAN[i % len(QUERY_PLAN)]}}, quick_requests),
+        # Unique questions, so neither the caches nor the coalescer hide the LLM path
+        ("ask_llm", "POST", "/ask", lambda i: {"json": {"question": f"What should we focus on next, option {i}?"}}, quick_requests),
+        ("ask_batch", "POST", "/ask/batch", lambda i: {"json": {"questions": COMPUTED + [f"Plan {i}-{n}?" for n in range(5)]}},
+         max(quick_requests // 10, 1)),
+        ("export_csv", "GET", "/sales-data", lambda i: {"params": {"format": "csv"}}, export_requests),
+    ]
+
+
+async def run_scenario(client, method: str, path: str, build, requests: int, concurrency: int, seconds: float) -> dict:
+    latencies, errors, received = [], 0, 0
+    issued = 0
+    deadline = time.perf_counter() + seconds
+
+    async def worker():
+        nonlocal issued, errors, received
+        while issued < requests and time.perf_counter() < deadline:
+            index = issued
+            issued += 1
+            start = time.perf_counter()
+            response = await client.request(method, path, **build(index))
+            latencies.append((time.perf_counter() - start) * 1000)
+            received += len(response.content)
+            if response.status_code >= 400:
+                errors += 1
+
+    baseline_rss = _rss_mb("VmRSS")
+    _reset_peak_rss()
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(min(concurrency, requests))])
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "kib_per_request": round(received / max(len(latencies), 1) / 1024, 2),
+        "peak_rss_mb": round(_rss_mb("VmHWM"), 1),
+        "peak_rss_delta_mb": round(_rss_mb("VmHWM") - baseline_rss, 1),
+    }
+
+
+def timed_ms(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, round((time.perf_counter() - start) * 1000, 2)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_suite(args) -> dict:
+    import main as server
+    from agent import FinBot
+    from aggregates import AggregateStore
+    from benchmarks.bench_ingest import FrameSource
+    from data_store import DataStore
+    from fake_llm import FakeChatModel
+    from synthetic_data import generate_sales
+
+    components = {}
+    df, components["generate_ms"] = timed_ms(lambda: generate_sales(
+        args.rows, products=args.products, regions=args.regions, seed=args.seed))
+    _, components["aggregate_ms"] = timed_ms(lambda: AggregateStore.from_frame(df))
+
+    server.startup()  # ASGITransport does not run the lifespan hook
+    server.data_store, components["load_ms"] = timed_ms(lambda: DataStore(FrameSource(df)))
+    del df
+    server.finbot = FinBot(llm=FakeChatModel(latency=args.latency))
+    if not args.cache:
+        server.answer_cache = None
+        server.semantic_cache = None
+    snapshot = server.data_store.snapshot
+    _, components["prompt_context_ms"] = timed_ms(lambda: server.finbot._prepare_inputs(
+        "Summarize key takeaways", snapshot.data_summary, aggregates=snapshot.aggregates))
+
+    endpoints = {}
+
+    async def drive():
+        transport = httpx.ASGITransport(app=server.app)
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(transport=transport, base_url="http://finbot", limits=limits, timeout=600) as client:
+            for name, method, path, build, requests in scenarios(args.requests, args.export_requests):
+                if args.only and name not in args.only:
+                    continue
+                await client.request(method, path, **build(-1))  # warm up
+                endpoints[name] = await run_scenario(client, method, path, build, requests, args.concurrency, args.seconds)
+                result = endpoints[name]
+                print(f"{name:<16} | {result['requests']:>6} | {result['errors']:>4} | {result['throughput_rps']:>9,.1f} | "
+                      f"{result['p50_ms']:9.2f} | {result['p95_ms']:9.2f} | {result['p99_ms']:9.2f} | "
+                      f"{result['peak_rss_mb']:8,.0f} | {result['peak_rss_delta_mb']:+8,.1f}")
+
+    print(f"{args.rows:,} rows, {args.products:,} products, {args.regions} regions | concurrency {args.concurrency} | "
+          f"fake LLM {args.latency * 1000:.0f} ms | caches {'on' if args.cache else 'off'}")
+    print("components: " + ", ".join(f"{name} {ms:,.0f} ms" for name, ms in components.items()))
+    print(f"{'scenario':<16} | {'reqs':>6} | {'errs':>4} | {'req/s':>9} | {'p50 ms':>9} | {'p95 ms':>9} | "
+          f"{'p99 ms':>9} | {'peak MiB':>8} | {'+MiB':>8}")
+    asyncio.run(drive())
+
+    return {
+        "metadata": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "rows": args.rows,
+            "products": args.products,
+            "regions": args.regions,
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+            "llm_latency_seconds": args.latency,
+            "cache": args.cache,
+        },
+        "components": components,
+        "endpoints": endpoints,
+    }
+
+
+# Metrics where a larger value is a regression; throughput is the one where smaller is
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "peak_rss_delta_mb")
+
+
+def compare(baseline: dict, current: dict, threshold: float, min_delta: float) -> list:
+    """Print metric changes and return the regressions beyond `threshold` (a fraction)"""
+    regressions = []
+
+    def check(scope, metric, old, new, higher_is_better=False):
+        if old is None or new is None:
+            return
+        change = (new - old) / old if old else 0.0
+        worse = -change if higher_is_better else change
+        regressed = worse > threshold and abs(new - old) >= min_delta
+        if regressed:
+            regressions.append(f"{scope} {metric}: {old:,.2f} -> {new:,.2f} ({change:+.1%})")
+        print(f"{scope:<16} | {metric:<18} | {old:>12,.2f} | {new:>12,.2f} | {change:+8.1%}{'  REGRESSION' if regressed else ''}")
+
+    if baseline["metadata"].get("rows") != current["metadata"].get("rows"):
+        print(f"Warning: comparing runs on different dataset sizes "
+              f"({baseline['metadata'].get('rows')} vs {current['metadata'].get('rows')} rows)")
+    print(f"\nbaseline {baseline['metadata'].get('git_commit')} ({baseline['metadata'].get('timestamp')}) vs "
+          f"current {current['metadata'].get('git_commit')} ({current['metadata'].get('timestamp')})")
+    print(f"{'scope':<16} | {'metric':<18} | {'baseline':>12} | {'current':>12} | {'change':>8}")
+    for name, ms in current["components"].items():
+        check("components", name, baseline["components"].get(name), ms)
+    for name, result in current["endpoints"].items():
+        old = baseline["endpoints"].get(name)
+        if old is None:
+            continue
+        check(name, "throughput_rps", old["throughput_rps"], result["throughput_rps"], higher_is_better=True)
+        for metric in LOWER_IS_BETTER:
+            check(name, metric, old.get(metric), result.get(metric))
+        if result["errors"] > old["errors"]:
+            regressions.append(f"{name} errors: {old['errors']} -> {result['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--regions", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--export-requests", type=int, default=3, help="Requests for the full CSV export")
+    parser.add_argument("--seconds", type=float, default=30, help="Time limit per scenario")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake LLM latency in seconds")
+    parser.add_argument("--cache", action="store_true", help="Keep the answer caches enabled")
+    parser.add_argument("--only", nargs="+", help="Run only these scenarios")
+    parser.add_argument("--output", help=f"JSON results file (default: {RESULTS_DIR}/<timestamp>.json)")
+    parser.add_argument("--compare", nargs="+", metavar="JSON",
+                        help="Baseline results to compare this run against, or a baseline and a current file")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Regression threshold as a fraction")
+    parser.add_argument("--min-delta", type=float, default=1.0,
+                        help="Ignore changes smaller than this in absolute terms (ms, MiB or req/s)")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes a baseline file and optionally a current file")
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            baseline, current = json.load(f), json.load(g)
+    else:
+        current = run_suite(args)
+        output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\nresults saved to {output}")
+        if not args.compare:
+            return
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+
+    regressions = compare(baseline, current, args.threshold, args.min_delta)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"\nno regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmark: many tenant datasets under mixed traffic, loaded lazily into a memory-budgeted LRU pool
+
+Registers --tenants synthetic datasets of varied sizes and catalogs (each with its own seed),
+loads none of them up front, then drives the app in-process (ASGI transport, no network) with
+--concurrency clients. Tenants are picked with a Zipf skew, so a few are hot and most are cold,
+and requests mix /summary, /charts/revenue, a /sales-data page and computed /ask answers.
+The pool runs once per --budget (MiB) and once without a budget.
+
+Each run starts with a burst of concurrent first requests to one cold tenant, which should
+trigger exactly one load. Then per run: loads from the source and from spill files vs requests,
+spills and drops, pool memory vs budget, peak RSS, and p50/p99 latency by the tenant's state when
+the request was sent: cold (loaded from the source), spilled (mapped again from disk) or warm.
+
+Usage:
+    python -m benchmarks.bench_tenants [--tenants 100] [--rows 50000] [--requests 5000] [--concurrency 32] [--budget 64 256]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from benchmarks.bench_export import _reset_peak_rss, _rss_mb
+from benchmarks.load_test import percentile
+
+QUESTIONS = ["What is the total revenue?", "Show me sales by region", "How is our North region performing?",
+             "What is the median revenue?", "Top 3 products"]
+STATES = {"unloaded": "cold", "spilled": "spilled", "loading": "joined", "memory": "warm", "mapped": "warm"}
+
+
+def tenant_sources(args) -> dict:
+    """Seeded tenants: rows from a fifth to four times --rows, 20 to 1,000 products"""
+    from sales_data import SyntheticSource
+
+    rng = random.Random(args.seed)
+    return {f"tenant-{i:03d}": SyntheticSource(rows=int(args.rows * rng.choice([0.2, 0.5, 1, 2, 4])),
+                                               products=rng.choice([20, 200, 1000]), seed=i)
+            for i in range(args.tenants)}
+
+
+def request_for(i: int, dataset: str) -> tuple:
+    kind = i % 4
+    if kind == 0:
+        return "GET", "/summary", {"params": {"dataset": dataset}}
+    if kind == 1:
+        return "GET", "/charts/revenue", {"params": {"dataset": dataset, "limit": 10}}
+    if kind == 2:
+        return "GET", "/sales-data", {"params": {"dataset": dataset, "limit": 100}}
+    return "POST", "/ask", {"json": {"question": QUESTIONS[i % len(QUESTIONS)], "dataset": dataset}}
+
+
+def traffic(ids: list, args) -> tuple:
+    """(tenant per request, tenants hottest first): Zipf-skewed over a shuffled tenant order"""
+    rng = random.Random(args.seed)
+    ranked = list(ids)
+    rng.shuffle(ranked)
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(len(ranked))]
+    return rng.choices(ranked, weights=weights, k=args.requests), ranked
+
+
+def run(server, budget_mb, args) -> dict:
+    from tenant_data import DatasetRegistry
+
+    registry = DatasetRegistry(tenant_sources(args),
+                               memory_budget_bytes=int(budget_mb * 2**20) if budget_mb is not None else None)
+    server.dataset_registry = registry
+    picks, ranked = traffic(registry.ids(), args)
+    latencies = {"cold": [], "spilled": [], "joined": [], "warm": []}
+    peak_pool = 0
+    errors = 0
+
+    async def drive():
+        nonlocal peak_pool, errors
+        transport = httpx.ASGITransport(app=server.app)
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(transport=transport, base_url="http://finbot", limits=limits, timeout=600) as client:
+            # Concurrent first requests to the coldest tenant share one load
+            herd = ranked[-1]
+            burst = await asyncio.gather(*[client.get("/summary", params={"dataset": herd}) for _ in range(args.burst)])
+            errors += sum(response.status_code >= 400 for response in burst)
+            herd_stats = registry.describe(herd)
+
+            issued = 0
+
+            async def worker():
+                nonlocal issued, peak_pool, errors
+                while issued < len(picks):
+                    index = issued
+                    issued += 1
+                    dataset = picks[index]
+                    state = STATES[registry.describe(dataset)["state"]]
+                    method, path, options = request_for(index, dataset)
+                    start = time.perf_counter()
+                    response = await client.request(method, path, **options)
+                    latencies[state].append((time.perf_counter() - start) * 1000)
+                    errors += response.status_code >= 400
+                    peak_pool = max(peak_pool, registry.memory_bytes())
+
+            start = time.perf_counter()
+            await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+            return herd_stats, time.perf_counter() - start
+
+    _reset_peak_rss()
+    herd_stats, elapsed = asyncio.run(drive())
+    stats = registry.stats()
+    registry.close()
+    return {"herd": herd_stats, "elapsed": elapsed, "stats": stats, "latencies": latencies, "errors": errors,
+            "peak_pool_mb": peak_pool / 2**20, "peak_rss_mb": _rss_mb("VmHWM")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, default=100)
+    parser.add_argument("--rows", type=int, default=50_000, help="Typical rows per tenant")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--burst", type=int, default=64, help="Concurrent first requests to one cold tenant")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Traffic skew across tenants")
+    parser.add_argument("--budget", type=float, nargs="+", default=[64, 256], help="Pool memory budgets in MiB")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import main as server
+    from agent import FinBot
+    from fake_llm import FakeChatModel
+
+    server.startup()  # ASGITransport does not run the lifespan hook
+    server.finbot = FinBot(llm=FakeChatModel())
+    server.answer_cache = None
+    server.semantic_cache = None
+
+    print(f"{args.tenants} tenants, ~{args.rows:,} rows each (x0.2 to x4), {args.requests:,} requests, "
+          f"concurrency {args.concurrency}, zipf {args.zipf}")
+    print(f"{'budget MiB':>10} | {'req/s':>7} | {'errs':>4} | {'herd loads':>10} | {'loads':>5} | {'spill loads':>11} | "
+          f"{'spills':>6} | {'drops':>5} | {'pool MiB':>8} | {'mapped MiB':>10} | {'peak RSS':>8} | "
+          f"{'cold p50/p99':>15} | {'spilled p50/p99':>15} | {'warm p50/p99':>13}")
+    for budget_mb in args.budget + [None]:
+        result = run(server, budget_mb, args)
+        stats, latencies = result["stats"], result["latencies"]
+        herd_loads = f"{result['herd']['loads']} of {args.burst}"
+
+        def spread(values, width):
+            if not values:
+                return f"{'-':>{width}}"
+            return f"{percentile(values, 50):,.1f}/{percentile(values, 99):,.1f}".rjust(width)
+
+        print(f"{budget_mb if budget_mb is not None else 'none':>10} | {args.requests / result['elapsed']:7,.0f} | "
+              f"{result['errors']:>4} | {herd_loads:>10} | {stats['loads']:>5} | "
+              f"{stats['spill_loads']:>11} | {stats['spills']:>6} | {stats['drops']:>5} | {result['peak_pool_mb']:8,.1f} | "
+              f"{stats['mapped_mb']:10,.1f} | {result['peak_rss_mb']:8,.0f} | {spread(latencies['cold'], 15)} | "
+              f"{spread(latencies['spilled'], 15)} | {spread(latencies['warm'], 13)}")
+    print("\nloads count each tenant load from the source or a spill file; pool MiB is the peak heap held by the pool "
+          "(mapped rows excluded); latency in ms by tenant state when the request was sent")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark: cost of per-stage tracing, disabled vs enabled vs enabled with a JSONL trace log
+
+Times the computed /ask path in-process (no LLM) and a bare stage() block.
+
+Usage:
+    python -m benchmarks.bench_tracing [requests]     (default 2000)
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+import main
+from metrics import tracer
+
+
+async def ask_latencies(requests: int) -> list:
+    latencies = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://finbot") as client:
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await client.post("/ask", json={"question": "What is the total revenue?"})
+            latencies.append((time.perf_counter() - start) * 1e6)
+            response.raise_for_status()
+    return latencies
+
+
+def stage_cost_ns(iterations: int = 200_000) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with tracer.stage("bench"):
+            pass
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    main.startup()  # ASGITransport does not run the lifespan hook
+    log_path = os.path.join(tempfile.mkdtemp(), "trace.jsonl")
+    modes = [("disabled", dict(enabled=False)),
+             ("enabled", dict(enabled=True)),
+             ("enabled + headers + log", dict(enabled=True, headers=True, log_path=log_path))]
+
+    # Interleave rounds so drift in the machine does not favor one mode; keep each mode's best round
+    best = {name: float("inf") for name, _ in modes}
+    for _ in range(3):
+        for name, settings in modes:
+            tracer.configure(**settings)
+            best[name] = min(best[name], statistics.median(asyncio.run(ask_latencies(requests))))
+
+    for name, settings in modes:
+        tracer.configure(**settings)
+        print(f"{name:<24} /ask computed p50 {best[name]:7.1f} us | stage() {stage_cost_ns():6.0f} ns")
+    tracer.configure(enabled=False)
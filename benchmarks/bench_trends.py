@@ -0,0 +1,65 @@
+"""
+Benchmark: trend queries from the rollups vs groupby on demand over raw rows
+
+Usage:
+    python -m benchmarks.bench_trends [rows]     (default 50M; needs roughly 2 GB of RAM)
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from aggregates import AggregateStore
+from benchmarks.bench_aggregates import PRODUCTS, REGIONS
+
+
+def make_dated_sales(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Random sales over two years with categorical product/region and int32 revenue"""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2024-01-01', 'ns')
+    return pd.DataFrame({
+        'sale_id': np.arange(1, rows + 1, dtype='int64'),
+        'product': pd.Categorical.from_codes(rng.integers(0, len(PRODUCTS), rows), PRODUCTS),
+        'region': pd.Categorical.from_codes(rng.integers(0, len(REGIONS), rows), REGIONS),
+        'revenue': rng.integers(200, 50000, rows, dtype='int32'),
+        'quantity': rng.integers(1, 6, rows, dtype='int8'),
+        'date': start + rng.integers(0, 730, rows).astype('timedelta64[D]'),
+    })
+
+
+def on_demand(df, region, grain):
+    """What a trend question costs without rollups: filter and regroup the raw rows"""
+    rows = df[df['region'] == region]
+    freq = {'month': 'M', 'quarter': 'Q', 'week': 'W'}[grain]
+    series = rows.groupby(rows['date'].dt.to_period(freq))['revenue'].sum()
+    return series.iloc[-2:]
+
+
+def timed_ms(fn, *args, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000_000
+    df = make_dated_sales(rows)
+
+    start = time.perf_counter()
+    store = AggregateStore.from_frame(df)
+    build_s = time.perf_counter() - start
+
+    batch = make_dated_sales(100_000, seed=1)
+    start = time.perf_counter()
+    store.update(batch)
+    append_ms = (time.perf_counter() - start) * 1000
+
+    print(f"{rows:,} rows: rollup build {build_s:.1f} s, incremental append of 100k rows {append_ms:.0f} ms")
+    for grain in ('week', 'month', 'quarter'):
+        rollup = timed_ms(store.rollups.period_over_period, grain, None, 'North', 1)
+        scan = timed_ms(on_demand, df, 'North', grain, repeat=1)
+        print(f"North last {grain:<8} rollup {rollup:8.2f} ms | groupby on demand {scan:10.1f} ms | {scan / rollup:7.0f}x")
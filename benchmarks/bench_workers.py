@@ -0,0 +1,166 @@
+"""
+Benchmark: memory and throughput of the multi-worker server, shared vs per-worker dataset
+
+For each worker count the server is started with `python main.py` from a temporary directory
+(its own config.json, a generated Parquet dataset and no LLM key), once with the shared-memory
+dataset and once with every worker loading a private copy. Memory is the proportional set size
+(PSS) summed over the launcher and its workers, which counts shared pages once; RSS double
+counts them; the tmpfs files behind the shared dataset are reported separately. Throughput is measured with concurrent clients alternating a computed /ask and a
+filtered /sales-data page, both of which read the rows.
+
+Usage:
+    python -m benchmarks.bench_workers [--rows 2000000] [--workers 1 2 4 8 16] [--seconds 10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_aggregates import make_sales
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REQUESTS = [
+    ("POST", "/ask", {"question": "What is the total revenue?"}),
+    ("GET", "/sales-data?region=North&product=Laptop&limit=50", None),
+]
+
+
+def process_tree(pid: int) -> list:
+    pids, queue = [], [pid]
+    while queue:
+        current = queue.pop()
+        pids.append(current)
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                queue.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def memory_mb(pids: list) -> tuple:
+    """(total PSS, total RSS) in MiB"""
+    pss = rss = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        pss += int(line.split()[1])
+                    elif line.startswith("Rss:"):
+                        rss += int(line.split()[1])
+        except OSError:
+            pass
+    return pss / 1024, rss / 1024
+
+
+async def wait_ready(base_url: str, workers: int, timeout: float = 300) -> None:
+    """Wait until every worker has answered once"""
+    deadline = time.monotonic() + timeout
+    seen = set()
+    async with httpx.AsyncClient(base_url=base_url, timeout=5) as client:
+        while time.monotonic() < deadline:
+            try:
+                # A new connection each time, so the kernel can hand it to any worker
+                stats = (await client.get("/data-source", headers={"Connection": "close"})).json()
+                seen.add(stats["pid"])
+                if len(seen) >= workers:
+                    return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.5)
+    raise TimeoutError("server did not start")
+
+
+async def throughput(base_url: str, seconds: float, concurrency: int) -> float:
+    done = 0
+    stop = time.monotonic() + seconds
+
+    async def client_loop(client, offset):
+        nonlocal done
+        i = offset
+        while time.monotonic() < stop:
+            method, path, body = REQUESTS[i % len(REQUESTS)]
+            response = await client.request(method, path, json=body)
+            response.raise_for_status()
+            done += 1
+            i += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        await asyncio.gather(*(client_loop(client, i) for i in range(concurrency)))
+    return done / seconds
+
+
+def run(workdir: str, data_path: str, workers: int, shared: bool, port: int, args) -> tuple:
+    shared_dir = tempfile.mkdtemp(prefix="finbot-bench-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    config = {
+        "groq_api_key": "",
+        "port": port,
+        "workers": workers,
+        "shared_data": shared,
+        "shared_data_dir": shared_dir,
+        "data_source": {"type": "parquet", "path": data_path},
+        "semantic_cache_enabled": False,
+        "query_engine_enabled": False,
+        "tracing_enabled": False
+    }
+    with open(os.path.join(workdir, "config.json"), "w") as f:
+        json.dump(config, f)
+
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py")], cwd=workdir,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(wait_ready(base_url, workers))
+        time.sleep(1)
+        idle = memory_mb(process_tree(server.pid))
+        rps = asyncio.run(throughput(base_url, args.seconds, args.concurrency))
+        loaded = memory_mb(process_tree(server.pid))
+        shm = sum(entry.stat().st_size for entry in os.scandir(shared_dir)) / 2**20
+        return idle, loaded, shm, rps
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        shutil.rmtree(shared_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="finbot-workers-")
+    data_path = os.path.join(workdir, "sales.parquet")
+    make_sales(args.rows).to_parquet(data_path, index=False)
+    print(f"{args.rows:,} rows, {os.cpu_count()} CPUs, {args.concurrency} concurrent clients")
+    print(f"{'workers':>7} | {'dataset':>7} | {'PSS idle MiB':>12} | {'PSS loaded MiB':>14} | "
+          f"{'RSS loaded MiB':>14} | {'tmpfs MiB':>9} | {'req/s':>8}")
+    try:
+        for workers in args.workers:
+            for shared in (True, False):
+                if workers == 1 and not shared:
+                    continue
+                idle, loaded, shm, rps = run(workdir, data_path, workers, shared and workers > 1, args.port, args)
+                mode = "shared" if shared and workers > 1 else "private"
+                print(f"{workers:>7} | {mode:>7} | {idle[0]:12,.0f} | {loaded[0]:14,.0f} | {loaded[1]:14,.0f} | {shm:9,.0f} | {rps:8,.0f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Offline evaluation of the semantic answer cache
+
+Quality: the first question of each labeled intent in benchmarks/data/paraphrases.json is
+cached, then every other question is looked up, plus every question of the holdout intents,
+which are never cached. Hit rate counts paraphrases answered from the cache; false-hit rate
+counts lookups answered with another intent's answer. Both are reported with and without the
+entity/period guard.
+
+Latency: lookup time with the brute-force index filled to 10k, 100k and 1M entries, spread
+over 1,000 guard signatures (realistic) or all in one (worst case: a full scan).
+
+Usage:
+    python -m benchmarks.eval_semantic_cache [--embedder hashing] [--sizes 10000 1000000]
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+
+from semantic_cache import SemanticCache, build_embedder
+
+DATA = os.path.join(os.path.dirname(__file__), "data", "paraphrases.json")
+ENTITIES = ["Laptop", "Mouse", "Keyboard", "Monitor", "Headphones", "USB Cable", "North", "South", "East", "West"]
+
+
+def evaluate(embedder, groups, threshold: float, guard: bool = True) -> dict:
+    cache = SemanticCache(embedder, threshold=threshold, guard=guard)
+    cache.set_dataset("eval", ENTITIES)
+    for group in groups:
+        if not group.get("holdout"):
+            cache.set(group["questions"][0], group["intent"], 0.0)
+
+    paraphrases = hits = false_hits = lookups = 0
+    for group in groups:
+        holdout = group.get("holdout", False)
+        for question in group["questions"] if holdout else group["questions"][1:]:
+            lookups += 1
+            paraphrases += not holdout
+            answer = cache.get(question)
+            if answer == group["intent"]:
+                hits += 1
+            elif answer is not None:
+                false_hits += 1
+    return {
+        "threshold": threshold,
+        "hit_rate": hits / paraphrases,
+        "false_hit_rate": false_hits / lookups,
+        "lookups": lookups
+    }
+
+
+def lookup_latency(embedder, size: int, signatures: int, queries: int = 200) -> tuple:
+    """Median and p99 lookup time in ms with `size` cached entries (random unit vectors)"""
+    cache = SemanticCache(embedder, max_entries=size)
+    cache.set_dataset("latency", ENTITIES)
+    query_signature = cache.signature("What was revenue for Laptop last month?")
+    pool = [query_signature] + [f"synthetic|{i}" for i in range(signatures - 1)]
+    rng = np.random.default_rng(0)
+    for start in range(0, size, 100_000):
+        count = min(100_000, size - start)
+        block = rng.standard_normal((count, embedder.dim), dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        cache.index.add_many(block, [pool[i] for i in rng.integers(0, len(pool), count)])
+    cache.entries = [("", "", "", 0.0)] * size
+
+    timings = []
+    for _ in range(queries):
+        start = time.perf_counter()
+        cache.lookup("What was revenue for Laptop last month?")
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embedder", default="hashing", help="hashing or sentence-transformers[:model]")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.7, 0.75, 0.8, 0.85, 0.9])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    embedder = build_embedder(args.embedder)
+    with open(DATA) as f:
+        groups = json.load(f)
+
+    print(f"embedder {embedder.name} ({embedder.dim} dims), {len(groups)} intents")
+    for threshold in args.thresholds:
+        guarded = evaluate(embedder, groups, threshold)
+        unguarded = evaluate(embedder, groups, threshold, guard=False)
+        print(f"threshold {threshold:.2f} | hit rate {guarded['hit_rate']:6.1%} | "
+              f"false-hit rate {guarded['false_hit_rate']:6.1%} | without guard: hit rate "
+              f"{unguarded['hit_rate']:6.1%}, false-hit rate {unguarded['false_hit_rate']:6.1%} | "
+              f"{guarded['lookups']} lookups")
+
+    for size in args.sizes:
+        for signatures in (1_000, 1):
+            p50, p99 = lookup_latency(embedder, size, signatures)
+            print(f"{size:>9,} entries in {signatures:>5,} signature(s) | lookup p50 {p50:7.2f} ms | "
+                  f"p99 {p99:7.2f} ms | index {size * embedder.dim * 4 / 2**20:,.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Load test for /ask and /quick-query against a fake LLM with configurable latency
+
+Runs the FastAPI app in-process by default; pass --url to hit a running server instead.
+
+/ask runs twice per level: every client asking the same question, where identical in-flight
+calls are coalesced into one upstream call, and a distinct question per request (its index
+appended), where every request needs its own LLM slot and the limiter's queue and 503s show.
+
+Usage:
+    python -m benchmarks.load_test --latency 0.5 --clients 1 50 500
+    python -m benchmarks.load_test --questions distinct
+    python -m benchmarks.load_test --url http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import itertools
+import statistics
+import time
+
+import httpx
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+QUESTION = "Summarize key takeaways from current sales data."
+
+
+def ask_payload(mode, index):
+    """Same question for every request, or one made distinct by the request index"""
+    return {"question": QUESTION if mode == "same" else f"{QUESTION} (request {index})"}
+
+
+async def client_loop(client, endpoint, payload, requests_per_client, latencies, statuses, counter):
+    for _ in range(requests_per_client):
+        start = time.perf_counter()
+        response = await client.post(endpoint, json=payload(next(counter)))
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+
+async def run_level(args, clients, mode):
+    if args.url:
+        transport = None
+        base_url = args.url
+    else:
+        import main
+        from agent import FinBot
+        from fake_llm import FakeChatModel
+        from llm_client import Coalescer
+        from llm_limiter import LLMLimiter
+
+        main.startup()  # ASGITransport does not run the lifespan hook
+        main.finbot = FinBot(llm=FakeChatModel(latency=args.latency))
+        main.llm_limiter = LLMLimiter(args.max_concurrent, args.max_queued)
+        main.llm_coalescer = Coalescer()
+        if not args.cache:
+            main.answer_cache = None
+            main.semantic_cache = None
+        transport = httpx.ASGITransport(app=main.app)
+        base_url = "http://finbot"
+
+    if args.endpoint == "/ask":
+        payload = lambda index: ask_payload(mode, index)
+    else:
+        payload = lambda index: {"query_type": "total_revenue"}
+
+    latencies, statuses, counter = [], {}, itertools.count()
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=120) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            client_loop(client, args.endpoint, payload, args.requests, latencies, statuses, counter)
+            for _ in range(clients)
+        ])
+        elapsed = time.perf_counter() - start
+
+    coalesced = "" if args.url else f" | coalesced {main.llm_coalescer.coalesced:>6}"
+    print(f"{mode:>8} | {clients:>5} clients | {len(latencies):>6} requests | "
+          f"p50 {percentile(latencies, 50):9.1f} ms | p99 {percentile(latencies, 99):9.1f} ms | "
+          f"mean {statistics.fmean(latencies):9.1f} ms | {len(latencies) / elapsed:8.1f} req/s{coalesced} | "
+          f"status {dict(sorted(statuses.items()))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running FinBot API (default: in-process app)")
+    parser.add_argument("--endpoint", default="/ask", choices=["/ask", "/quick-query"])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--requests", type=int, default=5, help="Requests sent by each client")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake LLM latency in seconds")
+    parser.add_argument("--max-concurrent", type=int, default=8)
+    parser.add_argument("--max-queued", type=int, default=64)
+    parser.add_argument("--cache", action="store_true", help="Keep the answer cache enabled (in-process only)")
+    parser.add_argument("--questions", default="both", choices=["same", "distinct", "both"],
+                        help="/ask with one shared question (coalesced), a distinct one per request, or both")
+    args = parser.parse_args()
+
+    modes = ["same", "distinct"] if args.questions == "both" else [args.questions]
+    if args.endpoint != "/ask":
+        modes = ["same"]
+    for mode in modes:
+        for clients in args.clients:
+            asyncio.run(run_level(args, clients, mode))
+
+
+if __name__ == "__main__":
+    main()
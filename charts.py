@@ -0,0 +1,50 @@
+"""
+Pre-aggregated chart series for the dashboard, so clients draw charts without downloading rows
+"""
+import numpy as np
+
+from aggregates import AggregateStore
+
+DIMENSIONS = {"product": "by_product", "region": "by_region"}
+MAX_BINS = 200
+
+
+def revenue_series(aggregates: AggregateStore, by: str = "product", limit: int = None) -> list:
+    """Revenue, sales and units per product or region, largest first.
+
+    Groups beyond `limit` are folded into one "Other" entry, so the series stays chart-sized
+    however many products the dataset has.
+    """
+    if by not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension '{by}'. Use one of: {', '.join(DIMENSIONS)}")
+    table = getattr(aggregates, DIMENSIONS[by]).sort_values('revenue_sum', ascending=False)
+    rest = None
+    if limit is not None and len(table) > limit:
+        table, rest = table.iloc[:limit], table.iloc[limit:].sum()
+
+    series = [
+        {"label": str(label), "revenue": float(row.revenue_sum), "sales": int(row.sales_count),
+         "quantity": int(row.quantity_sum)}
+        for label, row in zip(table.index, table.itertuples(index=False))
+    ]
+    if rest is not None:
+        series.append({"label": "Other", "revenue": float(rest['revenue_sum']), "sales": int(rest['sales_count']),
+                       "quantity": int(rest['quantity_sum'])})
+    return series
+
+
+def revenue_histogram(chunks: list, bins: int = 10) -> list:
+    """Sale counts in `bins` equal-width revenue bins, counted chunk by chunk without concatenating"""
+    if not 1 <= bins <= MAX_BINS:
+        raise ValueError(f"bins must be between 1 and {MAX_BINS}")
+    values = [chunk['revenue'].to_numpy() for chunk in chunks if len(chunk)]
+    if not values:
+        return []
+    low = min(float(v.min()) for v in values)
+    high = max(float(v.max()) for v in values)
+    edges = np.linspace(low, high if high > low else low + 1, bins + 1)
+    counts = sum(np.histogram(v, bins=edges)[0] for v in values)
+    return [
+        {"start": float(start), "end": float(end), "count": int(count)}
+        for start, end, count in zip(edges[:-1], edges[1:], counts)
+    ]
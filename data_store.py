@@ -0,0 +1,290 @@
+"""
+Copy-on-write sales data snapshots with append ingestion and file-watch reload
+"""
+import contextlib
+import io
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+import pandas as pd
+
+from aggregates import AggregateStore, GroupedStats
+from charts import revenue_histogram
+from sales_data import SalesDataSource, concat_chunks, get_data_summary, optimize_dtypes
+from shared_data import SharedDataset
+
+REQUIRED_COLUMNS = ['product', 'region', 'revenue', 'quantity']
+
+
+class DataSnapshot:
+    """One immutable version of the dataset: rows, aggregates and summary.
+
+    Rows are kept as a list of chunks and concatenated on first access, so appends cost
+    O(batch) and only readers that need raw rows pay for the concatenation, once per version.
+    """
+
+    def __init__(self, chunks: list, aggregates: AggregateStore, version: int, next_sale_id: int,
+                 fingerprint: str = None):
+        self._chunks = chunks
+        self._frame = chunks[0] if len(chunks) == 1 else None
+        self._frame_lock = threading.Lock()
+        self._grouped = None
+        self._histograms = {}
+        self.aggregates = aggregates
+        self.data_summary = get_data_summary(None, aggregates)
+        self.version = version
+        self.next_sale_id = next_sale_id
+        self.fingerprint = fingerprint or aggregates.fingerprint()
+        self.updated_at = time.time()
+        self.context = _LazyContext(self)
+
+    @property
+    def sales_df(self) -> pd.DataFrame:
+        if self._frame is None:
+            with self._frame_lock:
+                if self._frame is None:
+                    self._frame = concat_chunks(self._chunks)
+        return self._frame
+
+    @property
+    def grouped(self) -> GroupedStats:
+        """Per-group revenue stats for predefined responses, computed on first use"""
+        if self._grouped is None:
+            self._grouped = GroupedStats(self.sales_df)
+        return self._grouped
+
+    def revenue_histogram(self, bins: int = 10) -> list:
+        """Binned revenue counts for the dashboard: read from the quantile sketch, or binned over
+        the rows once per version and bin count for aggregates built without one"""
+        if self.aggregates.sketches is not None:
+            return self.aggregates.sketches.histogram(bins)
+        if bins not in self._histograms:
+            self._histograms[bins] = revenue_histogram(self.chunks, bins)
+        return self._histograms[bins]
+
+    @property
+    def columns(self) -> list:
+        return list(self._chunks[0].columns)
+
+    @property
+    def chunks(self) -> list:
+        """Chunks to build the next version from, reusing the concatenated frame if it exists"""
+        return [self._frame] if self._frame is not None else list(self._chunks)
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "fingerprint": self.fingerprint,
+            "rows": self.aggregates.total_sales,
+            "updated_at": self.updated_at
+        }
+
+
+class _LazyContext(dict):
+    """Router context for a snapshot; `sales_df` and `grouped` are only built when a handler reads them"""
+
+    def __init__(self, snapshot: DataSnapshot):
+        super().__init__(aggregates=snapshot.aggregates, data_summary=snapshot.data_summary)
+        self._snapshot = snapshot
+
+    def __missing__(self, key):
+        if key == "sales_df":
+            return self._snapshot.sales_df
+        if key == "grouped":
+            return self._snapshot.grouped
+        raise KeyError(key)
+
+
+class DataStore:
+    """Holds the current DataSnapshot and swaps in new versions atomically.
+
+    Readers take `store.snapshot` once per request and never lock; writers (append and
+    reload) are serialized and publish a fully built snapshot with a single assignment.
+
+    With `shared`, the dataset lives in a SharedDataset mapped by every worker process: the
+    first process loads the source, writers publish each version there under a cross-process
+    lock, and readers switch to a newer version as soon as its counter changes.
+    """
+
+    def __init__(self, source: SalesDataSource, shared: SharedDataset = None):
+        self.source = source
+        self.shared = shared
+        self._write_lock = threading.RLock()
+        self._listeners = []
+        self._watcher = None
+        self._watched_mtime = None
+        if shared is None:
+            self._snapshot = self._from_frame(source.load(), version=1)
+            return
+        with shared.lock():
+            snapshot = self._from_shared()
+            if snapshot is None:
+                snapshot = self._share(self._from_frame(source.load(), version=1))
+        self._snapshot = snapshot
+
+    @property
+    def snapshot(self) -> DataSnapshot:
+        snapshot = self._snapshot
+        if self.shared is not None and self.shared.version != snapshot.version:
+            return self._follow()
+        return snapshot
+
+    # Shared-memory mode
+
+    def _from_shared(self) -> Optional[DataSnapshot]:
+        manifest, df, aggregates = self.shared.load_latest()
+        if manifest is None:
+            return None
+        snapshot = DataSnapshot([df], aggregates, manifest["version"], manifest["next_sale_id"],
+                                manifest.get("fingerprint"))
+        snapshot.updated_at = manifest.get("updated_at", snapshot.updated_at)
+        return snapshot
+
+    def _share(self, snapshot: DataSnapshot, **extra) -> DataSnapshot:
+        """Publish a version to the shared dataset and return it backed by the shared pages"""
+        self.shared.publish(snapshot.sales_df, snapshot.aggregates, snapshot.version, snapshot.next_sale_id,
+                            updated_at=snapshot.updated_at, fingerprint=snapshot.fingerprint, **extra)
+        return self._from_shared()
+
+    def _follow(self) -> DataSnapshot:
+        """Switch to the version another worker published"""
+        with self._write_lock:
+            if self.shared.version != self._snapshot.version:
+                snapshot = self._from_shared()
+                if snapshot is not None and snapshot.version != self._snapshot.version:
+                    self._publish(snapshot)
+            return self._snapshot
+
+    @contextlib.contextmanager
+    def _writing(self):
+        """Serialize writers in this process and, in shared mode, across workers"""
+        with self._write_lock:
+            if self.shared is None:
+                yield self._snapshot
+                return
+            with self.shared.lock():
+                yield self._follow()
+
+    def on_swap(self, listener: Callable[[DataSnapshot], None]) -> None:
+        """Call `listener(snapshot)` after every new version is published"""
+        self._listeners.append(listener)
+
+    def _publish(self, snapshot: DataSnapshot) -> DataSnapshot:
+        self._snapshot = snapshot
+        for listener in self._listeners:
+            listener(snapshot)
+        return snapshot
+
+    @staticmethod
+    def _from_frame(df: pd.DataFrame, version: int) -> DataSnapshot:
+        next_sale_id = int(df['sale_id'].max()) + 1 if len(df) else 1
+        return DataSnapshot([df], AggregateStore.from_frame(df), version, next_sale_id)
+
+    @staticmethod
+    def prepare_rows(rows: pd.DataFrame, next_sale_id: int, dated: bool = False) -> pd.DataFrame:
+        """Validate an ingest batch and give it the dataset's column layout.
+
+        For dated datasets a missing `date` defaults to the day of ingestion.
+        """
+        missing = [c for c in REQUIRED_COLUMNS if c not in rows.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        layout = ['sale_id'] + REQUIRED_COLUMNS + (['date'] if dated else [])
+        rows = rows[[c for c in layout if c in rows.columns]].copy()
+        for column in ['revenue', 'quantity']:
+            rows[column] = pd.to_numeric(rows[column], errors='raise')
+        if rows[REQUIRED_COLUMNS].isna().any().any():
+            raise ValueError("Rows must not contain empty values")
+        if 'sale_id' not in rows.columns or rows['sale_id'].isna().any():
+            rows['sale_id'] = range(next_sale_id, next_sale_id + len(rows))
+        if dated:
+            if 'date' not in rows.columns:
+                rows['date'] = pd.Timestamp.now().normalize()
+            rows['date'] = pd.to_datetime(rows['date']).fillna(pd.Timestamp.now().normalize())
+        rows['product'] = rows['product'].astype(str)
+        rows['region'] = rows['region'].astype(str)
+        return optimize_dtypes(rows[layout].reset_index(drop=True))
+
+    def append(self, rows: pd.DataFrame) -> DataSnapshot:
+        """Append a batch of rows and publish the new version.
+
+        In shared mode the rows are rewritten as one file per version, so every worker keeps
+        mapping a single copy instead of concatenating chunks privately.
+        """
+        with self._writing() as current:
+            batch = self.prepare_rows(rows, current.next_sale_id, dated='date' in current.columns)
+            if batch.empty:
+                return current
+            aggregates = current.aggregates.copy()
+            aggregates.update(batch)
+            next_sale_id = max(current.next_sale_id, int(batch['sale_id'].max()) + 1)
+            snapshot = DataSnapshot(current.chunks + [batch], aggregates, current.version + 1, next_sale_id,
+                                    AggregateStore.extend_fingerprint(current.fingerprint, batch))
+            if self.shared is not None:
+                snapshot = self._share(snapshot)
+            return self._publish(snapshot)
+
+    def reload(self, source_mtime: float = None) -> DataSnapshot:
+        """Reload everything from the data source and publish it as a new version.
+
+        In shared mode, a reload for a file change another worker already reloaded only
+        switches to that version.
+        """
+        if self.shared is None:
+            df = self.source.load()
+            with self._write_lock:
+                return self._publish(self._from_frame(df, self._snapshot.version + 1))
+
+        with self._writing() as current:
+            manifest = self.shared.manifest() or {}
+            if source_mtime is not None and manifest.get("source_mtime") == source_mtime:
+                return current
+            snapshot = self._from_frame(self.source.load(), current.version + 1)
+            return self._publish(self._share(snapshot, source_mtime=source_mtime))
+
+    # File-watch reload
+
+    def _mtime(self) -> Optional[float]:
+        path = getattr(self.source, "path", None)
+        try:
+            return os.stat(path).st_mtime if path else None
+        except OSError:
+            return None
+
+    def watch(self, interval_seconds: float = 5.0) -> bool:
+        """Reload in a background thread whenever the source file changes. False if not file-backed."""
+        if self._watcher is not None:
+            return True
+        self._watched_mtime = self._mtime()
+        if self._watched_mtime is None:
+            return False
+
+        def poll():
+            while True:
+                time.sleep(interval_seconds)
+                mtime = self._mtime()
+                if mtime is not None and mtime != self._watched_mtime:
+                    self._watched_mtime = mtime
+                    try:
+                        self.reload(source_mtime=mtime)
+                    except Exception as e:
+                        print(f"Warning: reload of {self.source.path} failed: {e}")
+
+        self._watcher = threading.Thread(target=poll, name="sales-data-watch", daemon=True)
+        self._watcher.start()
+        return True
+
+
+def parse_rows(body: bytes, content_type: str = "application/json") -> pd.DataFrame:
+    """Parse an ingest payload: CSV, a JSON list of row objects, or {"rows": [...]}"""
+    if "csv" in content_type:
+        return pd.read_csv(io.BytesIO(body))
+    payload = json.loads(body or b"[]")
+    if isinstance(payload, dict):
+        payload = payload.get("rows")
+    if not isinstance(payload, list):
+        raise ValueError('Expected a JSON list of rows or {"rows": [...]}')
+    return pd.DataFrame(payload)
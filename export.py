@@ -0,0 +1,179 @@
+"""
+Sales data export: filtering, column projection, cursor pagination and streamed encodings
+"""
+import base64
+import json
+from typing import Iterator, Optional
+
+import pandas as pd
+
+# Rows encoded per streamed chunk
+CHUNK_ROWS = 50_000
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _split(values: Optional[str]) -> list:
+    return [v.strip() for v in values.split(",") if v.strip()] if values else []
+
+
+def filter_sales(df: pd.DataFrame, product: str = None, region: str = None,
+                 min_sale_id: int = None, max_sale_id: int = None) -> pd.DataFrame:
+    """Vectorized row filter; product and region accept comma-separated lists"""
+    mask = pd.Series(True, index=df.index)
+    if product:
+        mask &= df['product'].isin(_split(product))
+    if region:
+        mask &= df['region'].isin(_split(region))
+    if min_sale_id is not None:
+        mask &= df['sale_id'] >= min_sale_id
+    if max_sale_id is not None:
+        mask &= df['sale_id'] <= max_sale_id
+    return df if mask.all() else df[mask]
+
+
+def project(df: pd.DataFrame, columns: str = None) -> pd.DataFrame:
+    """Keep only the requested comma-separated columns"""
+    wanted = _split(columns)
+    if not wanted:
+        return df
+    unknown = [c for c in wanted if c not in df.columns]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    return df[wanted]
+
+
+def encode_cursor(sale_id) -> str:
+    raw = json.dumps({"after": int(sale_id)}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))["after"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def paginate(df: pd.DataFrame, cursor: str = None, limit: int = None) -> tuple:
+    """Keyset pagination on sale_id. Returns (page, next_cursor or None)."""
+    if (cursor or limit is not None) and not df['sale_id'].is_monotonic_increasing:
+        # Appended rows may carry their own, out-of-order ids; pages must follow sale_id order
+        df = df.sort_values('sale_id', kind='stable')
+    if cursor:
+        after = decode_cursor(cursor)
+        df = df.iloc[df['sale_id'].searchsorted(after, side='right'):]
+    if limit is None or len(df) <= limit:
+        return df, None
+    page = df.iloc[:limit]
+    return page, encode_cursor(page['sale_id'].iloc[-1])
+
+
+def _chunks(df: pd.DataFrame) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(df), CHUNK_ROWS):
+        yield df.iloc[start:start + CHUNK_ROWS]
+
+
+def iter_json(df: pd.DataFrame, summary: dict, next_cursor: str = None) -> Iterator[bytes]:
+    """Stream {"data": [...], "summary": ..., "next_cursor": ...} without building the full list"""
+    yield b'{"data":['
+    first = True
+    for chunk in _chunks(df):
+        records = chunk.to_json(orient="records", date_format="iso", force_ascii=False)[1:-1]
+        if records:
+            yield (records if first else "," + records).encode("utf-8")
+            first = False
+    tail = {"summary": summary, "next_cursor": next_cursor}
+    yield ("]," + json.dumps(tail, ensure_ascii=False)[1:]).encode("utf-8")
+
+
+def iter_ndjson(df: pd.DataFrame) -> Iterator[bytes]:
+    for chunk in _chunks(df):
+        yield chunk.to_json(orient="records", lines=True, date_format="iso", force_ascii=False).rstrip("\n").encode("utf-8") + b"\n"
+
+
+def iter_csv(df: pd.DataFrame) -> Iterator[bytes]:
+    for index, chunk in enumerate(_chunks(df)):
+        yield chunk.to_csv(index=False, header=index == 0).encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator"""
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def _record_batches(df: pd.DataFrame):
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for chunk in _chunks(df):
+        yield schema, pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False)
+
+
+def iter_arrow(df: pd.DataFrame) -> Iterator[bytes]:
+    """Apache Arrow IPC stream, one record batch per chunk"""
+    import pyarrow as pa
+
+    sink = _ChunkSink()
+    writer = None
+    for schema, batch in _record_batches(df):
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, schema)
+        writer.write_batch(batch)
+        yield sink.drain()
+    if writer is None:
+        writer = pa.ipc.new_stream(sink, pa.Schema.from_pandas(df, preserve_index=False))
+    writer.close()
+    yield sink.drain()
+
+
+def iter_parquet(df: pd.DataFrame) -> Iterator[bytes]:
+    """Parquet file written one row group per chunk"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, pa.Schema.from_pandas(df, preserve_index=False))
+    for _, batch in _record_batches(df):
+        writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def export_stream(df: pd.DataFrame, fmt: str, summary: dict = None, next_cursor: str = None) -> Iterator[bytes]:
+    """Encoded byte chunks of `df` in the requested format"""
+    if fmt == "json":
+        return iter_json(df, summary, next_cursor)
+    if fmt == "ndjson":
+        return iter_ndjson(df)
+    if fmt == "csv":
+        return iter_csv(df)
+    if fmt in ("arrow", "parquet"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError(f"Format '{fmt}' requires pyarrow to be installed")
+        return iter_arrow(df) if fmt == "arrow" else iter_parquet(df)
+    raise ValueError(f"Unsupported format '{fmt}'. Use one of: {', '.join(MEDIA_TYPES)}")
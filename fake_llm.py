@@ -0,0 +1,155 @@
+"""
+Fake chat model for local testing and load tests without calling Groq
+"""
+import asyncio
+import time
+from typing import Any, AsyncIterator, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers with a fixed response after a configurable latency.
+
+    When streamed, `latency` is the time to first token and `token_delay` the gap between tokens.
+    """
+
+    latency: float = 0.0
+    token_delay: float = 0.0
+    response: str = "FinBot test answer: total revenue is ₹248,570."
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-finbot"
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        usage = {
+            "input_tokens": sum(len(str(m.content).split()) for m in messages),
+            "output_tokens": len(self.response.split()),
+        }
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        message = AIMessage(content=self.response, usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result(messages)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for index, word in enumerate(self.response.split(" ")):
+            if index:
+                await asyncio.sleep(self.token_delay)
+                word = " " + word
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+
+# Local fake Groq server, for exercising the real HTTP client, retries and circuit breaker
+
+def create_fake_server(latency: float = 0.0, token_delay: float = 0.0, error_rate: float = 0.0,
+                       error_status: int = 503, retry_after: int = None,
+                       response: str = FakeChatModel.model_fields["response"].default):
+    """FastAPI app speaking the Groq/OpenAI chat completions API with injected latency and errors.
+
+    Point FinBot at it with `FinBot(api_key="fake", base_url="http://127.0.0.1:8001")`.
+    POST /control changes any setting at runtime; GET /stats counts requests and injected errors.
+    """
+    import json
+    import random
+
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI(title="Fake Groq")
+    settings = {"latency": latency, "token_delay": token_delay, "error_rate": error_rate,
+                "error_status": error_status, "retry_after": retry_after, "response": response}
+    counters = {"requests": 0, "errors": 0}
+
+    def usage(body: dict) -> dict:
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        completion_tokens = len(settings["response"].split())
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def completion(body: dict, content: str, chunk: bool = False, finish: str = None, usage: dict = None) -> dict:
+        extra = {}
+        if chunk:
+            choice = {"index": 0, "delta": {"role": "assistant", "content": content}, "finish_reason": finish}
+            if usage:
+                # Groq reports streamed usage on the last chunk under x_groq
+                extra = {"x_groq": {"usage": usage}}
+        else:
+            choice = {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+        return {
+            "id": f"fake-{counters['requests']}",
+            "object": "chat.completion.chunk" if chunk else "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [choice],
+            "usage": usage or {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            **extra
+        }
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        counters["requests"] += 1
+        await asyncio.sleep(settings["latency"])
+
+        if random.random() < settings["error_rate"]:
+            counters["errors"] += 1
+            headers = {"Retry-After": str(settings["retry_after"])} if settings["retry_after"] else None
+            error = {"error": {"message": "injected failure", "type": "fake_error", "code": settings["error_status"]}}
+            return JSONResponse(error, status_code=settings["error_status"], headers=headers)
+
+        if not body.get("stream"):
+            return completion(body, settings["response"], usage=usage(body))
+
+        async def events():
+            for index, word in enumerate(settings["response"].split(" ")):
+                if index:
+                    await asyncio.sleep(settings["token_delay"])
+                    word = " " + word
+                yield f"data: {json.dumps(completion(body, word, chunk=True))}\n\n"
+            yield f"data: {json.dumps(completion(body, '', chunk=True, finish='stop', usage=usage(body)))}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/control")
+    async def control(changes: dict):
+        settings.update({k: v for k, v in changes.items() if k in settings})
+        return settings
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a fake Groq server with injected latency and errors")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before each response")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of injected failures")
+    parser.add_argument("--retry-after", type=int, default=None, help="Retry-After seconds on failures")
+    args = parser.parse_args()
+
+    server = create_fake_server(args.latency, args.token_delay, args.error_rate, args.error_status, args.retry_after)
+    uvicorn.run(server, host="127.0.0.1", port=args.port)
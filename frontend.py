@@ -1,6 +1,7 @@
 """
 Streamlit Frontend for FinBot
 """
+import json
 import streamlit as st
 import requests
 import pandas as pd
@@ -8,6 +9,10 @@ import plotly.express as px
 
 # Configuration
 API_URL = "http://127.0.0.1:8000"
+HEALTH_TTL_SECONDS = 10
+DATA_TTL_SECONDS = 30
+CHART_GROUPS = 20
+HISTOGRAM_BINS = 10
 
 st.set_page_config(
     page_title="FinBot - Sales Assistant",
@@ -60,29 +65,91 @@ st.markdown('<div class="main-header">💰 FinBot - Sales Assistant</div>', unsa
 st.markdown('<div class="sub-header">Your AI-powered finance and sales analysis companion</div>', unsafe_allow_html=True)
 
 # Check API health
-try:
-    health_response = requests.get(f"{API_URL}/")
-    if health_response.status_code != 200:
-        st.error("⚠️ Cannot connect to FinBot API. Please ensure the backend is running.")
-        st.stop()
-except requests.exceptions.ConnectionError:
+@st.cache_data(ttl=HEALTH_TTL_SECONDS, show_spinner=False)
+def fetch_readiness():
+    """Status code of /ready, or None if the backend is unreachable"""
+    try:
+        return requests.get(f"{API_URL}/ready", timeout=5).status_code
+    except requests.exceptions.ConnectionError:
+        return None
+
+readiness = fetch_readiness()
+if readiness is None:
     st.error("⚠️ Cannot connect to FinBot API. Please start the backend server with: `python main.py`")
     st.stop()
+if readiness == 503:
+    fetch_readiness.clear()
+    st.info("⏳ FinBot API is still loading the sales data. Refresh in a moment.")
+    st.stop()
+if readiness != 200:
+    st.error("⚠️ Cannot connect to FinBot API. Please ensure the backend is running.")
+    st.stop()
 
-# Fetch data
-@st.cache_data
-def fetch_sales_data():
-    response = requests.get(f"{API_URL}/sales-data")
-    return response.json()
-
-@st.cache_data
+# Fetch data: summaries and pre-aggregated chart series, never the full table
+@st.cache_data(ttl=DATA_TTL_SECONDS, show_spinner=False)
 def fetch_summary():
     response = requests.get(f"{API_URL}/summary")
     return response.json()
 
-sales_data = fetch_sales_data()
+@st.cache_data(ttl=DATA_TTL_SECONDS, show_spinner=False)
+def fetch_revenue_chart(by):
+    response = requests.get(f"{API_URL}/charts/revenue", params={"by": by, "limit": CHART_GROUPS})
+    return pd.DataFrame(response.json()['series'])
+
+@st.cache_data(ttl=DATA_TTL_SECONDS, show_spinner=False)
+def fetch_revenue_histogram(bins):
+    response = requests.get(f"{API_URL}/charts/revenue-histogram", params={"bins": bins})
+    return pd.DataFrame(response.json()['bins'], columns=['start', 'end', 'count'])
+
+@st.cache_data(ttl=DATA_TTL_SECONDS, show_spinner=False)
+def fetch_sales_page(cursor, limit):
+    """One page of rows and the cursor of the next page"""
+    params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+    response = requests.get(f"{API_URL}/sales-data", params=params)
+    page = response.json()
+    return pd.DataFrame(page['data']), page.get('next_cursor')
+
+def chat_session():
+    """ID of this chat's server-side session, created on first use (None if the server has sessions disabled)"""
+    if "session_id" not in st.session_state:
+        response = requests.post(f"{API_URL}/sessions")
+        st.session_state.session_id = response.json()["session_id"] if response.status_code == 200 else None
+    return st.session_state.session_id
+
+def end_chat_session():
+    session_id = st.session_state.pop("session_id", None)
+    if session_id:
+        requests.delete(f"{API_URL}/sessions/{session_id}")
+
+def post_in_session(path, payload, **kwargs):
+    """POST to a chat endpoint in this chat's session, starting a new session if it has expired"""
+    response = requests.post(f"{API_URL}{path}", json={**payload, "session_id": chat_session()}, **kwargs)
+    if response.status_code == 404:
+        response.close()
+        st.session_state.pop("session_id", None)
+        response = requests.post(f"{API_URL}{path}", json={**payload, "session_id": chat_session()}, **kwargs)
+    return response
+
+def stream_answer(question, timings):
+    """Yield answer tokens from the /ask/stream Server-Sent Events endpoint"""
+    with post_in_session("/ask/stream", {"question": question}, stream=True) as response:
+        if response.status_code != 200:
+            raise RuntimeError(response.json().get('detail', 'Unknown error'))
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                payload = json.loads(line[len("data: "):])
+                if event == "done":
+                    timings.update(payload)
+                elif event == "error":
+                    raise RuntimeError(payload['error'])
+                else:
+                    yield payload['token']
+                event = None
+
 summary = fetch_summary()
-df = pd.DataFrame(sales_data['data'])
 
 # Sidebar
 with st.sidebar:
@@ -130,10 +197,7 @@ with tab1:
     # Handle quick query
     if 'quick_query' in st.session_state:
         with st.spinner("Asking FinBot..."):
-            response = requests.post(
-                f"{API_URL}/quick-query",
-                json={"query_type": st.session_state['quick_query']}
-            )
+            response = post_in_session("/quick-query", {"query_type": st.session_state['quick_query']})
             if response.status_code == 200:
                 result = response.json()
                 st.session_state.chat_history.append(("You", st.session_state.get('quick_query_text', st.session_state['quick_query'])))
@@ -154,6 +218,9 @@ with tab1:
             else:
                 st.markdown(f'<div class="bot-msg">🤖 <b>FinBot:</b> {message}</div>', unsafe_allow_html=True)
         st.markdown('</div>', unsafe_allow_html=True)
+        timings = st.session_state.get('last_timings')
+        if timings and timings.get('ttft_ms') is not None:
+            st.caption(f"⏱️ First token {timings['ttft_ms']:,.0f} ms · total {timings['total_ms']:,.0f} ms ({timings['path']})")
     else:
         st.info("💬 Start chatting with FinBot using the box below!")
 
@@ -172,39 +239,57 @@ with tab1:
         clear_button = st.button("🧹 Clear Chat", use_container_width=True)
 
     if ask_button and user_question.strip():
-        with st.spinner("FinBot is thinking..."):
-            try:
-                response = requests.post(
-                    f"{API_URL}/ask",
-                    json={"question": user_question.strip()}
-                )
-                if response.status_code == 200:
-                    result = response.json()
-                    st.session_state.chat_history.append(("You", user_question.strip()))
-                    st.session_state.chat_history.append(("FinBot", result['answer']))
-                    st.session_state.question_input = user_question.strip()  
-                    st.rerun()
-                else:
-                    st.error(f"Error: {response.json().get('detail', 'Unknown error')}")
-            except Exception as e:
-                st.error(f"Failed to connect to FinBot: {str(e)}")
+        st.markdown(f'<div class="user-msg">🧑‍💼 <b>You:</b> {user_question.strip()}</div>', unsafe_allow_html=True)
+        timings = {}
+        try:
+            # Render tokens as they arrive instead of waiting for the full completion
+            answer = st.write_stream(stream_answer(user_question.strip(), timings))
+            st.session_state.chat_history.append(("You", user_question.strip()))
+            st.session_state.chat_history.append(("FinBot", answer))
+            st.session_state.question_input = user_question.strip()
+            st.session_state.last_timings = timings
+            st.rerun()
+        except requests.exceptions.ConnectionError as e:
+            st.error(f"Failed to connect to FinBot: {str(e)}")
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
 
     if clear_button:
+        end_chat_session()
         st.session_state.chat_history = []
         st.session_state.question_input = ""
         st.rerun()
 
 with tab2:
     st.header("Sales Data Table")
-    st.dataframe(df, use_container_width=True, height=400)
-    
-    csv = df.to_csv(index=False)
-    st.download_button(
-        label="📥 Download Data as CSV",
-        data=csv,
-        file_name="sales_data.csv",
-        mime="text/csv"
-    )
+
+    # Keyset pagination: the cursors of the pages visited so far, so Previous can step back
+    if "page_cursors" not in st.session_state:
+        st.session_state.page_cursors = [None]
+    page_size = st.selectbox("Rows per page", [50, 100, 500, 1000], index=1)
+    if st.session_state.get("page_size") != page_size:
+        st.session_state.page_size = page_size
+        st.session_state.page_cursors = [None]
+
+    page_df, next_cursor = fetch_sales_page(st.session_state.page_cursors[-1], page_size)
+    st.dataframe(page_df, use_container_width=True, height=400)
+
+    page_number = len(st.session_state.page_cursors)
+    total_pages = max(1, -(-summary['total_sales'] // page_size))
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        if st.button("⬅️ Previous", use_container_width=True, disabled=page_number == 1):
+            st.session_state.page_cursors.pop()
+            st.rerun()
+    with col2:
+        if st.button("Next ➡️", use_container_width=True, disabled=next_cursor is None):
+            st.session_state.page_cursors.append(next_cursor)
+            st.rerun()
+    with col3:
+        st.caption(f"Page {page_number:,} of {total_pages:,} · {summary['total_sales']:,} rows")
+
+    # Streamed by the backend straight to the browser
+    st.link_button("📥 Download Data as CSV", f"{API_URL}/sales-data?format=csv")
 
 with tab3:
     st.header("Sales Analytics")
@@ -212,38 +297,43 @@ with tab3:
     col1, col2 = st.columns(2)
     
     with col1:
-        product_revenue = df.groupby('product')['revenue'].sum().reset_index()
+        product_revenue = fetch_revenue_chart('product')
         fig1 = px.bar(
             product_revenue,
-            x='product',
+            x='label',
             y='revenue',
             title='Revenue by Product',
-            labels={'revenue': 'Revenue (₹)', 'product': 'Product'},
+            labels={'revenue': 'Revenue (₹)', 'label': 'Product'},
             color='revenue',
             color_continuous_scale='Blues'
         )
         st.plotly_chart(fig1, use_container_width=True)
     
     with col2:
-        region_revenue = df.groupby('region')['revenue'].sum().reset_index()
+        region_revenue = fetch_revenue_chart('region')
         fig2 = px.pie(
             region_revenue,
             values='revenue',
-            names='region',
+            names='label',
             title='Revenue Distribution by Region',
             hole=0.4
         )
         st.plotly_chart(fig2, use_container_width=True)
     
     st.subheader("Sales Distribution")
-    fig3 = px.histogram(
-        df,
+    histogram = fetch_revenue_histogram(HISTOGRAM_BINS)
+    histogram['revenue'] = (histogram['start'] + histogram['end']) / 2
+    fig3 = px.bar(
+        histogram,
         x='revenue',
-        nbins=10,
+        y='count',
         title='Revenue Distribution',
         labels={'revenue': 'Revenue (₹)', 'count': 'Number of Sales'},
         color_discrete_sequence=['#1f77b4']
     )
+    # Bars span their bins, like a histogram
+    fig3.update_traces(width=histogram['end'] - histogram['start'])
+    fig3.update_layout(bargap=0)
     st.plotly_chart(fig3, use_container_width=True)
 
 # Footer
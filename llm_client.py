@@ -0,0 +1,346 @@
+"""
+Resilient upstream LLM calls: shared connection pool, deadlines, retries with jitter,
+a circuit breaker and coalescing of identical in-flight requests
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from metrics import registry
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(Exception):
+    """Raised when the upstream LLM cannot answer: retries exhausted, deadline passed or circuit open"""
+
+    def __init__(self, reason: str, retry_after: int = 5):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def build_http_clients(max_connections: int = 20, max_keepalive: int = 10, timeout: float = 30.0) -> tuple:
+    """One sync and one async httpx client, reused by every upstream call so connections stay warm"""
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+    timeout = httpx.Timeout(timeout, connect=min(timeout, 5.0))
+    return httpx.Client(limits=limits, timeout=timeout), httpx.AsyncClient(limits=limits, timeout=timeout)
+
+
+def status_of(error: Exception) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, 5xx, timeouts and dropped connections are worth another attempt"""
+    import groq
+
+    if isinstance(error, (groq.APITimeoutError, groq.APIConnectionError, asyncio.TimeoutError,
+                          TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    return status_of(error) in RETRYABLE_STATUS
+
+
+def error_kind(error: Exception) -> str:
+    """Metric label for a failed attempt: the HTTP status, or the exception type"""
+    status = status_of(error)
+    return str(status) if status is not None else type(error).__name__
+
+
+def retry_after_of(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, from a Retry-After header"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class CircuitBreaker:
+    """Stops calling the upstream after repeated failures and probes it again after a cool-down.
+
+    closed: calls go through. open: calls are rejected until `reset_seconds` pass.
+    half-open: one trial call decides whether to close or reopen; a trial that is cancelled
+    before it finishes is aborted, and the next call becomes the trial.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.rejected = 0
+        self.aborted_trials = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being rejected without trying the upstream"""
+        return self.state == "open"
+
+    def admit(self) -> Optional[str]:
+        """"call" or "trial" when a call may go upstream, None when it is rejected.
+
+        In half-open state only one trial call is let through; its caller must end it with
+        record_success, record_failure or end_trial.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return "call"
+            if state == "half_open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return "trial"
+            self.rejected += 1
+            return None
+
+    def allow(self) -> bool:
+        """True when a call may go upstream; in half-open state only one trial call is let through"""
+        return self.admit() is not None
+
+    def end_trial(self) -> None:
+        """Abort a trial that neither succeeded nor failed (it was cancelled), so the next call can probe"""
+        with self._lock:
+            if self.trial_in_flight:
+                self.trial_in_flight = False
+                self.aborted_trials += 1
+
+    def retry_after(self) -> int:
+        if self.opened_at is None:
+            return 0
+        return max(1, int(self.reset_seconds - (time.monotonic() - self.opened_at)) + 1)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures, "rejected": self.rejected,
+                "aborted_trials": self.aborted_trials}
+
+
+class ResilientCaller:
+    """Runs upstream calls under a deadline with exponential backoff, full jitter and a circuit breaker"""
+
+    def __init__(self, deadline: float = 30.0, max_retries: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 8.0, breaker: CircuitBreaker = None):
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter delay before retry `attempt`, at least the server's Retry-After"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, min(retry_after_of(error) or 0, self.max_delay))
+
+    def _check_breaker(self) -> bool:
+        """Raise LLMUnavailable while the circuit is open; True if this call is the half-open trial"""
+        admitted = self.breaker.admit()
+        if admitted is None:
+            raise LLMUnavailable("circuit open", self.breaker.retry_after())
+        return admitted == "trial"
+
+    def _give_up(self, error: Exception) -> LLMUnavailable:
+        self.failures += 1
+        self.breaker.record_failure()
+        reason = "deadline exceeded" if isinstance(error, asyncio.TimeoutError) else f"upstream error: {error}"
+        return LLMUnavailable(reason, max(self.breaker.retry_after(), 1))
+
+    async def acall(self, fn: Callable[[], Awaitable]):
+        """Await `fn()` with retries; non-retryable errors are raised unchanged"""
+        trial = self._check_breaker()
+        self.calls += 1
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        try:
+            while True:
+                try:
+                    result = await asyncio.wait_for(fn(), timeout=max(deadline - time.monotonic(), 0.001))
+                except Exception as e:
+                    registry.inc("finbot_llm_errors_total", kind=error_kind(e))
+                    if not is_retryable(e):
+                        self.breaker.record_success()
+                        raise
+                    delay = self.backoff(attempt, e)
+                    if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                        raise self._give_up(e) from e
+                    attempt += 1
+                    self.retries += 1
+                    await asyncio.sleep(delay)
+                else:
+                    self.breaker.record_success()
+                    return result
+        finally:
+            if trial:
+                self.breaker.end_trial()
+
+    def call(self, fn: Callable[[], object]):
+        """Blocking variant of acall; the per-attempt timeout is enforced by the HTTP client"""
+        trial = self._check_breaker()
+        self.calls += 1
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        try:
+            while True:
+                try:
+                    result = fn()
+                except Exception as e:
+                    registry.inc("finbot_llm_errors_total", kind=error_kind(e))
+                    if not is_retryable(e):
+                        self.breaker.record_success()
+                        raise
+                    delay = self.backoff(attempt, e)
+                    if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                        raise self._give_up(e) from e
+                    attempt += 1
+                    self.retries += 1
+                    time.sleep(delay)
+                else:
+                    self.breaker.record_success()
+                    return result
+        finally:
+            if trial:
+                self.breaker.end_trial()
+
+    async def astream(self, open_stream: Callable):
+        """Yield from `open_stream()`, retrying only until the first chunk arrives"""
+        trial = self._check_breaker()
+        self.calls += 1
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        try:
+            while True:
+                stream = open_stream().__aiter__()
+                try:
+                    first = await asyncio.wait_for(stream.__anext__(), timeout=max(deadline - time.monotonic(), 0.001))
+                except StopAsyncIteration:
+                    self.breaker.record_success()
+                    return
+                except Exception as e:
+                    registry.inc("finbot_llm_errors_total", kind=error_kind(e))
+                    if not is_retryable(e):
+                        self.breaker.record_success()
+                        raise
+                    delay = self.backoff(attempt, e)
+                    if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                        raise self._give_up(e) from e
+                    attempt += 1
+                    self.retries += 1
+                    await asyncio.sleep(delay)
+                    continue
+                break
+            self.breaker.record_success()
+        finally:
+            if trial:
+                self.breaker.end_trial()
+
+        yield first
+        async for chunk in stream:
+            yield chunk
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "circuit": self.breaker.stats()
+        }
+
+
+def build_resilient_caller(config: dict) -> ResilientCaller:
+    """ResilientCaller from the llm_* keys in config.json"""
+    return ResilientCaller(
+        deadline=config.get("llm_deadline_seconds", 30),
+        max_retries=config.get("llm_max_retries", 3),
+        base_delay=config.get("llm_retry_base_seconds", 0.5),
+        max_delay=config.get("llm_retry_max_seconds", 8),
+        breaker=CircuitBreaker(
+            failure_threshold=config.get("llm_circuit_failure_threshold", 5),
+            reset_seconds=config.get("llm_circuit_reset_seconds", 30)
+        )
+    )
+
+
+def token_usage_callback():
+    """Callback handler that counts the prompt and completion tokens the chat model reports for each call"""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TokenUsageCallback(BaseCallbackHandler):
+        def on_llm_end(self, response, **kwargs) -> None:
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                    if usage:
+                        registry.inc("finbot_llm_tokens_total", usage.get("input_tokens", 0), kind="prompt")
+                        registry.inc("finbot_llm_tokens_total", usage.get("output_tokens", 0), kind="completion")
+
+    return TokenUsageCallback()
+
+
+class Coalescer:
+    """Shares one in-flight call between concurrent requests with the same key.
+
+    The call runs in its own task; every request awaits it through a shield, so a request that
+    is cancelled leaves the others waiting. The task is cancelled when its last waiter leaves.
+    """
+
+    def __init__(self):
+        self._in_flight = {}  # key -> [task, waiters]
+        self.coalesced = 0
+
+    async def run(self, key, fn: Callable[[], Awaitable]):
+        """Await `fn()`, or join the call already running for `key`"""
+        entry = self._in_flight.get(key)
+        if entry is None:
+            entry = [asyncio.ensure_future(fn()), 0]
+            self._in_flight[key] = entry
+
+            def finished(task, entry=entry):
+                if self._in_flight.get(key) is entry:
+                    del self._in_flight[key]
+                # Mark retrieved so an unobserved failure does not log "exception was never retrieved"
+                if not task.cancelled():
+                    task.exception()
+
+            entry[0].add_done_callback(finished)
+        else:
+            self.coalesced += 1
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._in_flight), "coalesced": self.coalesced}
@@ -0,0 +1,52 @@
+"""
+Bounded concurrency for upstream LLM calls
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class LLMQueueFull(Exception):
+    """Raised when too many requests are already waiting for an LLM slot"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class LLMLimiter:
+    """Caps in-flight LLM calls and rejects new work once the wait queue is full"""
+
+    def __init__(self, max_concurrent: int = 8, max_queued: int = 64, retry_after: int = 2):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.in_flight = 0
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one upstream slot for the duration of the block"""
+        if self._semaphore.locked() and self.waiting >= self.max_queued:
+            raise LLMQueueFull(self.retry_after)
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued
+        }
@@ -1,11 +1,48 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from starlette.background import BackgroundTask
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from typing import List, Optional
+import asyncio
+import contextlib
+import json
 import os
+import sys
+import threading
+import time
+import uuid
 from agent import FinBot
-from sales_data import get_sales_data, get_data_summary
+from llm_limiter import LLMLimiter, LLMQueueFull
+from llm_client import Coalescer, LLMUnavailable, build_resilient_caller
+from answer_cache import build_answer_cache, normalize_question
+from semantic_cache import build_semantic_cache
+from sessions import Session, build_session_store
+from tenant_data import build_dataset_registry
+from query_router import router, timed_ms
+from query_plan import PlanError, build_query_engine, format_result
+from sales_data import get_data_source
+from data_store import DataStore, DataSnapshot, parse_rows
+from shared_data import DEFAULT_DIRECTORY, SharedDataset
+from charts import MAX_BINS, revenue_series
+from export import MEDIA_TYPES, export_stream, filter_sales, paginate, project
+from metrics import MetricsMiddleware, TracedRoute, registry, tracer
 
-app = FastAPI(title="FinBot API", version="1.0.0")
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load in the background so the server accepts connections (and answers /) right away;
+    # /ready reports when the dataset is in memory
+    threading.Thread(target=startup, name="finbot-startup", daemon=True).start()
+    yield
+    if dataset_registry is not None:
+        dataset_registry.close()
+
+app = FastAPI(title="FinBot API", version="1.0.0", lifespan=lifespan)
+
+# Time every endpoint function as the `handler` stage of its request trace
+app.router.route_class = TracedRoute
 
 # CORS middleware for Streamlit frontend
 app.add_middleware(
@@ -16,76 +53,785 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize data
-sales_df = get_sales_data()
-data_summary = get_data_summary(sales_df)
+# Compress large responses for clients that send Accept-Encoding: gzip (SSE is excluded)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Outermost, so request counts and latency cover the other middleware too
+app.add_middleware(MetricsMiddleware)
+
+def load_config(path: str = "config.json") -> dict:
+    """Read optional server settings from config.json"""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+config = load_config()
+
+tracer.configure(
+    enabled=config.get("tracing_enabled", True),
+    headers=config.get("trace_headers", False),
+    log_path=config.get("trace_log_path")
+)
+
+# Requests read data_store.snapshot, which appends and reloads swap atomically; the data is
+# loaded by startup(), so importing this module stays cheap
+data_source = get_data_source(config.get("data_source"))
+
+# With several workers the dataset is loaded once and every worker maps the same copy
+workers = config.get("workers", 1)
+shared_dataset = None
+if workers > 1 and config.get("shared_data", True):
+    if __name__ == "__main__":
+        # A new run: ignore files left in the shared directory by a previous one
+        os.environ["FINBOT_SHARED_RUN"] = uuid.uuid4().hex
+    shared_dataset = SharedDataset(config.get("shared_data_dir") or DEFAULT_DIRECTORY,
+                                   run_id=os.environ.get("FINBOT_SHARED_RUN"))
 
-# Initialize FinBot
+# Initialize FinBot; the chat model and its client are built on the first LLM-bound request
 try:
-    finbot = FinBot()
+    finbot = FinBot(
+        context_token_budget=config.get("context_token_budget", 2000),
+        caller=build_resilient_caller(config),
+        base_url=config.get("llm_base_url"),
+        max_connections=config.get("llm_max_connections", 20)
+    )
 except ValueError as e:
     print(f"Warning: {e}")
     finbot = None
 
+# Cap concurrent upstream LLM calls and shed load once the queue is full
+llm_limiter = LLMLimiter(
+    max_concurrent=config.get("max_concurrent_llm_calls", 8),
+    max_queued=config.get("max_queued_llm_calls", 64),
+    retry_after=config.get("llm_retry_after_seconds", 2)
+)
+
+# Concurrent identical questions share one upstream call
+llm_coalescer = Coalescer()
+
+# Analytical questions ("average laptop revenue in the West") run as validated query plans
+query_engine = build_query_engine(config)
+
+# Multi-turn conversations: history kept server-side, compacted to a token cap
+session_store = build_session_store(config)
+
+# Tenant datasets by ID, loaded on first request and evicted to disk to stay within a memory budget
+dataset_registry = build_dataset_registry(config)
+DEFAULT_DATASET = "default"
+DATASET_HELP = "Dataset ID from config.json `datasets`; omit for the default dataset"
+
+# Set by startup()
+data_store: Optional[DataStore] = None
+answer_cache = None
+semantic_cache = None
+startup_state = {"status": "starting", "error": None, "seconds": None}
+startup_lock = threading.Lock()
+process_start = time.perf_counter()
+
+def scope_semantic_cache(snapshot: DataSnapshot) -> None:
+    entities = list(snapshot.aggregates.by_product.index) + list(snapshot.aggregates.by_region.index)
+    semantic_cache.set_dataset(snapshot.fingerprint, entities)
+
+def startup() -> None:
+    """Load and aggregate the dataset and open the answer caches; safe to call more than once"""
+    global data_store, answer_cache, semantic_cache
+    with startup_lock:
+        if startup_state["status"] == "ready":
+            return
+        try:
+            store = DataStore(data_source, shared=shared_dataset)
+
+            # Cache LLM answers per dataset fingerprint and prompt/model config
+            answer_cache = build_answer_cache(config, finbot.config_fingerprint() if finbot else "")
+            if answer_cache is not None:
+                answer_cache.set_dataset(store.snapshot.fingerprint)
+                store.on_swap(lambda snapshot: answer_cache.set_dataset(snapshot.fingerprint))
+
+            # Reuse answers across paraphrases ("top product?" / "best-selling item by revenue")
+            semantic_cache = build_semantic_cache(config, finbot.config_fingerprint() if finbot else "")
+            if semantic_cache is not None:
+                scope_semantic_cache(store.snapshot)
+                store.on_swap(scope_semantic_cache)
+
+            reload_settings = config.get("data_reload", {})
+            if reload_settings.get("watch"):
+                store.watch(reload_settings.get("interval_seconds", 5))
+        except Exception as e:
+            startup_state.update(status="failed", error=f"{type(e).__name__}: {e}")
+            print(f"Warning: startup failed: {startup_state['error']}")
+            raise
+        data_store = store
+        startup_state.update(status="ready", error=None, seconds=round(time.perf_counter() - process_start, 3))
+
+def not_ready() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="The dataset is still loading. Please retry shortly." if startup_state["status"] == "starting"
+        else f"Startup failed: {startup_state['error']}",
+        headers={"Retry-After": "1"}
+    )
+
+def tenant(dataset: Optional[str]) -> Optional[str]:
+    """The registry ID of a request's dataset, None for the default dataset, or 404 if it is unknown"""
+    if dataset is None or dataset == DEFAULT_DATASET:
+        return None
+    if dataset_registry is None or dataset not in dataset_registry:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset: {dataset}")
+    return dataset
+
+def load_tenant(dataset: str) -> DataStore:
+    """A tenant dataset's store, loaded on first use (concurrent first requests share one load)"""
+    try:
+        return dataset_registry.get(dataset)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not load dataset {dataset}: {type(e).__name__}: {e}")
+
+def loaded_data_store(dataset: Optional[str] = None) -> DataStore:
+    """The data store for `dataset`, or for the default dataset 503 until startup() has loaded it"""
+    dataset = tenant(dataset)
+    if dataset is not None:
+        return load_tenant(dataset)
+    if data_store is None:
+        raise not_ready()
+    return data_store
+
+def current_snapshot(dataset: Optional[str] = None) -> DataSnapshot:
+    return loaded_data_store(dataset).snapshot
+
+async def request_snapshot(dataset: Optional[str]) -> DataSnapshot:
+    """current_snapshot() for async endpoints: a tenant dataset that is not loaded loads in the thread pool"""
+    dataset = tenant(dataset)
+    if dataset is None:
+        return current_snapshot()
+    store = dataset_registry.resident(dataset)
+    if store is None:
+        store = await run_in_threadpool(load_tenant, dataset)
+    return store.snapshot
+
+def write_dataset(dataset: Optional[str], write):
+    """Run `write(store)` (an append or reload); a tenant dataset is not evicted while it writes"""
+    dataset = tenant(dataset)
+    if dataset is None:
+        return write(loaded_data_store())
+    with dataset_registry.writing(dataset) as store:
+        return write(store)
+
 class QuestionRequest(BaseModel):
     question: str
+    session_id: Optional[str] = None
+    dataset: Optional[str] = None
 
 class PredefinedQueryRequest(BaseModel):
     query_type: str
+    session_id: Optional[str] = None
+    dataset: Optional[str] = None
+
+class BatchQuestionRequest(BaseModel):
+    questions: List[str]
+    max_concurrency: Optional[int] = None
+    dataset: Optional[str] = None
+
+def llm_busy(e: LLMQueueFull) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="FinBot is busy. Please retry shortly.",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+def cached_answer(question: str, snapshot: DataSnapshot):
+    """Answer from the exact cache, then from a cached paraphrase; None on a miss"""
+    if answer_cache is not None:
+        answer = answer_cache.get(question, snapshot.fingerprint)
+        if answer is not None:
+            return answer
+    if semantic_cache is not None:
+        return semantic_cache.get(question, snapshot.fingerprint)
+    return None
+
+def store_answer(question: str, response: str, latency_ms: float, snapshot: DataSnapshot) -> None:
+    """Cache an LLM answer in both caches, skipping error responses"""
+    if finbot.is_error_response(response):
+        return
+    if answer_cache is not None:
+        answer_cache.set(question, response, latency_ms, snapshot.fingerprint)
+    if semantic_cache is not None:
+        semantic_cache.set(question, response, latency_ms, snapshot.fingerprint)
+
+async def ask_llm(question: str, snapshot: DataSnapshot) -> tuple:
+    """Answer from the cache or await FinBot under the concurrency limiter.
+
+    Identical questions already in flight for the same dataset join that call instead of
+    making their own. Returns (answer, cached). Raises 503 with Retry-After when the LLM
+    queue is saturated, and LLMUnavailable when the upstream is failing.
+    """
+    cached = cached_answer(question, snapshot)
+    if cached is not None:
+        return cached, True
+
+    async def call_upstream():
+        try:
+            async with llm_limiter.slot():
+                start = time.perf_counter()
+                response = await finbot.aget_response(question, snapshot.data_summary, aggregates=snapshot.aggregates)
+                latency_ms = (time.perf_counter() - start) * 1000
+        except LLMQueueFull as e:
+            raise llm_busy(e)
+
+        store_answer(question, response, latency_ms, snapshot)
+        return response
+
+    key = (snapshot.fingerprint, normalize_question(question))
+    return await llm_coalescer.run(key, call_upstream), False
+
+async def query_answer(question: str, snapshot: DataSnapshot) -> Optional[tuple]:
+    """Answer an analytical question by executing its query plan; the LLM only phrases the result.
+
+    Returns (answer, cached), or None when the question has no plan. If the LLM is busy,
+    unavailable or fails the computed result is returned as is.
+    """
+    if query_engine is None:
+        return None
+    plan = await query_engine.aplan(question, snapshot, finbot)
+    if plan is None:
+        return None
+    cached = cached_answer(question, snapshot)
+    if cached is not None:
+        return cached, True
+
+    try:
+        with tracer.stage("query_execute"):
+            result = format_result(plan, query_engine.execute(plan, snapshot))
+    except PlanError as e:
+        # The plan does not fit this dataset after all; let the LLM answer instead
+        print(f"Warning: query plan could not run: {e}")
+        return None
+    if not finbot:
+        return result, False
+
+    async def phrase():
+        try:
+            async with llm_limiter.slot():
+                start = time.perf_counter()
+                response = await finbot.aphrase_result(question, plan.describe(), result)
+        except (LLMQueueFull, LLMUnavailable):
+            return result
+        except Exception as e:
+            # The exact result is already computed; serve it rather than fail on a phrasing error
+            print(f"Warning: phrasing a query result failed: {type(e).__name__}: {e}")
+            return result
+        store_answer(question, response, timed_ms(start), snapshot)
+        return response
+
+    key = ("query", snapshot.fingerprint, normalize_question(question))
+    return await llm_coalescer.run(key, phrase), False
+
+def find_session(session_id: Optional[str]) -> Optional[Session]:
+    """The session for `session_id`, None without one, or 404 once it has expired"""
+    if session_id is None:
+        return None
+    if session_store is None:
+        raise HTTPException(status_code=400, detail="Sessions are disabled")
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired. Start a new one with POST /sessions.")
+    return session
+
+def session_fields(session: Optional[Session]) -> dict:
+    return {"session_id": session.id, "turn": session.turn_count} if session is not None else {}
+
+def remember(session: Optional[Session], question: str, answer: str, prompt_tokens: int = None) -> dict:
+    """Record a turn in the session (error answers excluded) and return its response fields"""
+    if session is not None and not (finbot and finbot.is_error_response(answer)):
+        session_store.record(session, question, answer, prompt_tokens)
+    return session_fields(session)
+
+async def ask_llm_in_session(question: str, session: Session, snapshot: DataSnapshot) -> tuple:
+    """Answer with the session's compacted history in the prompt. Returns (answer, cached, prompt_tokens).
+
+    Only a first turn can be served from the answer caches; later answers depend on the history,
+    so they skip the caches and the coalescer.
+    """
+    if not session.has_history:
+        cached = cached_answer(question, snapshot)
+        if cached is not None:
+            return cached, True, None
+    inputs = finbot.session_inputs(question, session.history(), snapshot.data_summary, aggregates=snapshot.aggregates)
+    prompt_tokens = finbot.session_prompt_tokens(inputs)
+    try:
+        async with llm_limiter.slot():
+            response = await finbot.aget_session_response(inputs)
+    except LLMQueueFull as e:
+        raise llm_busy(e)
+    return response, False, prompt_tokens
+
+def degraded_answer(snapshot: DataSnapshot) -> str:
+    """Computed overview served in place of an LLM answer while the upstream is unavailable"""
+    return (
+        "I can't reach the analysis model right now, so here is a summary of the current sales data instead.\n\n"
+        + router.run("overview", snapshot.context)
+    )
 
 @app.get("/")
 def root():
-    """Health check endpoint"""
+    """Liveness check: the process is up, whether or not the dataset has loaded (see /ready)"""
     return {
         "message": "FinBot API is running",
         "status": "healthy",
+        "ready": data_store is not None,
         "llm_available": finbot is not None
     }
 
-@app.get("/sales-data")
-def get_sales():
-    """Get all sales data"""
+@app.get("/ready")
+def readiness():
+    """Readiness check: 200 once the dataset is loaded and aggregated, 503 while starting or if loading failed"""
+    if data_store is None:
+        return JSONResponse(status_code=503, content={"status": startup_state["status"], "error": startup_state["error"]},
+                            headers={"Retry-After": "1"})
     return {
-        "data": sales_df.to_dict(orient="records"),
-        "summary": data_summary
+        "status": "ready",
+        "startup_seconds": startup_state["seconds"],
+        "dataset_version": data_store.snapshot.version
     }
 
+@app.get("/sales-data")
+def get_sales(
+    fmt: str = Query("json", alias="format", description="json, ndjson, csv, arrow or parquet"),
+    columns: str = Query(None, description="Comma-separated columns to return"),
+    product: str = Query(None, description="Comma-separated products to keep"),
+    region: str = Query(None, description="Comma-separated regions to keep"),
+    min_sale_id: int = None,
+    max_sale_id: int = None,
+    cursor: str = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(None, ge=1, description="Page size; omit to export every matching row"),
+    dataset: str = Query(None, description=DATASET_HELP)
+):
+    """Get sales data, filtered, projected and paginated, streamed in the requested encoding"""
+    snapshot = current_snapshot(dataset)
+    try:
+        rows = filter_sales(snapshot.sales_df, product, region, min_sale_id, max_sale_id)
+        rows, next_cursor = paginate(rows, cursor, limit)
+        rows = project(rows, columns)
+        body = export_stream(rows, fmt, snapshot.data_summary, next_cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {"X-Dataset-Version": str(snapshot.version)}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if fmt != "json":
+        headers["Content-Disposition"] = f'attachment; filename="sales_data.{fmt}"'
+    return StreamingResponse(body, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+@app.post("/sales-data/append")
+async def append_sales(request: Request, dataset: str = Query(None, description=DATASET_HELP)):
+    """Bulk-ingest rows as JSON (a list or {"rows": [...]}) or CSV (Content-Type: text/csv).
+
+    sale_id is optional and assigned sequentially when missing.
+    """
+    body = await request.body()
+    try:
+        rows = await run_in_threadpool(parse_rows, body, request.headers.get("content-type", ""))
+        snapshot = await run_in_threadpool(write_dataset, dataset, lambda store: store.append(rows))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"appended": len(rows), **snapshot.info()}
+
+@app.post("/sales-data/reload")
+def reload_sales(dataset: str = Query(None, description=DATASET_HELP)):
+    """Reload the dataset from its data source without restarting"""
+    return write_dataset(dataset, lambda store: store.reload()).info()
+
+@app.get("/sales-data/version")
+def get_sales_version(dataset: str = Query(None, description=DATASET_HELP)):
+    """Current dataset version and fingerprint, for clients that cache on it"""
+    return current_snapshot(dataset).info()
+
+@app.get("/data-source")
+def get_data_source_stats(dataset: str = Query(None, description=DATASET_HELP)):
+    """Which data source is loaded, with its load time and in-memory footprint"""
+    dataset = tenant(dataset)
+    if dataset is not None:
+        return {**dataset_registry.describe(dataset), "pid": os.getpid()}
+    stats = {**data_source.stats(), "pid": os.getpid()}
+    if shared_dataset is not None:
+        stats["shared"] = shared_dataset.stats()
+    return stats
+
+@app.get("/datasets")
+def list_datasets():
+    """Datasets by ID with their state, memory, load time and load/eviction counts, and the pool totals"""
+    default = {"dataset": DEFAULT_DATASET, "source": data_source.name, "state": startup_state["status"],
+               "version": data_store.snapshot.version if data_store is not None else None,
+               "memory_mb": data_source.stats()["memory_mb"], "load_seconds": startup_state["seconds"]}
+    if dataset_registry is None:
+        return {"pool": None, "datasets": [default]}
+    tenants = [dataset_registry.describe(dataset) for dataset in dataset_registry.ids()]
+    return {"pool": dataset_registry.stats(), "datasets": [default] + tenants}
+
+@app.get("/datasets/{dataset_id}")
+def get_dataset(dataset_id: str):
+    """One tenant dataset's state, memory and load time, without loading it"""
+    dataset = tenant(dataset_id)
+    if dataset is None:
+        return list_datasets()["datasets"][0]
+    return dataset_registry.describe(dataset)
+
 @app.get("/summary")
-def get_summary():
+def get_summary(dataset: str = Query(None, description=DATASET_HELP)):
     """Get data summary statistics"""
-    return data_summary
+    return current_snapshot(dataset).data_summary
+
+@app.get("/charts/revenue")
+def get_revenue_chart(
+    by: str = Query("product", description="product or region"),
+    limit: int = Query(20, ge=1, le=1000, description="Largest groups to return; the rest are summed as Other"),
+    dataset: str = Query(None, description=DATASET_HELP)
+):
+    """Revenue per product or region from the precomputed aggregates, for bar and pie charts"""
+    snapshot = current_snapshot(dataset)
+    try:
+        series = revenue_series(snapshot.aggregates, by, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"version": snapshot.version, "by": by, "series": series}
+
+@app.get("/charts/revenue-histogram")
+def get_revenue_histogram(
+    bins: int = Query(10, ge=1, le=MAX_BINS),
+    product: str = Query(None, description="Histogram of one product's sales"),
+    region: str = Query(None, description="Histogram of one region's sales"),
+    dataset: str = Query(None, description=DATASET_HELP)
+):
+    """Sale counts per revenue bin, binned on the server so clients never receive the rows"""
+    snapshot = current_snapshot(dataset)
+    if product is None and region is None:
+        return {"version": snapshot.version, "bins": snapshot.revenue_histogram(bins)}
+    try:
+        histogram = snapshot.aggregates.sketches.histogram(bins, product, region)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if histogram is None:
+        raise HTTPException(status_code=404, detail=f"Unknown product or region: {product or region}")
+    return {"version": snapshot.version, "bins": histogram}
+
+@app.get("/charts/revenue-percentiles")
+def get_revenue_percentiles(
+    q: str = Query("0.5,0.9,0.99", description="Comma-separated quantiles between 0 and 1"),
+    product: str = Query(None, description="Percentiles of one product's sales"),
+    region: str = Query(None, description="Percentiles of one region's sales"),
+    dataset: str = Query(None, description=DATASET_HELP)
+):
+    """Revenue per sale at the requested quantiles, from the mergeable quantile sketches"""
+    snapshot = current_snapshot(dataset)
+    try:
+        quantiles = [float(value) for value in q.split(",") if value.strip()]
+        if not quantiles or not all(0 <= value <= 1 for value in quantiles):
+            raise ValueError("Quantiles must be between 0 and 1")
+        values = snapshot.aggregates.sketches.quantiles(quantiles, product, region)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if values is None:
+        raise HTTPException(status_code=404, detail=f"Unknown product or region: {product or region}")
+    return {
+        "version": snapshot.version,
+        "relative_accuracy": snapshot.aggregates.sketches.relative_accuracy,
+        "quantiles": [{"q": quantile, "revenue": value} for quantile, value in zip(quantiles, values)]
+    }
+
+def llm_unavailable() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="LLM service unavailable. Please set GROQ_API_KEY."
+    )
 
 @app.post("/ask")
-def ask_question(request: QuestionRequest):
-    """Ask FinBot a question - interacts directly with LLM"""
-    if not finbot:
-        raise HTTPException(
-            status_code=503, 
-            detail="LLM service unavailable. Please set GROQ_API_KEY."
-        )
-    
+async def ask_question(request: QuestionRequest):
+    """Ask FinBot a question - computed handlers answer simple questions, the LLM answers the rest"""
     if not request.question or request.question.strip() == "":
         raise HTTPException(status_code=400, detail="Question cannot be empty")
+
+    start = time.perf_counter()
+    snapshot = await request_snapshot(request.dataset)
+    session = find_session(request.session_id)
+    computed = router.answer(request.question, snapshot.context)
+    if computed is not None:
+        handler, response = computed
+        router.record("computed", timed_ms(start))
+        return {
+            "question": request.question,
+            "answer": response,
+            "source": "computed",
+            "path": "computed",
+            "handler": handler,
+            "cached": False,
+            **remember(session, request.question, response)
+        }
+
+    planned = await query_answer(request.question, snapshot)
+    if planned is not None:
+        response, cached = planned
+        router.record("query", timed_ms(start))
+        return {
+            "question": request.question,
+            "answer": response,
+            "source": "query",
+            "path": "query",
+            "cached": cached,
+            **remember(session, request.question, response)
+        }
+
+    if not finbot:
+        raise llm_unavailable()
     
     try:
-        response = finbot.get_response(request.question, data_summary)
+        prompt_tokens = None
+        if session is not None:
+            response, cached, prompt_tokens = await ask_llm_in_session(request.question, session, snapshot)
+        else:
+            response, cached = await ask_llm(request.question, snapshot)
+        router.record("llm", timed_ms(start))
         return {
             "question": request.question,
             "answer": response,
-            "source": "llm"
+            "source": "llm",
+            "path": "llm",
+            "cached": cached,
+            **remember(session, request.question, response, prompt_tokens)
+        }
+    except LLMUnavailable:
+        router.record("fallback", timed_ms(start))
+        return {
+            "question": request.question,
+            "answer": degraded_answer(snapshot),
+            "source": "computed",
+            "path": "fallback",
+            "handler": "overview",
+            "cached": False,
+            **session_fields(session)
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/quick-query")
-def quick_query(request: PredefinedQueryRequest):
-    """Handle predefined queries - interacts directly with LLM for consistent responses"""
+def sse_event(data: dict, event: str = None) -> str:
+    """Format one Server-Sent Event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    """Ask FinBot a question and receive the answer as Server-Sent Events.
+
+    Each `data:` event carries a `token`; a final `done` event reports the serving path,
+    time to first token and total time in milliseconds (and the session and turn, in a session).
+    If the answer fails mid-stream an `error` event ends the stream instead and nothing is cached.
+    """
+    if not request.question or request.question.strip() == "":
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+
+    start = time.perf_counter()
+    snapshot = await request_snapshot(request.dataset)
+    session = find_session(request.session_id)
+    computed = router.answer(request.question, snapshot.context)
+    cached = False
+    if computed is None:
+        planned = await query_answer(request.question, snapshot)
+        if planned is not None:
+            computed, cached = ("query", planned[0]), planned[1]
+    if computed is None and (session is None or not session.has_history):
+        response = cached_answer(request.question, snapshot)
+        if response is not None:
+            computed, cached = ("cache", response), True
+    if computed is None and finbot and finbot.caller.breaker.is_open:
+        computed = ("fallback", degraded_answer(snapshot))
+
+    if computed is not None:
+        handler, response = computed
+        path = {"cache": "llm", "fallback": "fallback", "query": "query"}.get(handler, "computed")
+
+        async def single_event():
+            ttft_ms = timed_ms(start)
+            yield sse_event({"token": response})
+            router.record(path, timed_ms(start))
+            fields = session_fields(session) if path == "fallback" else remember(session, request.question, response)
+            yield sse_event({"path": path, "cached": cached, "ttft_ms": ttft_ms,
+                             "total_ms": timed_ms(start), **fields}, event="done")
+
+        return StreamingResponse(single_event(), media_type="text/event-stream")
+
     if not finbot:
-        raise HTTPException(
-            status_code=503,
-            detail="LLM service unavailable. Please set GROQ_API_KEY."
-        )
-    
+        raise llm_unavailable()
+
+    prompt_tokens = None
+    if session is not None:
+        inputs = finbot.session_inputs(request.question, session.history(), snapshot.data_summary,
+                                       aggregates=snapshot.aggregates)
+        prompt_tokens = finbot.session_prompt_tokens(inputs)
+        stream = finbot.astream_session_response(inputs)
+    else:
+        stream = finbot.astream_response(request.question, snapshot.data_summary, aggregates=snapshot.aggregates)
+
+    # Take the upstream slot before responding so a saturated queue still returns a plain 503
+    slot = llm_limiter.slot()
+    try:
+        await slot.__aenter__()
+    except LLMQueueFull as e:
+        raise llm_busy(e)
+    released = False
+
+    async def release_slot():
+        """Give the slot back once, whether the stream ran, failed or was never started"""
+        nonlocal released
+        if not released:
+            released = True
+            await slot.__aexit__(None, None, None)
+
+    async def token_events():
+        chunks = []
+        ttft_ms = None
+        try:
+            async for chunk in stream:
+                if not chunk:
+                    continue
+                if ttft_ms is None:
+                    ttft_ms = timed_ms(start)
+                    router.record("llm_stream_ttft", ttft_ms)
+                chunks.append(chunk)
+                yield sse_event({"token": chunk})
+        except LLMUnavailable:
+            yield sse_event({"token": degraded_answer(snapshot)})
+            router.record("fallback", timed_ms(start))
+            yield sse_event({"path": "fallback", "cached": False, "ttft_ms": timed_ms(start),
+                             "total_ms": timed_ms(start), **session_fields(session)}, event="done")
+            return
+        except Exception as e:
+            # A partial answer is neither cached nor added to the session history
+            print(f"Warning: streaming an answer failed: {type(e).__name__}: {e}")
+            router.record("llm_stream_error", timed_ms(start))
+            yield sse_event({"error": f"{type(e).__name__}: {e}", "partial": bool(chunks),
+                             **session_fields(session)}, event="error")
+            return
+        finally:
+            await release_slot()
+
+        total_ms = timed_ms(start)
+        router.record("llm_stream", total_ms)
+        response = "".join(chunks)
+        if session is None:
+            store_answer(request.question, response, total_ms, snapshot)
+        fields = remember(session, request.question, response, prompt_tokens)
+        yield sse_event({"path": "llm", "cached": False, "ttft_ms": ttft_ms, "total_ms": total_ms, **fields},
+                        event="done")
+
+    # The background task also runs when the client disconnects before the body is iterated
+    try:
+        return StreamingResponse(token_events(), media_type="text/event-stream",
+                                 background=BackgroundTask(release_slot))
+    except BaseException:
+        await release_slot()
+        raise
+
+@app.post("/ask/batch")
+async def ask_batch(request: BatchQuestionRequest):
+    """Answer a list of questions in one round trip, returned in order with per-item status and timing.
+
+    Computed and cached answers are served directly and analytical questions run as query plans;
+    the remaining distinct questions fan out to the LLM concurrently, capped by `max_concurrency`
+    and the server's concurrency limit.
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="Questions cannot be empty")
+    max_batch = config.get("max_batch_questions", 100)
+    if len(request.questions) > max_batch:
+        raise HTTPException(status_code=400, detail=f"At most {max_batch} questions per batch")
+
+    start = time.perf_counter()
+    snapshot = await request_snapshot(request.dataset)
+    results = []
+    unplanned = []
+    pending = {}
+
+    for index, question in enumerate(request.questions):
+        item_start = time.perf_counter()
+        result = {"index": index, "question": question}
+        results.append(result)
+        if not question or question.strip() == "":
+            result.update(status="error", error="Question cannot be empty")
+            continue
+
+        computed = router.answer(question, snapshot.context)
+        if computed is not None:
+            handler, response = computed
+            result.update(status="ok", answer=response, source="computed", path="computed",
+                          handler=handler, cached=False, ms=timed_ms(item_start))
+            continue
+
+        unplanned.append((result, item_start))
+
+    async def plan_one(result, item_start):
+        planned = await query_answer(result["question"], snapshot)
+        if planned is not None:
+            result.update(status="ok", answer=planned[0], source="query", path="query", cached=planned[1],
+                          ms=timed_ms(item_start))
+            return False
+        return True
+
+    needs_llm = await asyncio.gather(*(plan_one(result, item_start) for result, item_start in unplanned))
+    for (result, item_start), unanswered in zip(unplanned, needs_llm):
+        if not unanswered:
+            continue
+        question = result["question"]
+        cached = cached_answer(question, snapshot)
+        if cached is not None:
+            result.update(status="ok", answer=cached, source="llm", path="llm", cached=True,
+                          ms=timed_ms(item_start))
+            continue
+
+        # Repeats of the same question in one batch share a single upstream call
+        pending.setdefault(normalize_question(question), []).append(result)
+
+    if pending and not finbot:
+        for waiting in pending.values():
+            for result in waiting:
+                result.update(status="error", error=llm_unavailable().detail)
+    elif pending:
+        max_concurrency = min(request.max_concurrency or llm_limiter.max_concurrent, llm_limiter.max_concurrent)
+        questions = [waiting[0]["question"] for waiting in pending.values()]
+        # Every fanned-out call takes its own limiter slot, so batches share the server-wide cap
+        answers = await finbot.abatch_responses(questions, snapshot.data_summary, aggregates=snapshot.aggregates,
+                                                max_concurrency=max(max_concurrency, 1), slot=llm_limiter.slot)
+        if all(isinstance(response, LLMQueueFull) for response, _ in answers):
+            raise llm_busy(answers[0][0])
+
+        for (question, waiting), (response, elapsed_ms) in zip(zip(questions, pending.values()), answers):
+            if isinstance(response, LLMQueueFull):
+                update = dict(status="error", error=f"FinBot is busy. Please retry in {response.retry_after}s.")
+            elif isinstance(response, LLMUnavailable):
+                update = dict(status="ok", answer=degraded_answer(snapshot), source="computed", path="fallback",
+                              handler="overview", cached=False)
+            elif finbot.is_error_response(response):
+                update = dict(status="error", error=response)
+            else:
+                update = dict(status="ok", answer=response, source="llm", path="llm", cached=False)
+                store_answer(question, response, elapsed_ms, snapshot)
+            for result in waiting:
+                result.update(update, ms=elapsed_ms)
+
+    total_ms = timed_ms(start)
+    router.record("batch", total_ms)
+    return {
+        "count": len(results),
+        "llm_calls": len(pending),
+        "total_ms": total_ms,
+        "results": results
+    }
+
+@app.post("/quick-query")
+async def quick_query(request: PredefinedQueryRequest):
+    """Handle predefined queries - served by computed handlers, with the LLM as fallback"""
     query_map = {
         "total_revenue": "What is the total revenue?",
         "top_product": "Which product has the highest revenue?",
@@ -97,17 +843,186 @@ def quick_query(request: PredefinedQueryRequest):
     question = query_map.get(request.query_type)
     if not question:
         raise HTTPException(status_code=400, detail="Invalid query type")
+
+    start = time.perf_counter()
+    snapshot = await request_snapshot(request.dataset)
+    session = find_session(request.session_id)
+    response = router.run(request.query_type, snapshot.context)
+    if response is not None:
+        router.record("computed", timed_ms(start))
+        return {
+            "query_type": request.query_type,
+            "answer": response,
+            "source": "computed",
+            "path": "computed",
+            "cached": False,
+            **remember(session, question, response)
+        }
+
+    if not finbot:
+        raise llm_unavailable()
     
     try:
-        response = finbot.get_response(question, data_summary)
+        response, cached = await ask_llm(question, snapshot)
+        router.record("llm", timed_ms(start))
         return {
             "query_type": request.query_type,
             "answer": response,
-            "source": "llm_predefined"
+            "source": "llm_predefined",
+            "path": "llm",
+            "cached": cached,
+            **remember(session, question, response)
         }
+    except LLMUnavailable:
+        router.record("fallback", timed_ms(start))
+        return {
+            "query_type": request.query_type,
+            "answer": degraded_answer(snapshot),
+            "source": "computed",
+            "path": "fallback",
+            "cached": False,
+            **session_fields(session)
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/sessions")
+def create_session():
+    """Start a conversation; pass its session_id to /ask, /ask/stream and /quick-query for follow-ups"""
+    if session_store is None:
+        raise HTTPException(status_code=400, detail="Sessions are disabled")
+    session = session_store.create()
+    return {"session_id": session.id, "ttl_seconds": session_store.ttl_seconds}
+
+@app.get("/sessions/stats")
+def get_session_stats():
+    """Session counts, evictions, memory and history/prompt token sizes"""
+    if session_store is None:
+        return {"enabled": False}
+    return {"enabled": True, **session_store.stats()}
+
+@app.get("/sessions/{session_id}")
+def get_session(session_id: str):
+    """A session's recent turns, compacted summary, history tokens and memory"""
+    return find_session(session_id).describe()
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    if session_store is None or not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"session_id": session_id, "deleted": True}
+
+@app.get("/router/stats")
+def get_router_stats():
+    """Request counts and latency per serving path (computed vs llm)"""
+    return router.stats()
+
+@app.get("/llm/stats")
+def get_llm_stats():
+    """Upstream retries, failures and circuit breaker state, plus limiter and coalescing counters"""
+    if not finbot:
+        return {"available": False}
+    return {
+        "available": True,
+        **finbot.caller.stats(),
+        "limiter": llm_limiter.stats(),
+        "coalescing": llm_coalescer.stats()
+    }
+
+@registry.collector
+def collect_app_metrics():
+    """Counters the app already keeps, read at scrape time"""
+    for path, stats in router.latency.items():
+        yield "finbot_path_requests_total", "counter", "Answers by serving path", {"path": path}, stats["count"]
+        yield "finbot_path_latency_ms_total", "counter", "Total latency by serving path", {"path": path}, stats["total_ms"]
+    if answer_cache is not None:
+        cache = answer_cache.stats()
+        yield "finbot_answer_cache_hits_total", "counter", "Answer cache hits", {}, cache["hits"]
+        yield "finbot_answer_cache_misses_total", "counter", "Answer cache misses", {}, cache["misses"]
+        yield "finbot_answer_cache_entries", "gauge", "Answers currently cached", {}, cache["entries"]
+    if semantic_cache is not None:
+        semantic = semantic_cache.stats()
+        yield "finbot_semantic_cache_hits_total", "counter", "Semantic cache hits", {}, semantic["hits"]
+        yield "finbot_semantic_cache_misses_total", "counter", "Semantic cache misses", {}, semantic["misses"]
+        yield "finbot_semantic_cache_entries", "gauge", "Answers in the semantic cache", {}, semantic["entries"]
+    if finbot:
+        upstream = finbot.caller.stats()
+        yield "finbot_llm_calls_total", "counter", "Upstream LLM calls, retries excluded", {}, upstream["calls"]
+        yield "finbot_llm_retries_total", "counter", "Upstream LLM retries", {}, upstream["retries"]
+        yield "finbot_llm_failures_total", "counter", "Questions that ran out of retries", {}, upstream["failures"]
+        yield "finbot_llm_circuit_open", "gauge", "1 while the circuit breaker rejects calls", {}, finbot.caller.breaker.is_open
+        yield "finbot_llm_circuit_rejected_total", "counter", "Calls rejected by the circuit breaker", {}, upstream["circuit"]["rejected"]
+    yield "finbot_llm_in_flight", "gauge", "Upstream LLM calls in flight", {}, llm_limiter.in_flight
+    yield "finbot_llm_waiting", "gauge", "Requests waiting for an LLM slot", {}, llm_limiter.waiting
+    yield "finbot_llm_coalesced_total", "counter", "Requests that joined an identical in-flight call", {}, llm_coalescer.coalesced
+    if session_store is not None:
+        sessions = session_store.stats()
+        yield "finbot_sessions", "gauge", "Sessions held in memory", {}, sessions["sessions"]
+        yield "finbot_session_memory_bytes", "gauge", "Memory used by session histories", {}, sessions["memory_bytes"]
+        yield "finbot_session_turns_total", "counter", "Turns recorded in sessions", {}, sessions["turns"]
+        yield "finbot_sessions_evicted_total", "counter", "Sessions evicted from memory by the LRU", {}, sessions["evicted"]
+    if query_engine is not None:
+        query = query_engine.stats()
+        yield "finbot_query_plan_cache_hits_total", "counter", "Query plans served from the plan cache", {}, query["plan_cache_hits"]
+        yield "finbot_query_result_cache_hits_total", "counter", "Query results served from the result cache", {}, query["result_cache_hits"]
+        yield "finbot_query_llm_plans_total", "counter", "Query plans requested from the LLM", {}, query["llm_plans"]
+    if dataset_registry is not None:
+        pool = dataset_registry.stats()
+        yield "finbot_datasets_loaded", "gauge", "Tenant datasets held in memory or mapped", {}, pool["states"].get("memory", 0) + pool["states"].get("mapped", 0)
+        yield "finbot_dataset_pool_memory_bytes", "gauge", "Heap memory of loaded tenant datasets", {}, dataset_registry.memory_bytes()
+        yield "finbot_dataset_pool_budget_bytes", "gauge", "Memory budget of the tenant dataset pool", {}, dataset_registry.memory_budget_bytes or 0
+        yield "finbot_dataset_loads_total", "counter", "Tenant dataset loads, from the source or a spill file", {}, pool["loads"]
+        yield "finbot_dataset_joined_loads_total", "counter", "Requests that waited for a load already in progress", {}, pool["joined_loads"]
+        yield "finbot_dataset_spills_total", "counter", "Tenant datasets moved from memory to a mapped spill file", {}, pool["spills"]
+        yield "finbot_dataset_drops_total", "counter", "Mapped tenant datasets dropped from the pool", {}, pool["drops"]
+    if data_store is None:
+        return
+    snapshot = data_store.snapshot
+    yield "finbot_dataset_version", "gauge", "Current dataset version", {}, snapshot.version
+    yield "finbot_dataset_rows", "gauge", "Rows in the current dataset", {}, snapshot.aggregates.total_sales
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Request, stage, cache and upstream LLM metrics in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Exact and semantic answer cache hit rates and LLM latency saved by cache hits"""
+    stats = {"enabled": False} if answer_cache is None else {"enabled": True, **answer_cache.stats()}
+    stats["semantic"] = {"enabled": False} if semantic_cache is None else {"enabled": True, **semantic_cache.stats()}
+    return stats
+
+@app.get("/query/stats")
+def get_query_stats():
+    """Query plan and result cache counters for analytical questions"""
+    if query_engine is None:
+        return {"enabled": False}
+    return {"enabled": True, **query_engine.stats()}
+
+@app.post("/query/plan")
+async def explain_query_plan(request: QuestionRequest):
+    """Show the query plan for a question and its computed result, without calling the LLM to phrase it"""
+    if query_engine is None:
+        raise HTTPException(status_code=404, detail="Query engine is disabled")
+    snapshot = await request_snapshot(request.dataset)
+    plan = await query_engine.aplan(request.question, snapshot, finbot)
+    if plan is None:
+        return {"question": request.question, "plan": None}
+    try:
+        result = query_engine.execute(plan, snapshot)
+    except PlanError as e:
+        raise HTTPException(status_code=400, detail=f"Query plan could not run: {e}")
+    return {
+        "question": request.question,
+        "plan": plan.to_dict(),
+        "description": plan.describe(),
+        "result": format_result(plan, result),
+        "rows": result.to_dict(orient="records")
+    }
+
 @app.get("/prompts")
 def get_sample_prompts():
     """Get sample prompts users can try"""
@@ -117,10 +1032,21 @@ def get_sample_prompts():
             "Which product generates the most revenue?",
             "Show me sales by region",
             "What's the average revenue per sale?",
-            "How is our North region performing?"
+            "How is our North region performing?",
+            "What is the average Laptop revenue in the West?",
+            "What is the 90th percentile revenue for Laptop?"
         ]
     }
 
 if __name__ == "__main__":
+    port = str(config.get("port", 8000))
+    if workers > 1:
+        # Load and publish the dataset for this run, then hand over to uvicorn's process manager,
+        # whose workers import main:app and map it
+        startup()
+        app_dir = os.path.dirname(os.path.abspath(__file__))
+        os.execv(sys.executable, [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", app_dir,
+                                  "--host", "0.0.0.0", "--port", port, "--workers", str(workers)])
+
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=int(port))
\ No newline at end of file
@@ -0,0 +1,318 @@
+"""
+Request metrics and per-stage tracing, exposed in the Prometheus text format with an optional JSONL trace log
+"""
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import threading
+import time
+import uuid
+from typing import Callable, Iterable, Optional
+
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
+
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram"""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    """Counters and histograms keyed by name and labels, plus collectors read at scrape time.
+
+    Collectors are callables yielding (name, type, help, labels, value) so components that
+    already keep their own counters (answer cache, router, LLM caller) are not counted twice.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def collector(self, fn: Callable[[], Iterable[tuple]]) -> Callable:
+        """Register `fn` to be called on every scrape; usable as a decorator"""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        families = {}
+
+        def family(name, kind, help_text=None):
+            if name not in families:
+                kind, help_text = self._help.get(name, (kind, help_text or name))
+                families[name] = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            return families[name]
+
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = [(key, list(h.counts), h.sum, h.count, h.buckets) for key, h in self._histograms.items()]
+
+        for (name, labels), value in counters:
+            family(name, "counter").append(f"{name}{_labels(dict(labels))} {value:g}")
+
+        for (name, labels), counts, total, count, buckets in histograms:
+            lines = family(name, "histogram")
+            labels = dict(labels)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': f'{bound:g}'})} {cumulative}")
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:.3f}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        for collect in self._collectors:
+            for name, kind, help_text, labels, value in collect():
+                family(name, kind, help_text).append(f"{name}{_labels(labels)} {float(value):g}")
+
+        return "\n".join(line for lines in families.values() for line in lines) + "\n"
+
+
+class Trace:
+    """Stage timings for one request"""
+
+    def __init__(self, endpoint: str = ""):
+        self.id = uuid.uuid4().hex[:16]
+        self.endpoint = endpoint
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.handler_end = None
+        self.streaming = False
+
+    def add(self, stage: str, elapsed_ms: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + elapsed_ms
+
+    def server_timing(self, total_ms: float) -> str:
+        """Stages as a Server-Timing header value"""
+        parts = [f"{stage};dur={ms:.2f}" for stage, ms in self.stages.items()]
+        parts.append(f"total;dur={total_ms:.2f}")
+        return ", ".join(parts)
+
+
+_current_trace = contextvars.ContextVar("finbot_trace", default=None)
+_NOOP = contextlib.nullcontext()
+
+
+class _Stage:
+    __slots__ = ("tracer", "name", "start")
+
+    def __init__(self, tracer: "Tracer", name: str):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed_ms = (time.perf_counter() - self.start) * 1000
+        self.tracer.registry.observe("finbot_stage_duration_ms", elapsed_ms, stage=self.name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(self.name, elapsed_ms)
+        return False
+
+
+class Tracer:
+    """Per-stage timings for the request path.
+
+    Disabled, `stage()` returns a shared no-op context manager and `traced` wrappers call
+    straight through, so instrumented code pays one attribute check.
+    """
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self.enabled = False
+        self.headers = False
+        self._log = None
+        self._log_lock = threading.Lock()
+
+    def configure(self, enabled: bool = False, headers: bool = False, log_path: Optional[str] = None) -> None:
+        self.enabled = enabled
+        self.headers = enabled and headers
+        if self._log is not None:
+            self._log.close()
+        self._log = open(log_path, "a", buffering=1) if enabled and log_path else None
+
+    def stage(self, name: str):
+        """Context manager that times a block as stage `name`"""
+        if not self.enabled:
+            return _NOOP
+        return _Stage(self, name)
+
+    def traced(self, name: str) -> Callable:
+        """Decorator that times every call of a sync or async function as stage `name`"""
+        def decorate(fn):
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await fn(*args, **kwargs)
+                    with _Stage(self, name):
+                        return await fn(*args, **kwargs)
+            else:
+                @functools.wraps(fn)
+                def wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return fn(*args, **kwargs)
+                    with _Stage(self, name):
+                        return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def log(self, trace: Trace, status: int, total_ms: float) -> None:
+        if self._log is None:
+            return
+        record = {"trace_id": trace.id, "ts": time.time(), "endpoint": trace.endpoint, "status": status,
+                  "total_ms": round(total_ms, 3), "stages": {k: round(v, 3) for k, v in trace.stages.items()}}
+        with self._log_lock:
+            self._log.write(json.dumps(record) + "\n")
+
+
+registry = MetricsRegistry()
+tracer = Tracer(registry)
+
+registry.describe("finbot_http_requests_total", "counter", "HTTP requests by endpoint, method and status")
+registry.describe("finbot_http_request_duration_ms", "histogram", "Time to the end of the response body per endpoint")
+registry.describe("finbot_stage_duration_ms", "histogram", "Time spent per request stage (tracing enabled only)")
+registry.describe("finbot_llm_tokens_total", "counter", "Upstream LLM tokens by kind (prompt or completion)")
+registry.describe("finbot_llm_errors_total", "counter", "Failed upstream LLM attempts by kind")
+
+
+def _endpoint_wrapper(endpoint: Callable) -> Callable:
+    """Time an endpoint function as the `handler` stage and mark when it returned"""
+    def finish(trace, start, result):
+        trace.handler_end = time.perf_counter()
+        trace.streaming = isinstance(result, StreamingResponse)
+        trace.add("handler", (trace.handler_end - start) * 1000)
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            trace = _current_trace.get()
+            if trace is None:
+                return await endpoint(*args, **kwargs)
+            start = time.perf_counter()
+            result = None
+            try:
+                result = await endpoint(*args, **kwargs)
+                return result
+            finally:
+                finish(trace, start, result)
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            trace = _current_trace.get()
+            if trace is None:
+                return endpoint(*args, **kwargs)
+            start = time.perf_counter()
+            result = None
+            try:
+                result = endpoint(*args, **kwargs)
+                return result
+            finally:
+                finish(trace, start, result)
+    return wrapper
+
+
+class TracedRoute(APIRoute):
+    """APIRoute whose endpoint is timed as the `handler` stage; the rest up to the headers is `serialize`
+    (or `first_byte` for streamed responses)"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _endpoint_wrapper(endpoint), **kwargs)
+
+
+class MetricsMiddleware:
+    """ASGI middleware that counts and times every HTTP request and, with tracing on, opens its Trace"""
+
+    def __init__(self, app, tracer: Tracer = tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        trace = Trace() if self.tracer.enabled else None
+        token = _current_trace.set(trace) if trace is not None else None
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace is not None:
+                    now = time.perf_counter()
+                    if trace.handler_end is not None:
+                        # Streamed bodies start after their first chunk, so that gap is time to first byte
+                        stage = "first_byte" if trace.streaming else "serialize"
+                        trace.add(stage, (now - trace.handler_end) * 1000)
+                    if self.tracer.headers:
+                        headers = list(message.get("headers", []))
+                        headers.append((b"server-timing", trace.server_timing((now - start) * 1000).encode()))
+                        headers.append((b"x-trace-id", trace.id.encode()))
+                        message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            total_ms = (time.perf_counter() - start) * 1000
+            route = scope.get("route")
+            endpoint = route.path if route is not None else "unmatched"
+            registry.inc("finbot_http_requests_total", endpoint=endpoint, method=scope["method"], status=status)
+            registry.observe("finbot_http_request_duration_ms", total_ms, endpoint=endpoint)
+            if trace is not None:
+                trace.endpoint = endpoint
+                self.tracer.log(trace, status, total_ms)
+                _current_trace.reset(token)
@@ -0,0 +1,289 @@
+"""
+Rendered prompt context, memoized per dataset version
+"""
+import re
+import weakref
+
+import pandas as pd
+
+from aggregates import AggregateStore
+
+
+def format_summary(data_summary: dict) -> str:
+    """Format the summary block of the FinBot prompt"""
+
+    # Include region sales explicitly
+    sales_by_region_text = "\n".join(
+        [f"- {region}: ₹{revenue:,}" for region, revenue in data_summary['sales_by_region'].items()]
+    )
+
+    summary_text = f"""
+            Total Revenue: ₹{data_summary['total_revenue']:,}
+            Total Sales: {data_summary['total_sales']}
+            Average Revenue per Sale: ₹{data_summary['average_revenue']:,.2f}
+            Top Product: {data_summary['top_product']} (₹{data_summary['top_product_revenue']:,})
+            Sales by Region:
+            {sales_by_region_text}
+        """
+
+    percentiles = data_summary.get('revenue_percentiles')
+    if percentiles:
+        summary_text += (f"    Revenue per Sale: median ₹{percentiles['p50']:,.0f}, "
+                         f"p90 ₹{percentiles['p90']:,.0f}, p99 ₹{percentiles['p99']:,.0f}\n        ")
+
+    # Period-over-period figures from the rollups, when the data is dated
+    trend = data_summary.get('trend')
+    if trend:
+        summary_text += f"    Date Range: {trend['start']} to {trend['end']}\n"
+        for label, change in (("Latest Month", trend['month']), ("Latest Quarter", trend['quarter'])):
+            if change is None:
+                continue
+            summary_text += f"            {label} ({change['period']}): ₹{change['revenue']:,.0f}"
+            if change['change_pct'] is not None:
+                summary_text += f", {change['change_pct']:+.1f}% vs {change['previous_period']}"
+            summary_text += "\n"
+    return summary_text
+
+
+class ContextRenderer:
+    """Renders the summary and detailed breakdown blocks once per dataset version.
+
+    Breakdowns are memoized per AggregateStore for as long as it is alive, so requests
+    alternating between tenants' datasets reuse each one's text; a bare DataFrame is remembered
+    only until the next one. An update to a store (which bumps its version) invalidates its
+    memoized text; a new summary dict replaces the summary.
+    """
+
+    def __init__(self):
+        self._summary_source = None
+        self._summary_text = ""
+        self._breakdowns = weakref.WeakKeyDictionary()  # aggregates -> (version, text, tokens)
+        self._frame_memo = None
+        self.hits = 0
+        self.misses = 0
+
+    def summary(self, data_summary: dict) -> str:
+        if data_summary is not self._summary_source:
+            self._summary_text = format_summary(data_summary)
+            self._summary_source = data_summary
+            self.misses += 1
+        else:
+            self.hits += 1
+        return self._summary_text
+
+    def breakdown(self, sales_df: pd.DataFrame = None, aggregates: AggregateStore = None) -> tuple:
+        """(text, estimated tokens) of the detailed breakdown; ("", 0) without data"""
+        if aggregates is None:
+            return self._frame_breakdown(sales_df)
+
+        memo = self._breakdowns.get(aggregates)
+        if memo is not None and memo[0] == aggregates.version:
+            self.hits += 1
+            return memo[1], memo[2]
+
+        text = aggregates.detailed_breakdown()
+        tokens = estimate_tokens(text)
+        self._breakdowns[aggregates] = (aggregates.version, text, tokens)
+        self.misses += 1
+        return text, tokens
+
+    def _frame_breakdown(self, sales_df: pd.DataFrame) -> tuple:
+        """Breakdown of a bare DataFrame (unhashable, so not a memo key): remembered for the last frame only"""
+        if sales_df is None:
+            return "", 0
+        if self._frame_memo is not None and self._frame_memo[0] is sales_df:
+            self.hits += 1
+            return self._frame_memo[1], self._frame_memo[2]
+
+        text = AggregateStore.from_frame(sales_df).detailed_breakdown()
+        tokens = estimate_tokens(text)
+        self._frame_memo = (sales_df, text, tokens)
+        self.misses += 1
+        return text, tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count: words, numbers and punctuation marks each count as one"""
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def singular(word: str) -> str:
+    """Crude singular form, applied to names and questions alike so 'laptops' matches 'Laptop'"""
+    if len(word) > 3 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith(("ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if len(word) > 2 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def entity_key(phrase: str) -> str:
+    """Lowercase, singular form of a product or region name, used to match names in questions"""
+    return " ".join(singular(word) for word in phrase.lower().split())
+
+
+_ASCENDING_WORDS = {"lowest", "worst", "least", "bottom", "weakest", "smallest", "underperforming"}
+
+
+class ContextSelector:
+    """Builds a question-aware breakdown that fits a token budget.
+
+    Lines are added in priority order until the budget is spent: entities named in the
+    question (with their cross-dimension split), then the top products/regions by revenue,
+    with the dimension the question is about ranked first.
+    """
+
+    def __init__(self, token_budget: int = 2000, top_k: int = 10, entity_detail: int = 5):
+        self.token_budget = token_budget
+        self.top_k = top_k
+        self.entity_detail = entity_detail
+        # Per AggregateStore, while it is alive: (version, names, longest name in words) and (version, text)
+        self._indexes = weakref.WeakKeyDictionary()
+        self._overviews = weakref.WeakKeyDictionary()
+
+    def _entity_index(self, aggregates: AggregateStore) -> tuple:
+        """(singular lowercase name (see entity_key) -> (dimension, key), longest name in words), once per version"""
+        memo = self._indexes.get(aggregates)
+        if memo is None or memo[0] != aggregates.version:
+            names = {}
+            for key in aggregates.by_region.index:
+                names[entity_key(str(key))] = ('region', key)
+            for key in aggregates.by_product.index:
+                names[entity_key(str(key))] = ('product', key)
+            memo = (aggregates.version, names, max((len(name.split()) for name in names), default=1))
+            self._indexes[aggregates] = memo
+        return memo[1], memo[2]
+
+    def find_entities(self, question: str, aggregates: AggregateStore) -> list:
+        """Products and regions named in the question, matched on whole words in singular or plural"""
+        names, max_words = self._entity_index(aggregates)
+        words = [singular(word) for word in re.findall(r"[\w-]+", question.lower())]
+        found = []
+        for size in range(min(max_words, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                entity = names.get(" ".join(words[start:start + size]))
+                if entity is not None and entity not in found:
+                    found.append(entity)
+        return found
+
+    @staticmethod
+    def _line(key, row, with_quantity: bool) -> str:
+        line = (f"- {key}: {int(row['sales_count'])} sales, Total Revenue ₹{row['revenue_sum']:,.0f}, "
+                f"Avg Revenue/Sale ₹{row['revenue_sum'] / row['sales_count']:,.2f}")
+        if with_quantity:
+            line += f", Total Quantity {int(row['quantity_sum'])}"
+        return line
+
+    def overview(self, aggregates: AggregateStore) -> str:
+        """The question-independent selection (top performers by revenue), rendered once per dataset version.
+
+        Session prompts put it in their fixed prefix, so the prefix stays identical across turns.
+        """
+        memo = self._overviews.get(aggregates)
+        if memo is None or memo[0] != aggregates.version:
+            memo = (aggregates.version, self.select("", aggregates))
+            self._overviews[aggregates] = memo
+        return memo[1]
+
+    def mentioned(self, question: str, aggregates: AggregateStore, token_budget: int = 400) -> str:
+        """Lines for the products and regions named in `question`, with their split, within `token_budget`"""
+        tables = {'product': aggregates.by_product, 'region': aggregates.by_region}
+        lines, used = [], 0
+        for dimension, key in self.find_entities(question, aggregates):
+            other = 'region' if dimension == 'product' else 'product'
+            split = aggregates.cube.xs(key, level=dimension)['revenue_sum'].nlargest(self.entity_detail)
+            entity = [self._line(key, tables[dimension].loc[key], dimension == 'product')]
+            entity += [f"  - {other} {other_key}: ₹{revenue:,.0f}" for other_key, revenue in split.items()]
+            cost = sum(estimate_tokens(line) for line in entity)
+            if used + cost > token_budget:
+                break
+            lines += entity
+            used += cost
+        return "\n".join(lines)
+
+    def select(self, question: str, aggregates: AggregateStore) -> str:
+        """Render the breakdown for `question` within the token budget"""
+        lowered = question.lower()
+        ascending = any(word in _ASCENDING_WORDS for word in re.findall(r"\w+", lowered))
+        entities = self.find_entities(question, aggregates)
+
+        tables = {'product': aggregates.by_product, 'region': aggregates.by_region}
+        focus = 'region' if 'region' in lowered and 'product' not in lowered else 'product'
+        if not ('region' in lowered or 'product' in lowered) and entities:
+            focus = entities[0][0]
+        order = [focus, 'region' if focus == 'product' else 'product']
+
+        # Always-present header: catalog size and top performers
+        product_revenue = aggregates.by_product['revenue_sum']
+        region_revenue = aggregates.by_region['revenue_sum']
+        header = (
+            f"\nTOP PERFORMERS:\n"
+            f"- Best Product: {product_revenue.idxmax()} (₹{product_revenue.max():,.0f})\n"
+            f"- Best Region: {region_revenue.idxmax()} (₹{region_revenue.max():,.0f})\n"
+            f"- Catalog: {len(product_revenue)} products, {len(region_revenue)} regions\n"
+        )
+        used = estimate_tokens(header) + 30  # reserve room for section titles
+        sections = {'focus': [], 'product': [], 'region': []}
+        included = set()
+
+        def add(section, line, key=None):
+            nonlocal used
+            cost = estimate_tokens(line)
+            if used + cost > self.token_budget:
+                return False
+            sections[section].append(line)
+            used += cost
+            if key is not None:
+                included.add(key)
+            return True
+
+        # 1. Entities named in the question, with their split across the other dimension
+        for dimension, key in entities:
+            if not add('focus', self._line(key, tables[dimension].loc[key], dimension == 'product'), (dimension, key)):
+                break
+            other = 'region' if dimension == 'product' else 'product'
+            split = aggregates.cube.xs(key, level=dimension)['revenue_sum']
+            split = split.nsmallest(self.entity_detail) if ascending else split.nlargest(self.entity_detail)
+            for other_key, revenue in split.items():
+                if not add('focus', f"  - {other} {other_key}: ₹{revenue:,.0f}"):
+                    break
+
+        # 2. Top-K of each dimension by revenue, focused dimension first, then the remainder
+        def ranked(dimension, start, stop):
+            revenue = tables[dimension]['revenue_sum']
+            picked = revenue.nsmallest(stop) if ascending else revenue.nlargest(stop)
+            return picked.index[start:stop]
+
+        full = False
+        for start, stop in ((0, self.top_k), (self.top_k, None)):
+            for dimension in order:
+                table = tables[dimension]
+                keys = ranked(dimension, start, stop if stop is not None else len(table))
+                for key in keys:
+                    if (dimension, key) in included:
+                        continue
+                    if not add(dimension, self._line(key, table.loc[key], dimension == 'product'), (dimension, key)):
+                        full = True
+                        break
+                if full:
+                    break
+            if full:
+                break
+
+        rank = "bottom" if ascending else "top"
+        text = ""
+        if sections['focus']:
+            text += "MENTIONED IN QUESTION:\n" + "\n".join(sections['focus']) + "\n\n"
+        for dimension, title in (('product', "PRODUCT ANALYSIS"), ('region', "REGION ANALYSIS")):
+            if sections[dimension]:
+                text += (f"{title} ({rank} {len(sections[dimension])} of {len(tables[dimension])} by revenue):\n"
+                         + "\n".join(sections[dimension]) + "\n\n")
+        # Recent monthly trend, only if it still fits
+        trend = aggregates.trend_breakdown(months=6)
+        if trend and used + estimate_tokens(trend) <= self.token_budget:
+            header += trend
+        return text.rstrip("\n") + "\n" + header
@@ -0,0 +1,629 @@
+"""
+Structured query plans for ad-hoc analytical questions: filter, group-by, aggregate, sort, limit.
+
+Plans come from a rule-based parser or the LLM, are validated against a fixed schema and run
+as vectorized pandas/NumPy operations on sales_df. Nothing in a plan is ever evaluated as code.
+"""
+import calendar
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from aggregates import AggregateStore
+from answer_cache import normalize_question
+from prompt_context import ContextSelector, singular
+
+# Column -> kind; the only columns a plan may reference
+COLUMNS = {
+    "product": "category",
+    "region": "category",
+    "revenue": "number",
+    "quantity": "number",
+    "sale_id": "number",
+    "date": "date",
+}
+DIMENSIONS = ("product", "region")
+METRICS = ("revenue", "quantity")
+AGGREGATES = ("sum", "mean", "median", "min", "max", "count")
+FILTER_OPS = {
+    "category": ("eq", "ne", "in", "not_in"),
+    "number": ("eq", "ne", "gt", "gte", "lt", "lte", "between"),
+    "date": ("gte", "lt", "between"),
+}
+MAX_LIMIT = 1000
+DEFAULT_GROUP_LIMIT = 50
+
+
+class PlanError(ValueError):
+    """Raised when a plan does not fit the schema"""
+
+
+class QueryPlan:
+    """A validated plan. Build with `QueryPlan.from_dict`, which rejects anything outside the schema"""
+
+    def __init__(self, filters: list, group_by: list, metric: Optional[str], aggregate: str,
+                 sort: Optional[str], limit: Optional[int]):
+        self.filters = filters
+        self.group_by = group_by
+        self.metric = metric
+        self.aggregate = aggregate
+        self.sort = sort
+        self.limit = limit
+
+    @classmethod
+    def from_dict(cls, raw: dict) -> "QueryPlan":
+        if not isinstance(raw, dict):
+            raise PlanError("plan must be an object")
+        unknown = set(raw) - {"filters", "group_by", "metric", "aggregate", "sort", "limit"}
+        if unknown:
+            raise PlanError(f"unknown plan fields: {', '.join(sorted(unknown))}")
+
+        aggregate = raw.get("aggregate", "sum")
+        if aggregate not in AGGREGATES:
+            raise PlanError(f"aggregate must be one of {', '.join(AGGREGATES)}")
+        metric = raw.get("metric", "revenue")
+        if aggregate == "count":
+            metric = None
+        elif metric not in METRICS:
+            raise PlanError(f"metric must be one of {', '.join(METRICS)}")
+
+        group_by = raw.get("group_by") or []
+        if isinstance(group_by, str):
+            group_by = [group_by]
+        if not isinstance(group_by, list) or len(group_by) > len(DIMENSIONS) \
+                or any(column not in DIMENSIONS for column in group_by) or len(set(group_by)) != len(group_by):
+            raise PlanError(f"group_by must list distinct columns from {', '.join(DIMENSIONS)}")
+
+        sort = raw.get("sort")
+        if sort not in (None, "asc", "desc"):
+            raise PlanError("sort must be asc, desc or null")
+        limit = raw.get("limit")
+        if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= MAX_LIMIT):
+            raise PlanError(f"limit must be an integer from 1 to {MAX_LIMIT}")
+
+        filters = raw.get("filters") or []
+        if not isinstance(filters, list):
+            raise PlanError("filters must be a list")
+        return cls([_validate_filter(f) for f in filters], group_by, metric, aggregate, sort, limit)
+
+    def to_dict(self) -> dict:
+        return {
+            "filters": self.filters,
+            "group_by": self.group_by,
+            "metric": self.metric,
+            "aggregate": self.aggregate,
+            "sort": self.sort,
+            "limit": self.limit
+        }
+
+    @property
+    def columns(self) -> set:
+        """Columns the plan reads"""
+        return ({f["column"] for f in self.filters} | set(self.group_by)
+                | ({self.metric} if self.metric else set()))
+
+    @property
+    def key(self) -> str:
+        """Canonical JSON, used as the result cache key"""
+        return json.dumps(self.to_dict(), sort_keys=True, default=str)
+
+    def describe(self) -> str:
+        """The plan in words, e.g. 'mean revenue where product = Laptop and region = West'"""
+        text = "number of sales" if self.aggregate == "count" else f"{self.aggregate} {self.metric}"
+        if self.group_by:
+            text += " by " + " and ".join(self.group_by)
+        if self.filters:
+            text += " where " + " and ".join(_describe_filter(f) for f in self.filters)
+        if self.sort:
+            text += f", {'highest' if self.sort == 'desc' else 'lowest'} first"
+        if self.limit:
+            text += f", top {self.limit}" if self.sort != "asc" else f", bottom {self.limit}"
+        return text
+
+
+def _validate_filter(raw) -> dict:
+    if not isinstance(raw, dict) or set(raw) != {"column", "op", "value"}:
+        raise PlanError("each filter needs exactly column, op and value")
+    column, op, value = raw["column"], raw["op"], raw["value"]
+    kind = COLUMNS.get(column)
+    if kind is None:
+        raise PlanError(f"unknown column '{column}'")
+    if op not in FILTER_OPS[kind]:
+        raise PlanError(f"op '{op}' is not allowed on {column}")
+
+    def scalar(item):
+        if kind == "category":
+            if not isinstance(item, str):
+                raise PlanError(f"{column} values must be strings")
+            return item
+        if kind == "number":
+            if isinstance(item, bool) or not isinstance(item, (int, float)):
+                raise PlanError(f"{column} values must be numbers")
+            return item
+        try:
+            return pd.Timestamp(item).isoformat()
+        except (TypeError, ValueError):
+            raise PlanError(f"{column} values must be ISO dates")
+
+    if op in ("in", "not_in", "between"):
+        if not isinstance(value, list) or not value or (op == "between" and len(value) != 2):
+            raise PlanError(f"'{op}' needs a list of values" if op != "between" else "'between' needs [low, high]")
+        value = [scalar(item) for item in value]
+    else:
+        value = scalar(value)
+    return {"column": column, "op": op, "value": value}
+
+
+def _describe_filter(f: dict) -> str:
+    symbols = {"eq": "=", "ne": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+    value = f["value"]
+    if f["column"] == "date":
+        value = [v[:10] for v in value] if isinstance(value, list) else value[:10]
+    if f["op"] == "between":
+        return f"{f['column']} between {value[0]} and {value[1]}"
+    if f["op"] in ("in", "not_in"):
+        return f"{f['column']} {'in' if f['op'] == 'in' else 'not in'} {', '.join(map(str, value))}"
+    if isinstance(value, (int, float)):
+        value = f"{value:,g}"
+    return f"{f['column']} {symbols[f['op']]} {value}"
+
+
+# Execution
+
+def _category_values(series: pd.Series, values: list) -> list:
+    """Map plan values onto the column's categories case-insensitively; unknown names match nothing"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        known = {str(c).lower(): c for c in series.cat.categories}
+        return [known[v.lower()] for v in values if v.lower() in known]
+    return values
+
+
+def _mask(df: pd.DataFrame, f: dict) -> np.ndarray:
+    column, op, value = f["column"], f["op"], f["value"]
+    if column not in df.columns:
+        raise PlanError(f"the dataset has no '{column}' column")
+    series = df[column]
+
+    if COLUMNS[column] == "category":
+        values = _category_values(series, value if isinstance(value, list) else [value])
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Compare the integer codes instead of the labels
+            codes = series.cat.codes.to_numpy()
+            wanted = series.cat.categories.get_indexer(values)
+            matched = codes == wanted[0] if len(wanted) == 1 else np.isin(codes, wanted)
+        else:
+            matched = series.isin(values).to_numpy()
+        return ~matched if op in ("ne", "not_in") else matched
+
+    data = series.to_numpy()
+    if COLUMNS[column] == "date":
+        value = [np.datetime64(pd.Timestamp(v)) for v in value] if isinstance(value, list) else np.datetime64(pd.Timestamp(value))
+    if op == "between":
+        return (data >= value[0]) & (data <= value[1])
+    return {
+        "eq": np.equal, "ne": np.not_equal, "gt": np.greater, "gte": np.greater_equal,
+        "lt": np.less, "lte": np.less_equal
+    }[op](data, value)
+
+
+def execute_plan(plan: QueryPlan, df: pd.DataFrame) -> pd.DataFrame:
+    """Run a plan on the sales rows, returning the group columns plus a `value` column.
+
+    Filters are combined into one boolean mask; ungrouped plans aggregate the masked NumPy
+    array directly, grouped plans run one groupby on the selected rows.
+    """
+    mask = None
+    for f in plan.filters:
+        condition = _mask(df, f)
+        mask = condition if mask is None else mask & condition
+
+    if not plan.group_by:
+        if plan.aggregate == "count":
+            value = int(mask.sum()) if mask is not None else len(df)
+        else:
+            values = df[plan.metric].to_numpy()
+            values = values[mask] if mask is not None else values
+            value = float(getattr(np, plan.aggregate)(values)) if len(values) else None
+        return pd.DataFrame({"value": [value]})
+
+    rows = df.loc[mask, plan.group_by + ([plan.metric] if plan.metric else [])] if mask is not None else df
+    groups = rows.groupby(plan.group_by, observed=True)
+    result = groups.size() if plan.aggregate == "count" else groups[plan.metric].agg(plan.aggregate)
+    result = result.rename("value").reset_index()
+    if plan.sort:
+        result = result.sort_values("value", ascending=plan.sort == "asc", kind="stable")
+    return result.head(plan.limit or DEFAULT_GROUP_LIMIT).reset_index(drop=True)
+
+
+def format_value(plan: QueryPlan, value) -> str:
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return "no matching sales"
+    if plan.aggregate == "count" or plan.metric == "quantity":
+        return f"{value:,.0f}" if float(value).is_integer() else f"{value:,.2f}"
+    return f"₹{value:,.2f}"
+
+
+def _sentence(text: str) -> str:
+    return text[:1].upper() + text[1:]
+
+
+def format_result(plan: QueryPlan, result: pd.DataFrame) -> str:
+    """The computed result as plain text: one line, or one line per group"""
+    if not plan.group_by:
+        return f"{_sentence(plan.describe())}: {format_value(plan, result['value'].iloc[0])}"
+    if result.empty:
+        return f"{_sentence(plan.describe())}: no matching sales"
+    lines = [f"{_sentence(plan.describe())}:"]
+    for rank, row in enumerate(result.itertuples(index=False), start=1):
+        label = " / ".join(str(getattr(row, column)) for column in plan.group_by)
+        lines.append(f"{rank}. {label}: {format_value(plan, row.value)}")
+    return "\n".join(lines)
+
+
+# Rule-based planner
+
+_AGGREGATE_WORDS = [
+    (r"\b(average|avg|mean)\b", "mean"),
+    (r"\bmedian\b", "median"),
+    # "how many units" is a sum of quantity, not a count of sales
+    (r"\b(how many|number of|count of|total) (units|items|pieces)\b", "sum"),
+    (r"\b(how many|number of|count of|count)\b", "count"),
+    (r"\b(largest|biggest|max|maximum) (single )?(sale|order|transaction)s?\b|\b(max|maximum)\b", "max"),
+    (r"\b(smallest|min|minimum) (single )?(sale|order|transaction)s?\b|\b(min|minimum)\b", "min"),
+    (r"\b(total|sum|overall|combined)\b", "sum"),
+]
+_DIMENSION_WORDS = {"product": r"products?|items?", "region": r"regions?|territor(?:y|ies)|areas?"}
+_GROUP_PATTERN = r"\b(by|per|for each|each|across|across all) ({words})\b"
+_WHICH_PATTERN = r"\b(which|what) ({words})\b"
+_TOP_PATTERN = re.compile(r"\b(top|bottom|best|worst) (\d+) (products?|items?|regions?|territor(?:y|ies))\b")
+_ASCENDING = re.compile(r"\b(lowest|least|worst|weakest|smallest|bottom|fewest)\b")
+_METRIC_WORDS = re.compile(r"\b(revenue|sales?|sold|income|earn\w*|orders?|transactions?|units|quantity|quantities)\b")
+_QUANTITY_WORDS = re.compile(r"\b(units|quantity|quantities|items sold|sold)\b")
+_AMOUNT = r"₹?\s?(\d[\d,]*(?:\.\d+)?)(?:\s?(k|lakh|m)\b)?"
+_QUANTITY_UNIT = r"(?:\s(units?|items?|pieces?|qty|quantity)\b)?"
+_NUMERIC_FILTERS = [
+    (re.compile(r"\b(over|above|more than|greater than)\s" + _AMOUNT + _QUANTITY_UNIT), "gt"),
+    (re.compile(r"\b(at least)\s" + _AMOUNT + _QUANTITY_UNIT), "gte"),
+    (re.compile(r"\b(under|below|less than)\s" + _AMOUNT + _QUANTITY_UNIT), "lt"),
+    (re.compile(r"\b(at most)\s" + _AMOUNT + _QUANTITY_UNIT), "lte"),
+]
+_QUANTITY_BEFORE = re.compile(r"\b(quantity|units|qty)\s(of\s)?$")
+# Questions asking for reasons, comparisons or advice need the LLM, not a single computed figure
+_OPEN_QUESTION = re.compile(r"\b(why|compare|comparing|comparison|suggest\w*|should|recommend\w*|explain\w*|advise|advice)\b")
+# Words after "for", "in", "of", ... that name something: they must be a known product or region
+_NAMED = re.compile(r"\b(?:for|in|of|from|about|at)\s(?:the\s|our\s)?([a-z][\w-]*)")
+_SKU = re.compile(r"\b[a-z]+-\d+\b")
+_VOCABULARY = {
+    "a", "an", "the", "it", "them", "that", "this", "these", "those", "which", "what", "who", "any", "all", "each",
+    "every", "our", "total", "average", "overall", "sale", "revenue", "unit", "quantity", "item", "piece", "sold",
+    "product", "region", "territory", "area", "order", "transaction", "value", "price", "income", "earning",
+    "rupee", "year", "month", "quarter", "week", "day", "period", "last", "time", "date", "data", "dataset",
+    "business", "company", "store", "catalog", "number", "count", "term", "general", "more", "less", "most",
+    "at", "least", "over", "above", "under", "below", "greater",
+}
+_MULTIPLIERS = {None: 1, "k": 1_000, "lakh": 100_000, "m": 1_000_000}
+_MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+_MONTH_NAMES = "|".join(sorted(_MONTHS, key=len, reverse=True))
+_PERIOD = re.compile(r"\b(in|during|for) (?:(" + _MONTH_NAMES + r") )?(\d{4})\b"
+                     r"|\b(in|during|for) (" + _MONTH_NAMES + r")\b")
+# "this month", "last quarter": periods of the data, counted back from the latest date with sales
+_RELATIVE_PERIOD = re.compile(r"\b(?:in |during |for |over )?(?:the )?(this|current|last|previous) (week|month|quarter|year)\b")
+_PERIOD_LENGTHS = {"week": pd.DateOffset(weeks=1), "month": pd.DateOffset(months=1),
+                   "quarter": pd.DateOffset(months=3), "year": pd.DateOffset(years=1)}
+# Any time reference left once the period above is taken out: the planner cannot honour it
+_TIME_WORDS = re.compile(r"\b(" + _MONTH_NAMES + r"|(?:19|20)\d{2}|q[1-4]|quarters?|quarterly|weeks?|weekly|days?|daily"
+                         r"|months?|monthly|years?|yearly|annual\w*|today|yesterday|tomorrow|recent\w*|lately"
+                         r"|ytd|mtd|qtd|since|ago|until|till|last|previous|past|next|current|seasons?|seasonal\w*)\b")
+
+
+class RulePlanner:
+    """Turns common analytical phrasings into plans without the LLM.
+
+    A question is planned only when it names an aggregate ("average", "how many", "total"),
+    a grouping ("by region", "which product") or a ranking ("top 3 products") together with
+    something measurable. Open questions ("why did revenue drop?", "where should we focus?") and
+    questions naming something that is not a known product or region return None, so a plan
+    never answers a different question than the one asked.
+    """
+
+    def __init__(self):
+        self.selector = ContextSelector()
+
+    def plan(self, question: str, aggregates: AggregateStore, latest_date=None) -> Optional[QueryPlan]:
+        text = normalize_question(question)
+        if not _METRIC_WORDS.search(text) or is_open_question(text):
+            return None
+
+        aggregate = None
+        for pattern, name in _AGGREGATE_WORDS:
+            if re.search(pattern, text):
+                aggregate = name
+                break
+
+        group_by, sort, limit = [], None, None
+        top = _TOP_PATTERN.search(text)
+        if top:
+            dimension = "region" if top.group(3).startswith(("region", "territor")) else "product"
+            group_by, limit = [dimension], int(top.group(2))
+            sort = "asc" if top.group(1) in ("bottom", "worst") else "desc"
+        for dimension, words in _DIMENSION_WORDS.items():
+            if dimension in group_by:
+                continue
+            if re.search(_GROUP_PATTERN.format(words=words), text):
+                group_by.append(dimension)
+            elif re.search(_WHICH_PATTERN.format(words=words), text):
+                group_by.append(dimension)
+                sort = "asc" if _ASCENDING.search(text) else "desc"
+                limit = 1
+
+        filters = []
+        named = {}
+        entities = self.selector.find_entities(question, aggregates)
+        if _unknown_names(text, entities):
+            return None
+        for dimension, key in entities:
+            named.setdefault(dimension, []).append(str(key))
+        for dimension, keys in named.items():
+            if len(keys) == 1:
+                filters.append({"column": dimension, "op": "eq", "value": keys[0]})
+            else:
+                filters.append({"column": dimension, "op": "in", "value": keys})
+                if dimension not in group_by:
+                    group_by.append(dimension)
+
+        rest = text
+        for pattern, op in _NUMERIC_FILTERS:
+            found = pattern.search(text)
+            if found:
+                amount = float(found.group(2).replace(",", "")) * _MULTIPLIERS[found.group(3)]
+                quantity = found.group(4) or _QUANTITY_BEFORE.search(text[:found.start()])
+                filters.append({"column": "quantity" if quantity else "revenue", "op": op, "value": amount})
+                rest = rest.replace(found.group(0), " ")
+
+        period, rest = _period_filter(rest, latest_date)
+        if _TIME_WORDS.search(rest):
+            # "per month", "since May", "yesterday": answering all time would be a different question
+            return None
+        if period is not None:
+            filters.append(period)
+
+        if aggregate is None and not group_by:
+            return None
+        if aggregate in (None, "sum") and re.search(r"\b(orders?|transactions?)\b", text) \
+                and not re.search(r"\b(revenue|income|earn\w*|units|quantity|value)\b", text):
+            aggregate = "count"
+        aggregate = aggregate or "sum"
+        metric = "quantity" if _QUANTITY_WORDS.search(text) else "revenue"
+        if group_by and sort is None and aggregate != "count":
+            sort = "desc"
+        return QueryPlan.from_dict({
+            "filters": filters,
+            "group_by": group_by,
+            "metric": metric,
+            "aggregate": aggregate,
+            "sort": sort,
+            "limit": limit
+        })
+
+
+def is_open_question(question: str) -> bool:
+    """True for questions asking why, to compare, or for advice"""
+    return bool(_OPEN_QUESTION.search(question.lower()))
+
+
+def _unknown_names(text: str, entities: list) -> bool:
+    """True if the question names something ("for tablets", "SKU-999") that is not a known product or region"""
+    known = {singular(word) for _, key in entities for word in str(key).lower().split()}
+    candidates = _SKU.findall(text) + _NAMED.findall(text)
+    for word in candidates:
+        word = singular(word)
+        if word in known or word in _VOCABULARY or word in _MONTHS or word.isdigit():
+            continue
+        return True
+    return False
+
+
+def _period_filter(text: str, latest_date=None) -> tuple:
+    """(date range filter or None, `text` without the period it covers).
+
+    Understands 'in 2025', 'in March 2025', 'in March' (of the latest year with data) and
+    'this/last week, month, quarter or year', counted back from the latest date with data.
+    """
+    found = _PERIOD.search(text)
+    if found is not None:
+        if found.group(3):
+            year, month = int(found.group(3)), _MONTHS.get(found.group(2)) if found.group(2) else None
+        else:
+            if latest_date is None or pd.isna(latest_date):
+                return None, text
+            month = _MONTHS[found.group(5)]
+            year = latest_date.year if month <= latest_date.month else latest_date.year - 1
+        start = pd.Timestamp(year=year, month=month or 1, day=1)
+        end = start + (pd.DateOffset(months=1) if month else pd.DateOffset(years=1))
+    else:
+        found = _RELATIVE_PERIOD.search(text)
+        if found is None or latest_date is None or pd.isna(latest_date):
+            return None, text
+        latest = pd.Timestamp(latest_date).normalize()
+        unit = found.group(2)
+        start = {"week": latest - pd.Timedelta(days=latest.dayofweek),
+                 "month": latest.replace(day=1),
+                 "quarter": latest.replace(month=3 * ((latest.month - 1) // 3) + 1, day=1),
+                 "year": latest.replace(month=1, day=1)}[unit]
+        if found.group(1) in ("last", "previous"):
+            start -= _PERIOD_LENGTHS[unit]
+        end = start + _PERIOD_LENGTHS[unit]
+    period = {"column": "date", "op": "between", "value": [start.isoformat(), (end - pd.Timedelta(1, "ns")).isoformat()]}
+    return period, text[:found.start()] + " " + text[found.end():]
+
+
+# LLM planning
+
+PLAN_SCHEMA = """Columns: product (text), region (text), revenue (number, ₹ per sale), quantity (number, units per sale), sale_id (number), date (ISO date).
+Plan fields:
+- filters: list of {{"column", "op", "value"}}; ops: text eq|ne|in|not_in, number eq|ne|gt|gte|lt|lte|between, date gte|lt|between ("in", "not_in" and "between" take a list)
+- group_by: list drawn from product, region
+- metric: revenue or quantity
+- aggregate: sum|mean|median|min|max|count
+- sort: asc|desc|null (orders groups by the aggregated value)
+- limit: integer from 1 to {max_limit} or null
+Known products: {products}
+Known regions: {regions}"""
+
+
+def parse_plan_json(text: str) -> Optional[QueryPlan]:
+    """Parse the LLM's reply into a validated plan; None when it declined ({"plan": null})"""
+    found = re.search(r"\{.*\}", text, re.DOTALL)
+    if found is None:
+        raise PlanError("no JSON object in the planner reply")
+    try:
+        raw = json.loads(found.group(0))
+    except json.JSONDecodeError as e:
+        raise PlanError(f"invalid plan JSON: {e}")
+    if isinstance(raw, dict) and "plan" in raw:
+        raw = raw["plan"]
+    return None if raw is None else QueryPlan.from_dict(raw)
+
+
+class _LRU:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_MISSING = object()
+
+
+class QueryEngine:
+    """Plans, caches and executes analytical questions against a snapshot.
+
+    Plans are cached per normalized question, set of known products/regions and latest sale
+    date, so appends that only add rows usually keep them; results are cached per dataset fingerprint and plan.
+    With `planner="hybrid"`, questions the rules cannot plan are sent to the LLM planner.
+    """
+
+    def __init__(self, planner: str = "rules", max_plans: int = 4096, max_results: int = 1024):
+        if planner not in ("rules", "hybrid"):
+            raise ValueError("query_engine_planner must be 'rules' or 'hybrid'")
+        self.planner = planner
+        self.rules = RulePlanner()
+        self.plans = _LRU(max_plans)
+        self.results = _LRU(max_results)
+        self.llm_plans = 0
+        self.plan_errors = 0
+        self._dataset_source = None
+        self._dataset_version = None
+        self._dataset = None
+
+    def _dataset_key(self, aggregates: AggregateStore) -> tuple:
+        """(hash of known products/regions, latest sale date), computed once per AggregateStore version"""
+        if aggregates is not self._dataset_source or aggregates.version != self._dataset_version:
+            entities = hash((tuple(map(str, aggregates.by_product.index)), tuple(map(str, aggregates.by_region.index))))
+            rollups = aggregates.rollups
+            latest_date = None if rollups is None or rollups.empty else rollups.latest_period('day')
+            self._dataset = (entities, latest_date)
+            self._dataset_source = aggregates
+            self._dataset_version = aggregates.version
+        return self._dataset
+
+    @staticmethod
+    def _runnable(plan: Optional[QueryPlan], snapshot) -> Optional[QueryPlan]:
+        """The plan, or None when it reads a column the dataset lacks (e.g. a date filter on undated rows)"""
+        if plan is None or not plan.columns - set(snapshot.columns):
+            return plan
+        return None
+
+    def plan(self, question: str, snapshot) -> Optional[QueryPlan]:
+        """Rule-based plan for the question, from the plan cache when possible"""
+        dataset_key = self._dataset_key(snapshot.aggregates)
+        latest_date = dataset_key[1]
+        key = (dataset_key, normalize_question(question))
+        plan = self.plans.get(key, _MISSING)
+        if plan is _MISSING:
+            plan = self.rules.plan(question, snapshot.aggregates, latest_date)
+            self.plans.set(key, plan)
+        return self._runnable(plan, snapshot)
+
+    async def aplan(self, question: str, snapshot, finbot=None) -> Optional[QueryPlan]:
+        """Plan with the rules, then, in hybrid mode, with the LLM; invalid LLM plans count as no plan"""
+        plan = self.plan(question, snapshot)
+        if plan is not None or self.planner != "hybrid" or finbot is None or is_open_question(question):
+            return plan
+
+        key = ("llm", self._dataset_key(snapshot.aggregates), normalize_question(question))
+        plan = self.plans.get(key, _MISSING)
+        if plan is _MISSING:
+            aggregates = snapshot.aggregates
+            schema = PLAN_SCHEMA.format(
+                max_limit=MAX_LIMIT,
+                products=", ".join(map(str, aggregates.by_product.index[:200])),
+                regions=", ".join(map(str, aggregates.by_region.index[:200]))
+            )
+            self.llm_plans += 1
+            try:
+                plan = parse_plan_json(await finbot.aplan_query(question, schema))
+            except PlanError:
+                self.plan_errors += 1
+                plan = None
+            self.plans.set(key, plan)
+        return self._runnable(plan, snapshot)
+
+    def execute(self, plan: QueryPlan, snapshot) -> pd.DataFrame:
+        key = (snapshot.fingerprint, plan.key)
+        result = self.results.get(key)
+        if result is None:
+            result = execute_plan(plan, snapshot.sales_df)
+            self.results.set(key, result)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "planner": self.planner,
+            "plans_cached": len(self.plans),
+            "plan_cache_hits": self.plans.hits,
+            "plan_cache_misses": self.plans.misses,
+            "llm_plans": self.llm_plans,
+            "plan_errors": self.plan_errors,
+            "results_cached": len(self.results),
+            "result_cache_hits": self.results.hits,
+            "result_cache_misses": self.results.misses
+        }
+
+
+def build_query_engine(config: dict) -> Optional[QueryEngine]:
+    """Create the query engine described by config.json, or None when it is disabled"""
+    if not config.get("query_engine_enabled", True):
+        return None
+    return QueryEngine(
+        planner=config.get("query_engine_planner", "rules"),
+        max_plans=config.get("query_engine_max_plans", 4096),
+        max_results=config.get("query_engine_max_results", 1024)
+    )
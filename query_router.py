@@ -0,0 +1,298 @@
+"""
+Query router: answer questions from computed handlers first, fall back to the LLM
+"""
+import re
+import time
+from typing import Callable, Optional
+
+from agent import FinBot
+from answer_cache import normalize_question
+from metrics import tracer
+
+
+class QueryRouter:
+    """Registry of computed answer handlers plus intent rules that map free text onto them"""
+
+    def __init__(self):
+        self.handlers = {}
+        self.intents = []
+        self.latency = {}
+
+    def handler(self, name: str, *patterns: str) -> Callable:
+        """Register a handler under `name`, matched from free text by any of `patterns`.
+
+        Patterns are full-match regexes against the normalized question; named groups are
+        passed to the handler as keyword arguments.
+        """
+        def register(fn):
+            self.handlers[name] = fn
+            for pattern in patterns:
+                self.intents.append((re.compile(pattern), name))
+            return fn
+        return register
+
+    def match(self, question: str):
+        """Yield (handler name, params) for every intent rule that matches the question, in order"""
+        normalized = normalize_question(question)
+        for pattern, name in self.intents:
+            found = pattern.fullmatch(normalized)
+            if found:
+                yield name, {k: v for k, v in found.groupdict().items() if v is not None}
+
+    def _call(self, name: str, context: dict, **params) -> Optional[str]:
+        handler = self.handlers.get(name)
+        if handler is None:
+            return None
+        return handler(context, **params)
+
+    def run(self, name: str, context: dict, **params) -> Optional[str]:
+        """Run a registered handler; None means it cannot answer and the LLM should"""
+        with tracer.stage("router"):
+            return self._call(name, context, **params)
+
+    def answer(self, question: str, context: dict) -> Optional[tuple]:
+        """Try the computed path for a free-text question, returning (handler name, answer)"""
+        with tracer.stage("router"):
+            for name, params in self.match(question):
+                answer = self._call(name, context, **params)
+                if answer is not None:
+                    return name, answer
+            return None
+
+    def record(self, path: str, elapsed_ms: float) -> None:
+        """Record the latency of a request served by the `computed` or `llm` path"""
+        stats = self.latency.setdefault(path, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def stats(self) -> dict:
+        return {
+            path: {
+                "count": s["count"],
+                "avg_ms": round(s["total_ms"] / s["count"], 3),
+                "max_ms": round(s["max_ms"], 3)
+            }
+            for path, s in self.latency.items()
+        }
+
+
+def timed_ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
+
+
+def _lookup(table, name: str) -> Optional[str]:
+    """Case-insensitive match of a product/region name against an aggregate index"""
+    wanted = name.strip().lower()
+    for key in table.index:
+        if str(key).lower() == wanted:
+            return key
+    return None
+
+
+router = QueryRouter()
+
+
+# Predefined quick queries
+
+@router.handler("total_revenue", r"(what is |what's )?(the |our )?total revenue")
+def total_revenue(context):
+    return FinBot.get_predefined_response("total_revenue", context["data_summary"], aggregates=context["aggregates"])
+
+
+@router.handler(
+    "top_product",
+    r"(which|what) product (has|generates|makes|earns) the (highest|most) revenue",
+    r"(what is |what's )?(the |our )?(top|best) (selling )?product( by revenue)?",
+)
+def top_product(context):
+    return FinBot.get_predefined_response("top_product", context["data_summary"], aggregates=context["aggregates"])
+
+
+@router.handler(
+    "average_revenue",
+    r"(what is |what's )?(the |our )?(average|avg|mean) revenue( per sale)?",
+)
+def average_revenue(context):
+    aggregates = context["aggregates"]
+    # The exact median needs the rows; only take them when there is no sketch to read it from
+    grouped = context["grouped"] if aggregates.sketches is None else None
+    return FinBot.get_predefined_response("average_revenue", context["data_summary"], grouped=grouped,
+                                          aggregates=aggregates)
+
+
+@router.handler(
+    "sales_by_region",
+    r"(show me )?(the )?(sales|revenue) (breakdown )?by region",
+    r"(show me )?(the )?region(al)? (sales )?breakdown",
+)
+def sales_by_region(context):
+    return FinBot.get_predefined_response("sales_by_region", context["data_summary"], aggregates=context["aggregates"])
+
+
+@router.handler(
+    "total_sales",
+    r"how many (total )?sales (do we have|are there|have we made)",
+    r"(what is |what's )?(the )?total (number of )?sales( count)?",
+)
+def total_sales(context):
+    return FinBot.get_predefined_response("total_sales", context["data_summary"], aggregates=context["aggregates"])
+
+
+@router.handler(
+    "sales_by_product",
+    r"(show me )?(the )?(sales|revenue) (breakdown )?by product",
+    r"(show me )?(the )?product (sales )?breakdown",
+)
+def sales_by_product(context):
+    return FinBot.get_predefined_response("sales_by_product", context["data_summary"], aggregates=context["aggregates"])
+
+
+@router.handler(
+    "sales_by_product_region",
+    r"(show me )?(the )?(sales|revenue) (breakdown )?by product and region",
+    r"(show me )?(the )?(sales|revenue) (breakdown )?by region and product",
+)
+def sales_by_product_region(context):
+    return FinBot.get_predefined_response("sales_by_product_region", context["data_summary"], aggregates=context["aggregates"])
+
+
+@router.handler(
+    "overview",
+    r"(give me |show me )?(an |a |the )?(sales )?(overview|summary)( of (the |our )?sales( data)?)?",
+)
+def overview(context):
+    """Headline numbers; also the degraded answer while the LLM is unavailable"""
+    return "\n\n".join(
+        FinBot.get_predefined_response(query_type, context["data_summary"], aggregates=context["aggregates"])
+        for query_type in ("total_revenue", "top_product", "sales_by_region")
+    )
+
+
+# Entity lookups
+
+@router.handler(
+    "region",
+    r"how is (our |the )?(?P<region>[a-z ]+?) region (performing|doing)",
+    r"(what are |show me )?(the )?(sales|revenue) (in|for) (the )?(?P<region>[a-z ]+?)( region)?",
+)
+def region_performance(context, region: str):
+    aggregates = context["aggregates"]
+    key = _lookup(aggregates.by_region, region)
+    if key is None:
+        return None
+    row = aggregates.by_region.loc[key]
+    share = row['revenue_sum'] / aggregates.total_revenue * 100
+    products = aggregates.cube.xs(key, level='region')['revenue_sum'].sort_values(ascending=False)
+    return (
+        f"The **{key}** region generated ₹{row['revenue_sum']:,.0f} from {int(row['sales_count'])} sales "
+        f"(avg ₹{row['revenue_sum'] / row['sales_count']:,.2f}/sale), {share:.1f}% of total revenue. "
+        f"Its top product is {products.index[0]} (₹{products.iloc[0]:,.0f})."
+    )
+
+
+@router.handler(
+    "product",
+    r"how (is|are) (the |our )?(?P<product>[a-z ]+?) (performing|doing|selling)",
+    r"(what are |show me )?(the )?(sales|revenue) (of|for) (the )?(?P<product>[a-z ]+?)",
+)
+def product_performance(context, product: str):
+    aggregates = context["aggregates"]
+    key = _lookup(aggregates.by_product, product)
+    if key is None:
+        return None
+    row = aggregates.by_product.loc[key]
+    share = row['revenue_sum'] / aggregates.total_revenue * 100
+    regions = aggregates.cube.xs(key, level='product')['revenue_sum'].sort_values(ascending=False)
+    return (
+        f"**{key}** generated ₹{row['revenue_sum']:,.0f} from {int(row['sales_count'])} sales "
+        f"({int(row['quantity_sum'])} units, avg ₹{row['revenue_sum'] / row['sales_count']:,.2f}/sale), "
+        f"{share:.1f}% of total revenue. Its strongest region is {regions.index[0]} (₹{regions.iloc[0]:,.0f})."
+    )
+
+
+@router.handler(
+    "top_n",
+    r"(show me |what are |list )?(the |our )?top (?P<n>\d+) (?P<dimension>products|regions)( by revenue)?",
+)
+def top_n(context, n: str = "5", dimension: str = "products"):
+    aggregates = context["aggregates"]
+    table = aggregates.by_region if dimension.startswith("region") else aggregates.by_product
+    top = table['revenue_sum'].sort_values(ascending=False).head(max(int(n), 1))
+    response = f"**Top {len(top)} {dimension} by revenue:**\n\n"
+    for rank, (key, revenue) in enumerate(top.items(), start=1):
+        response += f"{rank}. **{key}**: ₹{revenue:,.0f} ({int(table.loc[key, 'sales_count'])} sales)\n"
+    return response
+
+
+# Percentiles, served from the revenue quantile sketches
+
+def _percentile(stat: str) -> float:
+    """Quantile named by the question: 0.5 for median, 0.9 for p90 or 90th percentile"""
+    return 0.5 if stat == "median" else int(re.match(r"p?(\d+)", stat).group(1)) / 100
+
+
+@router.handler(
+    "percentile",
+    r"(what is |what's )?(the |our )?(?P<stat>median|p\d{1,2}|\d{1,2}(st|nd|rd|th) percentile( of)?) (sale |order )?revenue"
+    r"( per sale)?( (for|in|of) (the )?(?P<entity>[a-z0-9 -]+?)( region)?)?",
+)
+def revenue_percentile(context, stat: str, entity: str = None):
+    sketches = context["aggregates"].sketches
+    if sketches is None:
+        return None
+    product = region = None
+    if entity:
+        region = _lookup(context["aggregates"].by_region, entity)
+        product = _lookup(context["aggregates"].by_product, entity) if region is None else None
+        if region is None and product is None:
+            return None
+    q = _percentile(stat.split()[0])
+    value, p50, p90, p99 = sketches.quantiles([q, 0.5, 0.9, 0.99], product=product, region=region)
+    name = stat.replace(" of", "")
+    scope = f" for **{product or region}**" if entity else ""
+    return (
+        f"The {name} revenue per sale{scope} is about ₹{value:,.0f}. "
+        f"For reference: median ₹{p50:,.0f}, p90 ₹{p90:,.0f}, p99 ₹{p99:,.0f}."
+    )
+
+
+# Trends, served from the day/week/month rollups
+
+_OVERALL = {"sales", "revenue", "we", "the business", "business", "overall sales", "total sales", "total revenue"}
+
+
+@router.handler(
+    "trend",
+    r"how did (the |our )?(?P<entity>[a-z ]+?)( region)? (do|perform|sell|go) (?P<which>last|this) (?P<grain>day|week|month|quarter)",
+    r"(what (was|were|is|are) )?(the |our )?(?P<entity>[a-z ]+? )?(revenue|sales) (?P<which>last|this) (?P<grain>day|week|month|quarter)",
+)
+def period_trend(context, grain: str, which: str = "last", entity: str = None):
+    aggregates = context["aggregates"]
+    if aggregates.rollups is None or aggregates.rollups.empty:
+        return None
+
+    product = region = None
+    name = "Overall"
+    entity = (entity or "").strip()
+    if entity and entity not in _OVERALL:
+        region = _lookup(aggregates.by_region, entity)
+        product = _lookup(aggregates.by_product, entity) if region is None else None
+        if region is None and product is None:
+            return None
+        name = region or product
+
+    change = aggregates.rollups.period_over_period(
+        grain, product=product, region=region, periods_back=1 if which == "last" else 0
+    )
+    if change is None:
+        return None
+
+    response = f"**{name}** revenue in {change['period']}: ₹{change['revenue']:,.0f} from {change['sales']} sales"
+    if change['previous_period'] is None:
+        return response + "."
+    response += f", compared with ₹{change['previous_revenue']:,.0f} in {change['previous_period']}"
+    if change['change_pct'] is not None:
+        direction = "up" if change['change_pct'] >= 0 else "down"
+        response += f" ({direction} {abs(change['change_pct']):.1f}%)"
+    return response + "."
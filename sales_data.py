@@ -1,5 +1,10 @@
+import sqlite3
+import time
+
 import pandas as pd
 import numpy as np
+from aggregates import AggregateStore
+from metrics import tracer
 
 def get_sales_data():
     """Returns a pandas DataFrame with sample sales data"""
@@ -28,22 +33,197 @@ def get_sales_data():
             1, 3, 1, 1, 1,
             4, 1, 1, 1, 2,
             1, 1, 5, 1, 1
-        ]
+        ],
+        'date': pd.to_datetime([
+            '2025-01-06', '2025-01-18', '2025-01-29', '2025-02-07', '2025-02-19',
+            '2025-02-27', '2025-03-08', '2025-03-20', '2025-03-29', '2025-04-04',
+            '2025-04-15', '2025-04-26', '2025-05-03', '2025-05-14', '2025-05-24',
+            '2025-06-02', '2025-06-11', '2025-06-18', '2025-06-24', '2025-06-30'
+        ])
     }
     
     df = pd.DataFrame(data)
     return df
 
-def get_data_summary(df):
+@tracer.traced("get_data_summary")
+def get_data_summary(df, aggregates=None):
     """Generate summary statistics from the sales data"""
-    summary = {
-        'total_revenue': float(df['revenue'].sum()),
-        'total_sales': int(len(df)),
-        'average_revenue': float(df['revenue'].mean()),
-        'top_product': str(df.groupby('product')['revenue'].sum().idxmax()),
-        'top_product_revenue': float(df.groupby('product')['revenue'].sum().max()),
-        'sales_by_region': {str(k): float(v) for k, v in df.groupby('region')['revenue'].sum().to_dict().items()},
-        'products': df['product'].astype(str).unique().tolist(),
-        'regions': df['region'].astype(str).unique().tolist()
-    }
-    return summary
+    if aggregates is None:
+        aggregates = AggregateStore.from_frame(df)
+    return aggregates.summary()
+
+
+# Pluggable data sources
+
+CATEGORICAL_COLUMNS = ['product', 'region']
+
+
+def optimize_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Store product/region as categoricals, parse dates and downcast integer columns.
+
+    Float columns keep float64 so revenue sums stay exact.
+    """
+    if 'date' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['date']):
+        df['date'] = pd.to_datetime(df['date'])
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    for column in df.select_dtypes(include='integer').columns:
+        df[column] = pd.to_numeric(df[column], downcast='integer')
+    return df
+
+
+def concat_chunks(chunks: list) -> pd.DataFrame:
+    """Concatenate optimized chunks, unioning categoricals so they stay categorical"""
+    if not chunks:
+        return pd.DataFrame(columns=['sale_id', 'product', 'region', 'revenue', 'quantity'])
+    if len(chunks) == 1:
+        return chunks[0]
+    columns = {}
+    for column in chunks[0].columns:
+        parts = [chunk[column] for chunk in chunks]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            columns[column] = pd.api.types.union_categoricals(parts)
+        else:
+            columns[column] = np.concatenate([part.to_numpy() for part in parts])
+    return optimize_dtypes(pd.DataFrame(columns))
+
+
+class SalesDataSource:
+    """Loads the sales table and reports load time and resident memory"""
+
+    name = "base"
+
+    def __init__(self):
+        self.load_seconds = None
+        self.memory_bytes = None
+        self.rows = None
+
+    def _read(self) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def load(self) -> pd.DataFrame:
+        start = time.perf_counter()
+        df = optimize_dtypes(self._read())
+        self.load_seconds = time.perf_counter() - start
+        self.memory_bytes = int(df.memory_usage(deep=True).sum())
+        self.rows = len(df)
+        return df
+
+    def stats(self) -> dict:
+        return {
+            "source": self.name,
+            "rows": self.rows,
+            "load_seconds": round(self.load_seconds, 4) if self.load_seconds is not None else None,
+            "memory_mb": round(self.memory_bytes / 2**20, 3) if self.memory_bytes is not None else None
+        }
+
+
+class SampleSource(SalesDataSource):
+    """The built-in 20-row sample dataset"""
+
+    name = "sample"
+
+    def _read(self) -> pd.DataFrame:
+        return get_sales_data()
+
+
+class CSVSource(SalesDataSource):
+    """CSV file read in chunks, each optimized before the next is parsed"""
+
+    name = "csv"
+
+    def __init__(self, path: str, chunksize: int = 1_000_000):
+        super().__init__()
+        self.path = path
+        self.chunksize = chunksize
+
+    def _read(self) -> pd.DataFrame:
+        dtypes = {column: 'category' for column in CATEGORICAL_COLUMNS}
+        reader = pd.read_csv(self.path, chunksize=self.chunksize, dtype=dtypes)
+        return concat_chunks([optimize_dtypes(chunk) for chunk in reader])
+
+
+class ParquetSource(SalesDataSource):
+    """Parquet file read through a memory map"""
+
+    name = "parquet"
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+
+    def _read(self) -> pd.DataFrame:
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(self.path, memory_map=True, read_dictionary=CATEGORICAL_COLUMNS)
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+class ArrowSource(SalesDataSource):
+    """Arrow IPC file mapped from disk; numeric columns are converted without copying where possible"""
+
+    name = "arrow"
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+
+    def _read(self) -> pd.DataFrame:
+        import pyarrow as pa
+
+        with pa.memory_map(self.path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas(split_blocks=True, strings_to_categorical=True)
+
+
+class SQLiteSource(SalesDataSource):
+    """Table or query in a SQLite database, fetched in chunks"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, table: str = "sales", query: str = None, chunksize: int = 500_000):
+        super().__init__()
+        self.path = path
+        self.query = query or f'SELECT * FROM "{table}"'
+        self.chunksize = chunksize
+
+    def _read(self) -> pd.DataFrame:
+        with sqlite3.connect(self.path) as conn:
+            reader = pd.read_sql_query(self.query, conn, chunksize=self.chunksize)
+            return concat_chunks([optimize_dtypes(chunk) for chunk in reader])
+
+
+class SyntheticSource(SalesDataSource):
+    """Seeded synthetic dataset of any size, generated in memory (see synthetic_data.py)"""
+
+    name = "synthetic"
+
+    def __init__(self, rows: int = 1_000_000, **options):
+        super().__init__()
+        self.size = rows
+        self.options = options
+
+    def _read(self) -> pd.DataFrame:
+        from synthetic_data import generate_sales
+
+        return generate_sales(self.size, **self.options)
+
+
+DATA_SOURCES = {
+    "sample": SampleSource,
+    "csv": CSVSource,
+    "parquet": ParquetSource,
+    "arrow": ArrowSource,
+    "sqlite": SQLiteSource,
+    "synthetic": SyntheticSource,
+}
+
+
+def get_data_source(settings: dict = None) -> SalesDataSource:
+    """Build the data source described by the `data_source` block of config.json"""
+    settings = dict(settings or {"type": "sample"})
+    source_type = settings.pop("type", "sample")
+    if source_type not in DATA_SOURCES:
+        raise ValueError(f"Unknown data source '{source_type}'. Use one of: {', '.join(DATA_SOURCES)}")
+    return DATA_SOURCES[source_type](**settings)
@@ -0,0 +1,379 @@
+"""
+Semantic answer cache: reuse an answer when a new question is a paraphrase of a cached one
+"""
+import calendar
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Iterable, Optional
+
+import numpy as np
+
+from answer_cache import normalize_question
+
+# Domain synonyms folded together before embedding, so "best-selling item" reads as "top product"
+SYNONYMS = {
+    "best": "top", "highest": "top", "most": "top", "biggest": "top", "largest": "top", "leading": "top",
+    "bestselling": "top", "best-selling": "top", "greatest": "top", "maximum": "top", "max": "top",
+    "lowest": "bottom", "least": "bottom", "worst": "bottom", "smallest": "bottom", "weakest": "bottom",
+    "minimum": "bottom", "min": "bottom",
+    "item": "product", "items": "product", "products": "product", "sku": "product", "skus": "product",
+    "earnings": "revenue", "income": "revenue", "turnover": "revenue", "takings": "revenue",
+    "avg": "average", "mean": "average", "typical": "average",
+    "transactions": "sales", "orders": "sales", "sale": "sales", "deals": "sales",
+    "regions": "region", "territory": "region", "territories": "region",
+    "overall": "total", "combined": "total", "sum": "total", "all": "total",
+    "many": "count", "number": "count", "count": "count",
+    "previous": "last", "prior": "last", "past": "last",
+    "earn": "revenue", "earns": "revenue", "earned": "revenue", "generate": "revenue", "generates": "revenue",
+    "performing": "performance", "perform": "performance", "doing": "performance",
+    "breakdown": "breakdown", "break": "breakdown", "split": "breakdown", "compare": "breakdown",
+    "comparison": "breakdown", "across": "breakdown",
+}
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "what", "whats", "which", "who", "me", "show", "tell",
+    "give", "please", "can", "could", "you", "i", "we", "our", "us", "do", "does", "did", "have", "has", "had",
+    "of", "by", "for", "to", "in", "on", "at", "and", "with", "about", "there", "that", "it", "s", "per",
+    "my", "how", "much", "current", "currently", "right", "now", "so", "far", "from", "make", "made",
+    "down", "been", "be", "term", "terms", "like", "list",
+}
+
+# Words that change the meaning of otherwise similar questions; a hit requires the same set
+GUARD_WORDS = {"top", "bottom", "average", "median", "total", "count", "day", "week", "month", "quarter",
+               "year", "last", "this", "next", "today", "yesterday", "tomorrow", "recent", "recently", "lately",
+               "since", "ago", "until", "ytd", "mtd", "qtd", "daily", "weekly", "monthly", "quarterly", "yearly",
+               "annual", "annually"}
+# Month names and abbreviations, folded to one guard per month so "Jan" and "January" agree
+MONTH_GUARDS = {name.lower(): f"month-{number}" for number, name in enumerate(calendar.month_name) if name}
+MONTH_GUARDS.update({name.lower(): f"month-{number}" for number, name in enumerate(calendar.month_abbr) if name})
+MONTH_GUARDS["sept"] = "month-9"
+# Quarters and fiscal years ("q1", "fy2025"); 4-digit years are caught as numbers
+PERIOD_GUARD = re.compile(r"q[1-4]|fy\d{2,4}")
+DIMENSION_WORDS = {"product", "region"}
+
+
+def tokenize(question: str) -> list:
+    """Normalized, synonym-folded tokens of a question, stopwords removed"""
+    words = re.findall(r"[a-z0-9][a-z0-9\-]*", normalize_question(question))
+    tokens = []
+    for word in words:
+        word = SYNONYMS.get(word, word)
+        if word in STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+            word = SYNONYMS.get(word[:-1], word[:-1])
+        tokens.append(word)
+    return tokens
+
+
+class HashingEmbedder:
+    """Dependency-free embedding: hashed unigrams, bigrams and character 4-grams, L2-normalized"""
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _add(self, vector: np.ndarray, feature: str, weight: float) -> None:
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % self.dim] += weight if (h >> 31) & 1 else -weight
+
+    def embed(self, question: str) -> np.ndarray:
+        tokens = tokenize(question)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokens:
+            self._add(vector, "w:" + token, 1.0)
+            padded = f"<{token}>"
+            for i in range(len(padded) - 3):
+                self._add(vector, "c:" + padded[i:i + 4], 0.25)
+        for left, right in zip(tokens, tokens[1:]):
+            self._add(vector, f"b:{left} {right}", 0.5)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_many(self, questions: Iterable[str]) -> np.ndarray:
+        return np.stack([self.embed(q) for q in questions])
+
+
+class SentenceTransformerEmbedder:
+    """Small local CPU model from sentence-transformers, e.g. all-MiniLM-L6-v2"""
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.name = f"sentence-transformers:{model_name}"
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, question: str) -> np.ndarray:
+        return self.embed_many([question])[0]
+
+    def embed_many(self, questions: Iterable[str]) -> np.ndarray:
+        texts = [" ".join(tokenize(q)) or normalize_question(q) for q in questions]
+        return self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+def build_embedder(name: str = "hashing", dim: int = 256):
+    """Embedder by config name: "hashing" or "sentence-transformers[:model]", falling back to hashing"""
+    if name.startswith("sentence-transformers"):
+        model_name = name.partition(":")[2] or "all-MiniLM-L6-v2"
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except Exception as e:
+            print(f"Warning: could not load embedding model '{model_name}' ({e}); using hashing embedder")
+    return HashingEmbedder(dim)
+
+
+class VectorIndex:
+    """Brute-force cosine search over a preallocated float32 matrix, with LRU slot reuse when full.
+
+    Slots are grouped by a partition key (the cache's guard signature). A search only scores
+    the slots in its partition, since matches from other partitions could never be used.
+    """
+
+    def __init__(self, dim: int, max_entries: int = 10000):
+        self.dim = dim
+        self.max_entries = max_entries
+        self.vectors = np.zeros((min(max_entries, 1024), dim), dtype=np.float32)
+        self.last_access = np.zeros(len(self.vectors), dtype=np.float64)
+        self.partition_of = []
+        self.partitions = {}
+        self._slot_arrays = {}
+        self.size = 0
+
+    def _grow(self, needed: int) -> None:
+        if needed > len(self.vectors):
+            grown = min(self.max_entries, max(needed, len(self.vectors) * 2))
+            self.vectors = np.resize(self.vectors, (grown, self.dim))
+            self.last_access = np.resize(self.last_access, grown)
+
+    def _assign(self, slot: int, partition: str) -> None:
+        if slot < len(self.partition_of):
+            previous = self.partition_of[slot]
+            self.partitions[previous].remove(slot)
+            self._slot_arrays.pop(previous, None)
+            self.partition_of[slot] = partition
+        else:
+            self.partition_of.append(partition)
+        self.partitions.setdefault(partition, []).append(slot)
+        self._slot_arrays.pop(partition, None)
+
+    def add(self, vector: np.ndarray, partition: str = "") -> int:
+        """Store a vector and return its slot; the least recently used slot is reused when full"""
+        if self.size < self.max_entries:
+            self._grow(self.size + 1)
+            slot = self.size
+            self.size += 1
+        else:
+            slot = int(np.argmin(self.last_access))
+        self.vectors[slot] = vector
+        self.last_access[slot] = time.monotonic()
+        self._assign(slot, partition)
+        return slot
+
+    def add_many(self, vectors: np.ndarray, partitions: list = None) -> None:
+        """Bulk load, e.g. from disk; vectors beyond `max_entries` are ignored"""
+        count = min(len(vectors), self.max_entries - self.size)
+        start = self.size
+        self._grow(start + count)
+        self.vectors[start:start + count] = vectors[:count]
+        self.last_access[start:start + count] = time.monotonic()
+        for offset in range(count):
+            self._assign(start + offset, partitions[offset] if partitions is not None else "")
+        self.size = start + count
+
+    def search(self, vector: np.ndarray, partition: str = "", k: int = 3) -> tuple:
+        """Slots and cosine scores of the `k` nearest vectors in `partition`, best first"""
+        members = self.partitions.get(partition)
+        if not members:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if len(members) == self.size:
+            slots = None
+            scores = self.vectors[:self.size] @ vector
+        else:
+            slots = self._slot_arrays.get(partition)
+            if slots is None:
+                slots = self._slot_arrays[partition] = np.array(members, dtype=np.int64)
+            scores = self.vectors[slots] @ vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return (top if slots is None else slots[top]), scores[top]
+
+    def touch(self, slot: int) -> None:
+        self.last_access[slot] = time.monotonic()
+
+    def clear(self) -> None:
+        self.size = 0
+        self.partition_of = []
+        self.partitions = {}
+        self._slot_arrays = {}
+
+
+class SemanticCache:
+    """Answer cache matched by question similarity, scoped to one dataset version and prompt config.
+
+    A hit needs cosine similarity at or above `threshold` and, unless `guard` is off, the same
+    signature: the products/regions, numbers and ranking/period words named in both questions.
+    Entries persist to SQLite when `path` is set and are reloaded for the same dataset.
+    """
+
+    def __init__(self, embedder=None, threshold: float = 0.75, max_entries: int = 10000,
+                 path: Optional[str] = None, config_fingerprint: str = "", guard: bool = True):
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.guard = guard
+        self.config_fingerprint = config_fingerprint
+        self.index = VectorIndex(self.embedder.dim, max_entries)
+        self.entries = []
+        self.dataset_fingerprint = ""
+        self.entities = set()
+        self.hits = 0
+        self.misses = 0
+        self.saved_latency_ms = 0.0
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS semantic_answers ("
+                "scope TEXT, embedder TEXT, question TEXT, signature TEXT, answer TEXT, "
+                "latency_ms REAL, vector BLOB, PRIMARY KEY (scope, embedder, question))"
+            )
+            self._conn.commit()
+
+    @property
+    def scope(self) -> str:
+        return f"{self.dataset_fingerprint}|{self.config_fingerprint}"
+
+    def signature(self, question: str) -> str:
+        """Entities, numbers, periods and guard words in the question; paraphrases must agree on these"""
+        if not self.guard:
+            return ""
+        tokens = tokenize(question)
+        words = re.findall(r"[a-z0-9]+", normalize_question(question))
+        named = set()
+        for n in (3, 2, 1):
+            for i in range(len(words) - n + 1):
+                phrase = " ".join(words[i:i + n])
+                if phrase in self.entities:
+                    named.add(phrase)
+        guards = {t for t in tokens if t in GUARD_WORDS or t.isdigit() or PERIOD_GUARD.fullmatch(t)}
+        guards |= {MONTH_GUARDS[t] for t in tokens if t in MONTH_GUARDS}
+        if not named:
+            guards |= {t for t in tokens if t in DIMENSION_WORDS}
+        return "|".join(sorted(named | guards))
+
+    def set_dataset(self, fingerprint: str, entities: Iterable[str] = ()) -> None:
+        """Scope the cache to a dataset version; entries for other versions are dropped.
+
+        `entities` are the product and region names, used to tell apart questions that differ
+        only in the entity they ask about.
+        """
+        with self._lock:
+            self.entities = {str(e).lower() for e in entities}
+            if fingerprint == self.dataset_fingerprint:
+                return
+            self.dataset_fingerprint = fingerprint
+            self.index.clear()
+            self.entries = []
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM semantic_answers WHERE scope != ?", (self.scope,))
+                self._conn.commit()
+                self._load()
+
+    def _load(self) -> None:
+        rows = self._conn.execute(
+            "SELECT question, signature, answer, latency_ms, vector FROM semantic_answers "
+            "WHERE scope = ? AND embedder = ? LIMIT ?",
+            (self.scope, self.embedder.name, self.index.max_entries)
+        ).fetchall()
+        if not rows:
+            return
+        vectors = np.stack([np.frombuffer(row[4], dtype=np.float32) for row in rows])
+        # Signatures are recomputed so entries saved under older guard rules follow the current ones
+        signatures = [self.signature(row[0]) for row in rows]
+        self.index.add_many(vectors, signatures)
+        self.entries = [(q, sig, answer, latency) for (q, _, answer, latency, _), sig in zip(rows, signatures)]
+
+    def lookup(self, question: str) -> Optional[tuple]:
+        """(answer, score, cached question, latency_ms) of the best guarded match, or None"""
+        vector = self.embedder.embed(question)
+        signature = self.signature(question)
+        with self._lock:
+            slots, scores = self.index.search(vector, signature, k=1)
+            if len(slots) and scores[0] >= self.threshold:
+                slot = int(slots[0])
+                cached_question, _, answer, latency_ms = self.entries[slot]
+                self.index.touch(slot)
+                return answer, float(scores[0]), cached_question, latency_ms
+        return None
+
+    def get(self, question: str, dataset: str = None) -> Optional[str]:
+        """Cached answer for a paraphrase of `question` against `dataset` (default: the current dataset)"""
+        if dataset is not None and dataset != self.dataset_fingerprint:
+            self.misses += 1
+            return None
+        match = self.lookup(question)
+        if match is None:
+            self.misses += 1
+            return None
+        answer, _, _, latency_ms = match
+        self.hits += 1
+        self.saved_latency_ms += latency_ms
+        return answer
+
+    def set(self, question: str, answer: str, latency_ms: float, dataset: str = None) -> None:
+        """Store an answer computed against `dataset`; answers for superseded datasets are dropped"""
+        if dataset is not None and dataset != self.dataset_fingerprint:
+            return
+        vector = self.embedder.embed(question)
+        entry = (normalize_question(question), self.signature(question), answer, latency_ms)
+        with self._lock:
+            slot = self.index.add(vector, entry[1])
+            if slot == len(self.entries):
+                self.entries.append(entry)
+            else:
+                evicted = self.entries[slot]
+                self.entries[slot] = entry
+                if self._conn is not None:
+                    self._conn.execute(
+                        "DELETE FROM semantic_answers WHERE scope = ? AND embedder = ? AND question = ?",
+                        (self.scope, self.embedder.name, evicted[0])
+                    )
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO semantic_answers VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (self.scope, self.embedder.name, entry[0], entry[1], answer, latency_ms,
+                     vector.astype(np.float32).tobytes())
+                )
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "embedder": self.embedder.name,
+            "threshold": self.threshold,
+            "entries": self.index.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_latency_ms": round(self.saved_latency_ms, 2),
+            "dataset_fingerprint": self.dataset_fingerprint
+        }
+
+
+def build_semantic_cache(config: dict, config_fingerprint: str = "") -> Optional[SemanticCache]:
+    """Create the semantic cache described by config.json, or None when it is disabled"""
+    if not config.get("semantic_cache_enabled", False):
+        return None
+    return SemanticCache(
+        embedder=build_embedder(config.get("semantic_cache_embedder", "hashing")),
+        threshold=config.get("semantic_cache_threshold", 0.75),
+        max_entries=config.get("semantic_cache_max_entries", 10000),
+        path=config.get("semantic_cache_path"),
+        config_fingerprint=config_fingerprint
+    )
@@ -0,0 +1,303 @@
+"""
+Server-side chat sessions with bounded, compacted conversation history
+"""
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Optional
+
+from prompt_context import estimate_tokens
+
+
+def digest_turn(question: str, answer: str, max_chars: int = 160) -> str:
+    """One summary line for a compacted turn: the question and the answer's first sentence"""
+    answer = re.sub(r"\s+", " ", answer.replace("**", "")).strip()
+    first = re.split(r"(?<=[.!?])\s", answer, maxsplit=1)[0]
+    if len(first) > max_chars:
+        first = first[:max_chars].rsplit(" ", 1)[0] + "…"
+    return f"- Q: {question.strip()} A: {first}"
+
+
+class Session:
+    """One conversation: recent turns verbatim and older turns compacted into summary lines"""
+
+    def __init__(self, session_id: str = None):
+        self.id = session_id or uuid.uuid4().hex
+        self.turns = []  # (question, answer), oldest first
+        self.summary = []  # one line per compacted turn, oldest first
+        self.omitted = 0  # compacted turns dropped from the summary to stay within the token cap
+        self.turn_count = 0
+        self.created = time.time()
+        self.last_access = self.created
+        self.last_prompt_tokens = None
+
+    @property
+    def has_history(self) -> bool:
+        return bool(self.turns or self.summary)
+
+    def summary_text(self) -> str:
+        if not self.summary:
+            return ""
+        omitted = f"({self.omitted} earlier turns omitted)\n" if self.omitted else ""
+        return "Summary of the earlier conversation:\n" + omitted + "\n".join(self.summary)
+
+    def history(self) -> list:
+        """Prompt messages as (role, text): the summary of older turns, then recent turns verbatim"""
+        messages = [("system", self.summary_text())] if self.summary else []
+        for question, answer in self.turns:
+            messages.append(("human", question))
+            messages.append(("ai", answer))
+        return messages
+
+    @property
+    def history_tokens(self) -> int:
+        return sum(estimate_tokens(text) for _, text in self.history())
+
+    @property
+    def memory_bytes(self) -> int:
+        """Approximate size of the session's history in memory"""
+        size = sys.getsizeof(self) + sys.getsizeof(self.turns) + sys.getsizeof(self.summary)
+        for question, answer in self.turns:
+            size += sys.getsizeof((question, answer)) + sys.getsizeof(question) + sys.getsizeof(answer)
+        return size + sum(sys.getsizeof(line) for line in self.summary)
+
+    def compact(self, recent_turns: int, max_history_tokens: int) -> None:
+        """Fold turns beyond the most recent `recent_turns` into summary lines, then trim to the token cap.
+
+        The newest turn is always kept verbatim; summary lines go oldest first.
+        """
+        while len(self.turns) > recent_turns or (len(self.turns) > 1 and self.history_tokens > max_history_tokens):
+            self.summary.append(digest_turn(*self.turns.pop(0)))
+        while self.summary and self.history_tokens > max_history_tokens:
+            self.summary.pop(0)
+            self.omitted += 1
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "turns": self.turns, "summary": self.summary, "omitted": self.omitted,
+                "turn_count": self.turn_count, "created": self.created, "last_access": self.last_access,
+                "last_prompt_tokens": self.last_prompt_tokens}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Session":
+        session = cls(data["id"])
+        session.turns = [tuple(turn) for turn in data["turns"]]
+        session.summary = list(data["summary"])
+        session.omitted = data["omitted"]
+        session.turn_count = data["turn_count"]
+        session.created = data["created"]
+        session.last_access = data["last_access"]
+        session.last_prompt_tokens = data.get("last_prompt_tokens")
+        return session
+
+    def describe(self) -> dict:
+        return {
+            "session_id": self.id,
+            "turns": self.turn_count,
+            "recent": [{"question": question, "answer": answer} for question, answer in self.turns],
+            "summary": self.summary,
+            "omitted_turns": self.omitted,
+            "history_tokens": self.history_tokens,
+            "last_prompt_tokens": self.last_prompt_tokens,
+            "memory_bytes": self.memory_bytes,
+            "created": self.created,
+            "last_access": self.last_access
+        }
+
+
+class SessionDatabase:
+    """SQLite copy of every session, so sessions survive restarts and LRU eviction and are shared by workers"""
+
+    def __init__(self, path: str = "sessions.db", max_sessions: int = 100_000, ttl_seconds: Optional[float] = 3600):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # Several workers write the same file; WAL lets them read while one writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT, turn_count INTEGER, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_lru ON sessions(last_access)")
+        self._conn.commit()
+
+    def turn_count(self, session_id: str) -> Optional[int]:
+        """Turns recorded in the stored session, or None if it is missing or expired"""
+        with self._lock:
+            row = self._conn.execute("SELECT turn_count, last_access FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        if self.ttl_seconds is not None and time.time() - row[1] > self.ttl_seconds:
+            self.delete(session_id)
+            return None
+        return row[0]
+
+    def load(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return Session.from_dict(json.loads(row[0])) if row is not None else None
+
+    def save(self, session: Session) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)",
+                               (session.id, json.dumps(session.to_dict()), session.turn_count, session.last_access))
+            self._conn.execute(
+                "DELETE FROM sessions WHERE id IN ("
+                "SELECT id FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,)
+            )
+            if self.ttl_seconds is not None:
+                self._conn.execute("DELETE FROM sessions WHERE last_access < ?", (time.time() - self.ttl_seconds,))
+            self._conn.commit()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class SessionStore:
+    """Sessions in an in-memory LRU with idle TTL, optionally written through to SQLite.
+
+    Each turn is recorded and compacted, so a session's history stays within
+    `max_history_tokens` and its answers within `max_answer_chars`, however long it runs.
+    """
+
+    def __init__(self, max_sessions: int = 10_000, ttl_seconds: Optional[float] = 3600, recent_turns: int = 4,
+                 max_history_tokens: int = 800, max_answer_chars: int = 1500, database: SessionDatabase = None):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.recent_turns = recent_turns
+        self.max_history_tokens = max_history_tokens
+        self.max_answer_chars = max_answer_chars
+        self.database = database
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+        self.expired = 0
+        self.restored = 0
+        self.turns = 0
+        self.prompt_tokens = deque(maxlen=1000)  # recent LLM turns
+
+    def _put(self, session: Session) -> None:
+        self._sessions[session.id] = session
+        self._sessions.move_to_end(session.id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def create(self) -> Session:
+        session = Session()
+        with self._lock:
+            self._put(session)
+            self.created += 1
+        if self.database is not None:
+            self.database.save(session)
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """The session, or None if it is unknown or idle for longer than the TTL"""
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and self.ttl_seconds is not None and now - session.last_access > self.ttl_seconds:
+                del self._sessions[session_id]
+                self.expired += 1
+                session = None
+        if self.database is not None:
+            # Another worker may have recorded a newer turn, or deleted the session
+            stored_turns = self.database.turn_count(session_id)
+            if stored_turns is None:
+                with self._lock:
+                    self._sessions.pop(session_id, None)
+                return None
+            if session is None or stored_turns > session.turn_count:
+                session = self.database.load(session_id)
+                self.restored += 1
+        if session is None:
+            return None
+        with self._lock:
+            session.last_access = now
+            self._put(session)
+        return session
+
+    def record(self, session: Session, question: str, answer: str, prompt_tokens: int = None) -> None:
+        """Append a turn, compact the history and persist the session"""
+        if len(answer) > self.max_answer_chars:
+            answer = answer[:self.max_answer_chars].rsplit(" ", 1)[0] + " …"
+        with self._lock:
+            session.turns.append((question.strip(), answer))
+            session.turn_count += 1
+            session.compact(self.recent_turns, self.max_history_tokens)
+            session.last_access = time.time()
+            if prompt_tokens is not None:
+                session.last_prompt_tokens = prompt_tokens
+                self.prompt_tokens.append(prompt_tokens)
+            self.turns += 1
+        if self.database is not None:
+            self.database.save(session)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            found = self._sessions.pop(session_id, None) is not None
+        if self.database is not None:
+            found = found or self.database.turn_count(session_id) is not None
+            self.database.delete(session_id)
+        return found
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = list(self._sessions.values())
+            tokens = sorted(self.prompt_tokens)
+        memory = [session.memory_bytes for session in sessions]
+        return {
+            "backend": "sqlite" if self.database is not None else "memory",
+            "sessions": len(sessions),
+            "stored": len(self.database) if self.database is not None else None,
+            "created": self.created,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "restored": self.restored,
+            "turns": self.turns,
+            "memory_bytes": sum(memory),
+            "max_session_bytes": max(memory, default=0),
+            "max_history_tokens": max((session.history_tokens for session in sessions), default=0),
+            "llm_prompt_tokens": {
+                "turns": len(tokens),
+                "p50": tokens[len(tokens) // 2] if tokens else None,
+                "max": tokens[-1] if tokens else None
+            },
+            "limits": {"max_sessions": self.max_sessions, "ttl_seconds": self.ttl_seconds,
+                       "recent_turns": self.recent_turns, "history_tokens": self.max_history_tokens,
+                       "answer_chars": self.max_answer_chars}
+        }
+
+
+def build_session_store(config: dict) -> Optional[SessionStore]:
+    """Create the session store described by config.json, or None when sessions are disabled"""
+    backend_name = config.get("session_backend", "memory")
+    if backend_name == "none":
+        return None
+    ttl_seconds = config.get("session_ttl_seconds", 3600)
+    database = None
+    if backend_name == "sqlite":
+        database = SessionDatabase(config.get("session_path", "sessions.db"),
+                                   config.get("session_max_stored", 100_000), ttl_seconds)
+    return SessionStore(
+        max_sessions=config.get("session_max_sessions", 10_000),
+        ttl_seconds=ttl_seconds,
+        recent_turns=config.get("session_recent_turns", 4),
+        max_history_tokens=config.get("session_max_history_tokens", 800),
+        max_answer_chars=config.get("session_max_answer_chars", 1500),
+        database=database
+    )
@@ -0,0 +1,163 @@
+"""
+Sales dataset shared by worker processes: Arrow IPC files on tmpfs, memory-mapped read-only.
+
+One process writes each version (rows as an Arrow file plus the aggregates as plain numpy arrays) and bumps a
+version counter that every worker maps; workers follow the counter and map the same pages, so
+rows are held in memory once however many workers serve them.
+"""
+import contextlib
+import fcntl
+import json
+import mmap
+import os
+import stat
+import struct
+import tempfile
+import uuid
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from aggregates import AggregateStore
+
+DEFAULT_DIRECTORY = "/dev/shm/finbot" if os.path.isdir("/dev/shm") else os.path.join(tempfile.gettempdir(), "finbot-shared")
+
+
+def private_directory(path: str) -> str:
+    """Create `path` (mode 0700) or check that an existing one belongs to this user.
+
+    Shared and spill directories sit under world-writable /dev/shm or /tmp at predictable names,
+    so a directory (or symlink) planted by another user must never be read from or written to.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o022:
+        raise PermissionError(f"{path} must be a directory owned and writable only by uid {os.getuid()}")
+    if info.st_mode & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+class SharedDataset:
+    """Versioned dataset files in a directory shared by all workers.
+
+    `manifest.json` names the current version's files and `version` holds its number as
+    8 bytes mapped by every process, so checking for a new version is a memory read.
+    Writers serialize on an flock; files of superseded versions are unlinked once a newer
+    version is published (processes that still map them keep their pages until they move on).
+    With `run_id`, files left by another server run are ignored and replaced.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, run_id: str = None):
+        self.directory = private_directory(directory)
+        self.run_id = run_id
+        counter_path = os.path.join(directory, "version")
+        with self.lock():
+            if not os.path.exists(counter_path) or os.path.getsize(counter_path) < 8:
+                with open(counter_path, "wb") as f:
+                    f.write(struct.pack("<q", 0))
+        self._counter_file = open(counter_path, "r+b")
+        self._counter = mmap.mmap(self._counter_file.fileno(), 8)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @property
+    def version(self) -> int:
+        """Latest published version, 0 before the first publish"""
+        return struct.unpack_from("<q", self._counter)[0]
+
+    @contextlib.contextmanager
+    def lock(self):
+        """Cross-process writer lock"""
+        with open(self._path("lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_manifest(self) -> Optional[dict]:
+        with contextlib.suppress(FileNotFoundError, ValueError):
+            with open(self._path("manifest.json")) as f:
+                return json.load(f)
+        return None
+
+    def manifest(self) -> Optional[dict]:
+        """The current version's manifest, or None if nothing was published in this run"""
+        manifest = self._read_manifest()
+        if manifest is None:
+            return None
+        if self.run_id is not None and manifest.get("run") != self.run_id:
+            return None
+        return manifest
+
+    def _write_atomic(self, name: str, write) -> None:
+        tmp = self._path(f".{name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, self._path(name))
+
+    def publish(self, df: pd.DataFrame, aggregates: AggregateStore, version: int, next_sale_id: int,
+                **extra) -> dict:
+        """Write one version and make it current; call while holding `lock()`"""
+        import pyarrow as pa
+
+        tag = f"{version}-{uuid.uuid4().hex[:8]}"
+        rows_name, aggregates_name = f"rows-{tag}.arrow", f"aggregates-{tag}.npz"
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+        def write_rows(f):
+            with pa.ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+
+        self._write_atomic(rows_name, write_rows)
+        self._write_atomic(aggregates_name, lambda f: np.savez(f, **aggregates.to_arrays()))
+
+        previous = self._read_manifest()
+        manifest = {"version": version, "rows": rows_name, "aggregates": aggregates_name,
+                    "next_sale_id": next_sale_id, "run": self.run_id, **extra}
+        self._write_atomic("manifest.json", lambda f: f.write(json.dumps(manifest).encode("utf-8")))
+        struct.pack_into("<q", self._counter, 0, version)
+        self._counter.flush()
+
+        if previous is not None:
+            for name in (previous["rows"], previous["aggregates"]):
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(self._path(name))
+        return manifest
+
+    def load(self, manifest: dict) -> tuple:
+        """(rows, aggregates) of a published version; rows are zero-copy views of the mapped file"""
+        import pyarrow as pa
+
+        with pa.memory_map(self._path(manifest["rows"]), "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        with np.load(self._path(manifest["aggregates"]), allow_pickle=False) as arrays:
+            aggregates = AggregateStore.from_arrays(dict(arrays))
+        return table.to_pandas(split_blocks=True), aggregates
+
+    def load_latest(self) -> tuple:
+        """(manifest, rows, aggregates) of the current version, retrying if a writer replaces it mid-read"""
+        for _ in range(5):
+            manifest = self.manifest()
+            if manifest is None:
+                return None, None, None
+            try:
+                return (manifest, *self.load(manifest))
+            except FileNotFoundError:
+                continue
+        raise RuntimeError(f"could not map the shared dataset in {self.directory}")
+
+    def stats(self) -> dict:
+        manifest = self.manifest() or {}
+        size = 0
+        for name in (manifest.get("rows"), manifest.get("aggregates")):
+            with contextlib.suppress(TypeError, OSError):
+                size += os.path.getsize(self._path(name))
+        return {
+            "directory": self.directory,
+            "version": self.version,
+            "shared_mb": round(size / 2**20, 3)
+        }
@@ -0,0 +1,278 @@
+"""
+Mergeable quantile sketches of revenue, overall, per product and per region.
+
+Each sketch is a DDSketch: values are counted in logarithmic buckets, so every quantile it
+returns is within `relative_accuracy` of the true value, whatever the data size. Memory depends
+only on the range of each group's values (at most about 300 buckets for ₹200-₹50,000 at 1%, far
+fewer for a product sold at a few prices), sketches with the same accuracy merge by adding counts,
+and a quantile is one pass over the buckets.
+"""
+import math
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# Label of the single sketch over all sales
+TOTAL = "all"
+
+
+class SketchTable:
+    """One sketch per group label, each row counting only its own range of bucket keys.
+
+    A label that sells in a narrow band of prices holds a few buckets, not the whole key range
+    of the table. Rows are replaced, never modified, when a batch touches them, so a copy shares
+    every untouched row with its original. Values <= 0 are counted in a separate zero bucket per row.
+    """
+
+    def __init__(self, gamma: float):
+        self.gamma = gamma
+        self.labels = {}
+        self.offsets = np.zeros(0, dtype=np.int64)  # bucket key of each row's first count
+        self.buckets = []  # per row: counts for keys offsets[row], offsets[row] + 1, ...
+        self.zeros = np.zeros(0, dtype=np.int64)
+        self.mins = np.zeros(0)
+        self.maxs = np.zeros(0)
+
+    def copy(self) -> "SketchTable":
+        """Independent table for copy-on-write updates; bucket rows are shared until replaced"""
+        table = SketchTable(self.gamma)
+        table.labels = dict(self.labels)
+        table.buckets = list(self.buckets)
+        table.offsets, table.zeros = self.offsets.copy(), self.zeros.copy()
+        table.mins, table.maxs = self.mins.copy(), self.maxs.copy()
+        return table
+
+    def to_arrays(self, prefix: str) -> dict:
+        return {f"{prefix}.labels": np.array(sorted(self.labels, key=self.labels.get), dtype=str),
+                f"{prefix}.offsets": self.offsets,
+                f"{prefix}.lengths": np.array([len(counts) for counts in self.buckets], dtype=np.int64),
+                f"{prefix}.counts": np.concatenate(self.buckets) if self.buckets else np.zeros(0, dtype=np.int64),
+                f"{prefix}.zeros": self.zeros, f"{prefix}.mins": self.mins, f"{prefix}.maxs": self.maxs}
+
+    @classmethod
+    def from_arrays(cls, gamma: float, arrays: dict, prefix: str) -> "SketchTable":
+        table = cls(gamma)
+        table.labels = {str(label): row for row, label in enumerate(arrays[f"{prefix}.labels"])}
+        table.offsets = arrays[f"{prefix}.offsets"]
+        lengths = arrays[f"{prefix}.lengths"]
+        table.buckets = np.split(arrays[f"{prefix}.counts"], np.cumsum(lengths)[:-1]) if len(lengths) else []
+        table.zeros, table.mins, table.maxs = (arrays[f"{prefix}.zeros"], arrays[f"{prefix}.mins"],
+                                               arrays[f"{prefix}.maxs"])
+        return table
+
+    def _grow(self, rows: int) -> None:
+        """Add empty rows for labels seen for the first time"""
+        grow = rows - len(self.buckets)
+        if grow <= 0:
+            return
+        self.buckets += [_EMPTY] * grow
+        self.offsets = np.concatenate([self.offsets, np.zeros(grow, dtype=np.int64)])
+        self.zeros = np.concatenate([self.zeros, np.zeros(grow, dtype=np.int64)])
+        self.mins = np.concatenate([self.mins, np.full(grow, np.inf)])
+        self.maxs = np.concatenate([self.maxs, np.full(grow, -np.inf)])
+
+    def _add(self, row: int, offset: int, counts: np.ndarray) -> None:
+        """Replace the row with one also counting `counts` (keys from `offset`); the old array is not modified"""
+        current = self.buckets[row]
+        if not len(current):
+            self.buckets[row], self.offsets[row] = counts, offset
+            return
+        start = int(self.offsets[row])
+        low, high = min(start, offset), max(start + len(current), offset + len(counts))
+        combined = np.zeros(high - low, dtype=np.int64)
+        combined[start - low:start - low + len(current)] = current
+        combined[offset - low:offset - low + len(counts)] += counts
+        self.buckets[row], self.offsets[row] = combined, low
+
+    def update(self, labels, values: np.ndarray, keys: np.ndarray, positive: np.ndarray) -> None:
+        """Count `values` (bucket `keys`, computed for the positive ones) into the rows of `labels`.
+
+        `labels` is a Series of group labels, or a single label for the whole batch. Only the
+        rows the batch touches are rebuilt, each over its own key range.
+        """
+        if isinstance(labels, pd.Series):
+            if isinstance(labels.dtype, pd.CategoricalDtype):
+                codes, uniques = labels.cat.codes.to_numpy(), labels.cat.categories
+            else:
+                codes, uniques = pd.factorize(labels)
+            for label in uniques:
+                self.labels.setdefault(str(label), len(self.labels))
+            rows = np.array([self.labels[str(label)] for label in uniques], dtype=np.intp)[codes]
+        else:
+            single = self.labels.setdefault(str(labels), len(self.labels))
+            rows = np.full(len(values), single, dtype=np.intp)
+        self._grow(len(self.labels))
+
+        all_positive = len(keys) == len(values)
+        positive_rows = rows if all_positive else rows[positive]
+        if len(keys):
+            # Group the batch by row, then count every touched row's keys in one bincount over
+            # the concatenation of the rows' own key ranges
+            # (a stable sort of a 16-bit array is a radix sort, much faster than sorting intp)
+            narrow = np.uint16 if len(self.labels) <= 1 << 16 else np.uint32
+            order = np.argsort(positive_rows.astype(narrow), kind="stable")
+            sorted_rows, sorted_keys = positive_rows[order], keys[order]
+            touched, starts = np.unique(sorted_rows, return_index=True)
+            lows = np.minimum.reduceat(sorted_keys, starts)
+            widths = np.maximum.reduceat(sorted_keys, starts) - lows + 1
+            ends = np.cumsum(widths)
+            group = np.repeat(np.arange(len(touched)), np.diff(np.append(starts, len(sorted_rows))))
+            flat = np.bincount(ends[group] - widths[group] + sorted_keys - lows[group], minlength=int(ends[-1]))
+            for row, low, counts in zip(touched.tolist(), lows.tolist(), np.split(flat, ends[:-1])):
+                self._add(row, low, counts)
+        if not all_positive:
+            self.zeros += np.bincount(rows[~positive], minlength=len(self.zeros))
+
+        if isinstance(labels, pd.Series):
+            np.minimum.at(self.mins, rows, values)
+            np.maximum.at(self.maxs, rows, values)
+        else:
+            self.mins[single] = min(self.mins[single], values.min())
+            self.maxs[single] = max(self.maxs[single], values.max())
+
+    def merge(self, other: "SketchTable") -> "SketchTable":
+        """A table holding both tables' counts, e.g. from two partitions or workers"""
+        merged = self.copy()
+        for label in other.labels:
+            merged.labels.setdefault(label, len(merged.labels))
+        merged._grow(len(merged.labels))
+        rows = np.array([merged.labels[label] for label in other.labels], dtype=np.int64)
+        if len(rows):
+            for row, offset, counts in zip(rows.tolist(), other.offsets.tolist(), other.buckets):
+                if len(counts):
+                    merged._add(row, offset, counts)
+            merged.zeros[rows] += other.zeros
+            merged.mins[rows] = np.minimum(merged.mins[rows], other.mins)
+            merged.maxs[rows] = np.maximum(merged.maxs[rows], other.maxs)
+        return merged
+
+    def row(self, label: str) -> Optional[int]:
+        return self.labels.get(label)
+
+    def count(self, row: int) -> int:
+        return int(self.zeros[row] + self.buckets[row].sum())
+
+    def _value(self, keys: np.ndarray) -> np.ndarray:
+        """Representative value of each bucket: within the relative accuracy of every value in it"""
+        return 2 * self.gamma ** keys / (self.gamma + 1)
+
+    def quantiles(self, row: int, qs: list) -> list:
+        total = self.count(row)
+        if total == 0:
+            return [None for _ in qs]
+        ranks = np.asarray(qs, dtype=float) * (total - 1)
+        cumulative = np.cumsum(self.buckets[row])
+        buckets = np.searchsorted(cumulative, ranks - self.zeros[row], side="right")
+        values = np.where(ranks < self.zeros[row], 0.0, self._value(buckets + self.offsets[row]))
+        return [float(v) for v in np.clip(values, self.mins[row], self.maxs[row])]
+
+    def histogram(self, row: int, bins: int) -> list:
+        """Approximate counts in `bins` equal-width bins between the row's min and max"""
+        low, high = float(self.mins[row]), float(self.maxs[row])
+        if self.count(row) == 0:
+            return []
+        edges = np.linspace(low, high if high > low else low + 1, bins + 1)
+        counts = self.buckets[row]
+        values = np.clip(self._value(np.arange(len(counts)) + self.offsets[row]), low, high)
+        counts, _ = np.histogram(values, bins=edges, weights=counts)
+        counts[0] += self.zeros[row]
+        return [
+            {"start": float(start), "end": float(end), "count": int(round(count))}
+            for start, end, count in zip(edges[:-1], edges[1:], counts)
+        ]
+
+    @property
+    def memory_bytes(self) -> int:
+        return (sum(counts.nbytes for counts in self.buckets) + self.offsets.nbytes + self.zeros.nbytes
+                + self.mins.nbytes + self.maxs.nbytes)
+
+
+_EMPTY = np.zeros(0, dtype=np.int64)
+
+
+class RevenueSketches:
+    """Revenue quantile sketches for all sales, per product and per region, updated on append"""
+
+    DIMENSIONS = ("total", "product", "region")
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.tables = {dimension: SketchTable(self.gamma) for dimension in self.DIMENSIONS}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> "RevenueSketches":
+        sketches = cls(relative_accuracy)
+        sketches.update(df)
+        return sketches
+
+    def copy(self) -> "RevenueSketches":
+        sketches = RevenueSketches(self.relative_accuracy)
+        sketches.tables = {dimension: table.copy() for dimension, table in self.tables.items()}
+        return sketches
+
+    def to_arrays(self, prefix: str) -> dict:
+        arrays = {f"{prefix}.relative_accuracy": np.array(self.relative_accuracy)}
+        for dimension, table in self.tables.items():
+            arrays.update(table.to_arrays(f"{prefix}.{dimension}"))
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: dict, prefix: str) -> "RevenueSketches":
+        sketches = cls(float(arrays[f"{prefix}.relative_accuracy"]))
+        sketches.tables = {dimension: SketchTable.from_arrays(sketches.gamma, arrays, f"{prefix}.{dimension}")
+                           for dimension in cls.DIMENSIONS}
+        return sketches
+
+    def update(self, rows: pd.DataFrame) -> None:
+        """Fold a batch of sales rows into every sketch; bucket keys are computed once per row"""
+        if rows is None or len(rows) == 0:
+            return
+        values = rows['revenue'].to_numpy(dtype='float64')
+        positive = values > 0
+        keys = np.ceil(np.log(values[positive]) / math.log(self.gamma)).astype(np.int64)
+        self.tables["total"].update(TOTAL, values, keys, positive)
+        self.tables["product"].update(rows['product'], values, keys, positive)
+        self.tables["region"].update(rows['region'], values, keys, positive)
+
+    def merge(self, other: "RevenueSketches") -> "RevenueSketches":
+        """Sketches of the union of both datasets (exactly as if built from all their rows)"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches with the same relative accuracy can be merged")
+        merged = RevenueSketches(self.relative_accuracy)
+        merged.tables = {dimension: self.tables[dimension].merge(other.tables[dimension])
+                         for dimension in self.DIMENSIONS}
+        return merged
+
+    def _locate(self, product: str = None, region: str = None) -> Optional[tuple]:
+        if product is not None and region is not None:
+            raise ValueError("Sketches are kept per product or per region, not per pair")
+        dimension, label = ("product", product) if product is not None else ("region", region) if region is not None else ("total", TOTAL)
+        table = self.tables[dimension]
+        row = table.row(str(label))
+        return (table, row) if row is not None else None
+
+    def quantiles(self, qs: list, product: str = None, region: str = None) -> Optional[list]:
+        """Revenue at each quantile in `qs` (0-1), or None for an unknown product or region"""
+        located = self._locate(product, region)
+        return located[0].quantiles(located[1], qs) if located else None
+
+    def quantile(self, q: float, product: str = None, region: str = None) -> Optional[float]:
+        values = self.quantiles([q], product, region)
+        return values[0] if values else None
+
+    def histogram(self, bins: int = 10, product: str = None, region: str = None) -> Optional[list]:
+        located = self._locate(product, region)
+        return located[0].histogram(located[1], bins) if located else None
+
+    def stats(self) -> dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "sketches": {dimension: len(table.labels) for dimension, table in self.tables.items()},
+            "memory_kb": round(sum(table.memory_bytes for table in self.tables.values()) / 1024, 1)
+        }
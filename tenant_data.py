@@ -0,0 +1,262 @@
+"""
+Per-tenant datasets, loaded on first use and held in a memory-budgeted LRU pool
+"""
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from data_store import DataStore
+from sales_data import SalesDataSource, get_data_source
+from shared_data import SharedDataset, private_directory
+
+DEFAULT_SPILL_DIRECTORY = os.path.join(tempfile.gettempdir(), "finbot-datasets")
+
+
+class Dataset:
+    """One tenant's dataset: its source, its DataStore once loaded, and load/memory counters.
+
+    States: `unloaded` (never used), `loading`, `memory` (rows and aggregates on the heap),
+    `mapped` (rows memory-mapped from the spill file, aggregates on the heap) and `spilled`
+    (only on disk; the next request maps it again without reading the source).
+    """
+
+    def __init__(self, dataset_id: str, source: SalesDataSource):
+        self.id = dataset_id
+        self.source = source
+        self.store: Optional[DataStore] = None
+        self.state = "unloaded"
+        self.lock = threading.Lock()  # one load or eviction at a time
+        self.spill: Optional[SharedDataset] = None
+        self.requests = 0
+        self.loads = 0
+        self.spill_loads = 0  # loads that mapped the spill file instead of reading the source
+        self.joined = 0  # requests that waited for another request's load instead of loading again
+        self.spills = 0
+        self.drops = 0
+        self.load_seconds = None
+        self.loaded_from = None
+        self.memory_bytes = 0  # heap memory counted against the budget
+        self.mapped_bytes = 0  # rows in the memory-mapped spill file (reclaimable page cache)
+        self.measured_version = None
+        self.last_access = None
+
+    def measure(self) -> None:
+        """Recompute memory for the current version; mapped rows count as mapped, not heap"""
+        snapshot = self.store.snapshot
+        if snapshot.version == self.measured_version:
+            return
+        if self.store.shared is None:
+            rows = int(sum(chunk.memory_usage(deep=True).sum() for chunk in snapshot.chunks))
+            self.memory_bytes, self.mapped_bytes = rows + snapshot.aggregates.memory_bytes, 0
+        else:
+            # The aggregates are loaded onto the heap, the rows stay mapped (size of the spill file)
+            manifest = self.spill.manifest()
+            self.memory_bytes = snapshot.aggregates.memory_bytes
+            self.mapped_bytes = os.path.getsize(os.path.join(self.spill.directory, manifest["rows"]))
+        self.measured_version = snapshot.version
+
+    def describe(self) -> dict:
+        snapshot = self.store.snapshot if self.store is not None else None
+        return {
+            "dataset": self.id,
+            "source": self.source.name,
+            "state": self.state,
+            "version": snapshot.version if snapshot is not None else None,
+            "rows": snapshot.aggregates.total_sales if snapshot is not None else None,
+            "memory_mb": round(self.memory_bytes / 2**20, 3),
+            "mapped_mb": round(self.mapped_bytes / 2**20, 3),
+            "load_seconds": round(self.load_seconds, 4) if self.load_seconds is not None else None,
+            "loaded_from": self.loaded_from,
+            "requests": self.requests,
+            "loads": self.loads,
+            "spill_loads": self.spill_loads,
+            "joined_loads": self.joined,
+            "spills": self.spills,
+            "drops": self.drops,
+            "last_access": self.last_access
+        }
+
+
+class DatasetRegistry:
+    """Datasets by ID, loaded lazily and kept within `memory_budget_bytes` of heap.
+
+    Concurrent first requests for a dataset share one load. After each load or write, the least
+    recently used datasets are evicted until the pool fits the budget: a dataset held in memory is
+    written to `spill_directory` as an Arrow file plus its aggregates' arrays and served from a
+    memory map of it; a mapped dataset is dropped and mapped again on its next request. Either way
+    the source is not read and the aggregates are not recomputed.
+    """
+
+    def __init__(self, sources: dict, memory_budget_bytes: Optional[int] = 512 * 2**20,
+                 spill_directory: str = DEFAULT_SPILL_DIRECTORY):
+        self.memory_budget_bytes = memory_budget_bytes
+        # One private directory per process, so workers never replace each other's spill files
+        self.spill_directory = os.path.join(private_directory(spill_directory), str(os.getpid()))
+        shutil.rmtree(self.spill_directory, ignore_errors=True)
+        private_directory(self.spill_directory)
+        self.run_id = uuid.uuid4().hex
+        self._datasets = OrderedDict((dataset_id, Dataset(dataset_id, source)) for dataset_id, source in sources.items())
+        self._lock = threading.Lock()
+
+    def __contains__(self, dataset_id: str) -> bool:
+        return dataset_id in self._datasets
+
+    def __len__(self):
+        return len(self._datasets)
+
+    def ids(self) -> list:
+        """Dataset IDs, least recently used first"""
+        with self._lock:
+            return list(self._datasets)
+
+    def _touch(self, dataset: Dataset) -> None:
+        with self._lock:
+            dataset.requests += 1
+            dataset.last_access = time.time()
+            self._datasets.move_to_end(dataset.id)
+
+    def get(self, dataset_id: str) -> DataStore:
+        """The dataset's store, loading it on first use. KeyError for an unknown ID."""
+        dataset = self._datasets[dataset_id]
+        self._touch(dataset)
+        store = dataset.store
+        if store is not None:
+            return store
+        with dataset.lock:
+            if dataset.store is None:
+                self._load(dataset)
+            else:
+                dataset.joined += 1
+            store = dataset.store
+        self._enforce_budget(keep=dataset)
+        return store
+
+    def resident(self, dataset_id: str) -> Optional[DataStore]:
+        """The dataset's store if it is loaded, without loading it (for callers that must not block)"""
+        dataset = self._datasets[dataset_id]
+        if dataset.store is None:
+            return None
+        self._touch(dataset)
+        return dataset.store
+
+    @contextlib.contextmanager
+    def writing(self, dataset_id: str):
+        """The dataset's store, held so it is not evicted while an append or reload writes to it"""
+        self.get(dataset_id)
+        dataset = self._datasets[dataset_id]
+        with dataset.lock:
+            if dataset.store is None:
+                self._load(dataset)
+            yield dataset.store
+            dataset.measure()
+        self._enforce_budget(keep=dataset)
+
+    def _load(self, dataset: Dataset) -> None:
+        """Load from the spill file when there is one, else from the source; call holding dataset.lock"""
+        dataset.state = "loading"
+        start = time.perf_counter()
+        try:
+            if dataset.spill is not None and dataset.spill.manifest() is not None:
+                dataset.store = DataStore(dataset.source, shared=dataset.spill)
+                dataset.state, dataset.loaded_from = "mapped", "spill"
+                dataset.spill_loads += 1
+            else:
+                dataset.store = DataStore(dataset.source)
+                dataset.state, dataset.loaded_from = "memory", "source"
+        except Exception:
+            dataset.state = "spilled" if dataset.spill is not None else "unloaded"
+            raise
+        dataset.load_seconds = time.perf_counter() - start
+        dataset.loads += 1
+        dataset.measured_version = None
+        dataset.measure()
+
+    def _evict(self, dataset: Dataset) -> None:
+        """Spill an in-memory dataset to a mapped file, or drop a mapped one; call holding dataset.lock"""
+        if dataset.state == "memory":
+            if dataset.spill is None:
+                dataset.spill = SharedDataset(os.path.join(self.spill_directory, dataset.id), run_id=self.run_id)
+            snapshot = dataset.store.snapshot
+            with dataset.spill.lock():
+                dataset.spill.publish(snapshot.sales_df, snapshot.aggregates, snapshot.version, snapshot.next_sale_id,
+                                      updated_at=snapshot.updated_at, fingerprint=snapshot.fingerprint)
+            dataset.store = DataStore(dataset.source, shared=dataset.spill)
+            dataset.state = "mapped"
+            dataset.spills += 1
+            dataset.measured_version = None
+            dataset.measure()
+        else:
+            dataset.store = None
+            dataset.state = "spilled"
+            dataset.drops += 1
+            dataset.memory_bytes = dataset.mapped_bytes = 0
+            dataset.measured_version = None
+
+    def _all(self) -> list:
+        with self._lock:
+            return list(self._datasets.values())
+
+    def memory_bytes(self) -> int:
+        return sum(dataset.memory_bytes for dataset in self._all() if dataset.store is not None)
+
+    def _enforce_budget(self, keep: Dataset) -> None:
+        """Evict least recently used datasets, never `keep` or one busy loading, until the pool fits"""
+        if self.memory_budget_bytes is None:
+            return
+        while self.memory_bytes() > self.memory_budget_bytes:
+            candidates = [d for d in self._all() if d.store is not None and d is not keep]
+            for dataset in candidates:
+                if dataset.lock.acquire(blocking=False):
+                    try:
+                        if dataset.store is not None:
+                            self._evict(dataset)
+                    finally:
+                        dataset.lock.release()
+                    break
+            else:
+                return
+
+    def describe(self, dataset_id: str) -> dict:
+        return self._datasets[dataset_id].describe()
+
+    def stats(self) -> dict:
+        datasets = self._all()
+        states = {}
+        for dataset in datasets:
+            states[dataset.state] = states.get(dataset.state, 0) + 1
+        return {
+            "datasets": len(datasets),
+            "states": states,
+            "memory_mb": round(self.memory_bytes() / 2**20, 3),
+            "mapped_mb": round(sum(d.mapped_bytes for d in datasets) / 2**20, 3),
+            "budget_mb": round(self.memory_budget_bytes / 2**20, 3) if self.memory_budget_bytes is not None else None,
+            "loads": sum(d.loads for d in datasets),
+            "spill_loads": sum(d.spill_loads for d in datasets),
+            "joined_loads": sum(d.joined for d in datasets),
+            "spills": sum(d.spills for d in datasets),
+            "drops": sum(d.drops for d in datasets),
+            "spill_directory": self.spill_directory
+        }
+
+    def close(self) -> None:
+        """Remove this process's spill files"""
+        shutil.rmtree(self.spill_directory, ignore_errors=True)
+
+
+def build_dataset_registry(config: dict) -> Optional[DatasetRegistry]:
+    """Create the registry for the `datasets` block of config.json, or None when it is empty"""
+    settings = config.get("datasets") or {}
+    if not settings:
+        return None
+    budget_mb = config.get("dataset_memory_budget_mb", 512)
+    return DatasetRegistry(
+        {dataset_id: get_data_source(source) for dataset_id, source in settings.items()},
+        memory_budget_bytes=int(budget_mb * 2**20) if budget_mb is not None else None,
+        spill_directory=config.get("dataset_spill_dir") or DEFAULT_SPILL_DIRECTORY
+    )